@@ -0,0 +1,54 @@
+# bench_motion.py
+
+"""
+点击吞吐量对比（使用 fake_wcf_server，不需要机械臂）：
+  fixed    —— 不信任服务响应，每条指令固定等待 COMMAND_SETTLE_S（原来的行为）
+  ack      —— 服务返回 ok 即视为完成
+  batched  —— ack + 一次请求发送一批指令（BATCH_SEPARATOR=";"）
+
+    python bench_motion.py --taps 10 --latency 0.15
+"""
+
+import argparse
+import time
+
+import motion_controller
+from fake_wcf_server import ACK, FakeWcfServer
+
+
+class _NoCamera(motion_controller.MotionController):
+    def _init_camera(self):
+        self.camera = None
+
+
+def make_controller(url, ack, separator):
+    config = motion_controller.Config()
+    config.SERVER_URL = url
+    config.ACK_RESPONSES = (ACK,) if ack else ()
+    config.BATCH_SEPARATOR = separator
+    return _NoCamera(config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点击吞吐量对比")
+    parser.add_argument("--taps", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.15, help="模拟每条指令的执行时间（秒）")
+    opts = parser.parse_args()
+
+    print(f"{'mode':<10}{'s/tap':>8}{'taps/min':>10}{'requests':>10}")
+    for name, ack, separator in (("fixed", False, None), ("ack", True, None), ("batched", True, ";")):
+        server = FakeWcfServer(command_latency=opts.latency).start()
+        controller = make_controller(server.url, ack, separator)
+        requests_before = server.requests
+        t0 = time.perf_counter()
+        for i in range(opts.taps):
+            controller.run_trajectory(controller.click_trajectory(10 * i, 20))
+        per_tap = (time.perf_counter() - t0) / opts.taps
+        print(f"{name:<10}{per_tap:>8.3f}{60 / per_tap:>10.1f}{(server.requests - requests_before) / opts.taps:>10.1f}")
+        controller.resource_handle = None  # 不向模拟服务发送关闭指令
+        controller.shutdown()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
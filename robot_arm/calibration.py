@@ -0,0 +1,134 @@
+# calibration.py
+
+"""
+基于单应矩阵的手眼标定模型。
+
+旧的标定只有一个 mm_per_pixel 和 offset_px，默认两轴同比例、没有旋转和透视。
+这里用十字标记在 N 个机械臂位置下的像素坐标拟合单应矩阵 H（RANSAC 剔除误检），
+H 把画面像素映射为“机械臂位移”（毫米）：
+  摄像头随臂移动（arm）时拟合 像素 -> -位置，固定摄像头（fixed）时拟合 像素 -> 位置，
+于是两种安装方式下都有  目标物理坐标 = 基准位置 + H(目标像素) - H(点击头像素)，
+基准位置对 arm 为当前位置、对 fixed 为原点。
+
+px_to_mm 对一组点一次完成矩阵运算，整条滑动轨迹只需调用一次。
+"""
+
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+MOUNT_SIGN = {"arm": -1.0, "fixed": 1.0}
+
+
+def detect_cross(frame_bgr: np.ndarray, min_arm_px: int = 15) -> Optional[Tuple[float, float]]:
+    """
+    白纸上深色十字标记的中心：分别用横向、纵向的长条结构元素提取横线和竖线，
+    取二者交叠区域中最大的一块的质心。找不到则返回 None。
+    """
+    gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY) if frame_bgr.ndim == 3 else frame_bgr
+    _, mask = cv2.threshold(cv2.GaussianBlur(gray, (5, 5), 0), 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    horizontal = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (min_arm_px, 1)))
+    vertical = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, min_arm_px)))
+    crossing = cv2.bitwise_and(horizontal, vertical)
+    count, _, stats, centroids = cv2.connectedComponentsWithStats(crossing)
+    if count <= 1:
+        return None
+    best = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    return float(centroids[best][0]), float(centroids[best][1])
+
+
+def fit_homography(pixels: Sequence, poses_mm: Sequence, camera_mount: str = "arm",
+                   ransac_threshold_mm: float = 1.0):
+    """
+    由 (像素, 机械臂位置) 对应点拟合 H。返回 (H, 内点掩码, 内点的均方根误差 mm)；
+    点数不足或拟合失败时抛出 ValueError。
+    """
+    src = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+    dst = MOUNT_SIGN[camera_mount] * np.asarray(poses_mm, dtype=np.float64).reshape(-1, 2)
+    if len(src) < 4:
+        raise ValueError(f"至少需要 4 组对应点，实际只有 {len(src)} 组。")
+    H, mask = cv2.findHomography(src, dst, cv2.RANSAC, ransac_threshold_mm)
+    if H is None:
+        raise ValueError("单应矩阵拟合失败（点可能共线）。")
+    inliers = mask.ravel().astype(bool)
+    residual = apply_homography(H, src[inliers]) - dst[inliers]
+    rms = float(np.sqrt(np.mean(np.sum(residual ** 2, axis=1))))
+    return H, inliers, rms
+
+
+def apply_homography(H: np.ndarray, points) -> np.ndarray:
+    """(N, 2) 点批量做透视变换，返回 (N, 2)。"""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    mapped = pts @ H[:, :2].T + H[:, 2]
+    return mapped[:, :2] / mapped[:, 2:3]
+
+
+class HandEyeModel:
+    def __init__(self, homography, clicker_px, resolution, camera_mount: str = "arm"):
+        """
+        homography：标定分辨率 resolution（宽, 高）下 像素 -> 位移(mm) 的 3x3 矩阵；
+        clicker_px：同一分辨率下点击头的像素位置。
+        """
+        self.H = np.asarray(homography, dtype=np.float64).reshape(3, 3)
+        self.clicker_px = np.asarray(clicker_px, dtype=np.float64).reshape(2)
+        self.resolution = (int(resolution[0]), int(resolution[1]))
+        self.camera_mount = camera_mount
+        self._clicker_mm = apply_homography(self.H, self.clicker_px)[0]
+        self._scaled = {self.resolution: self.H}
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["HandEyeModel"]:
+        """final_config.json 中含 homography 时返回模型，否则 None（只有旧版标定）。"""
+        if "homography" not in config:
+            return None
+        return cls(config["homography"], config["clicker_px"], config["resolution"],
+                   config.get("camera_mount", "arm"))
+
+    def to_config(self) -> dict:
+        """写入 final_config.json 的字段，同时给出兼容旧代码的 mm_per_pixel / offset_px。"""
+        w, h = self.resolution
+        return {
+            "homography": self.H.tolist(),
+            "clicker_px": self.clicker_px.tolist(),
+            "resolution": [w, h],
+            "camera_mount": self.camera_mount,
+            "mm_per_pixel": self.mm_per_pixel(),
+            "offset_px": [int(round(self.clicker_px[0] - w / 2)), int(round(self.clicker_px[1] - h / 2))],
+        }
+
+    def mm_per_pixel(self) -> float:
+        """点击头附近的平均比例（局部雅可比行列式的平方根），供只认标量比例的旧代码使用。"""
+        eps = 1.0
+        c = self.clicker_px
+        p = apply_homography(self.H, [c, c + (eps, 0), c + (0, eps)])
+        jacobian = np.stack([p[1] - p[0], p[2] - p[0]], axis=1) / eps
+        return float(np.sqrt(abs(np.linalg.det(jacobian))))
+
+    def _homography_for(self, resolution) -> np.ndarray:
+        """画面分辨率与标定时不同时，先把像素缩放回标定分辨率。"""
+        key = (int(resolution[0]), int(resolution[1]))
+        H = self._scaled.get(key)
+        if H is None:
+            scale = np.diag([self.resolution[0] / key[0], self.resolution[1] / key[1], 1.0])
+            H = self._scaled[key] = self.H @ scale
+        return H
+
+    def px_to_mm(self, points_px, base_mm=(0.0, 0.0), resolution=None) -> np.ndarray:
+        """
+        一组画面像素 (N, 2) -> 点击头需要到达的物理坐标 (N, 2)。
+        base_mm 为观察时的机械臂位置（固定摄像头时忽略）。
+        """
+        H = self._homography_for(resolution or self.resolution)
+        displacement = apply_homography(H, points_px) - self._clicker_mm
+        if self.camera_mount == "arm":
+            displacement = displacement + np.asarray(base_mm, dtype=np.float64)
+        return displacement
+
+    def mm_to_px(self, points_mm, base_mm=(0.0, 0.0), resolution=None) -> np.ndarray:
+        """px_to_mm 的逆变换：点击头到达物理坐标 (N, 2) 时对准的画面像素 (N, 2)。"""
+        H = self._homography_for(resolution or self.resolution)
+        displacement = np.asarray(points_mm, dtype=np.float64).reshape(-1, 2)
+        if self.camera_mount == "arm":
+            displacement = displacement - np.asarray(base_mm, dtype=np.float64)
+        return apply_homography(np.linalg.inv(H), displacement + self._clicker_mm)
@@ -0,0 +1,169 @@
+# camera_stream.py
+
+"""
+持久的 MJPEG 流读取器：后台线程保持一条 /video_feed 连接，
+在同一个 bytearray 里原地解析 multipart 分段，只保留最新一帧的 JPEG，
+取帧时才解码（同一帧只解码一次）。每一步观察不再重新建立 ngrok 连接。
+"""
+
+import re
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+import requests
+from PIL import Image
+
+_CONTENT_LENGTH_RE = re.compile(rb"content-length:\s*(\d+)", re.IGNORECASE)
+
+
+class MultipartParser:
+    """
+    增量解析 multipart/x-mixed-replace 流。有 Content-Length 时按长度截取，
+    否则从上次扫描到的位置继续找下一个分隔符，已扫描过的字节不会重复查找。
+    """
+
+    def __init__(self, boundary: bytes = b"frame"):
+        self._delimiter = b"--" + boundary
+        self._buf = bytearray()
+        self._body_start = -1  # 当前分段正文的起点，-1 表示还在找分段头
+        self._body_length = -1
+        self._scan = 0
+
+    def feed(self, chunk: bytes) -> Optional[bytes]:
+        """喂入一段数据，返回其中最后一个完整分段的正文（没有则 None）。"""
+        self._buf += chunk
+        latest = None
+        while True:
+            part = self._next_part()
+            if part is None:
+                return latest
+            latest = part
+
+    def _next_part(self) -> Optional[bytes]:
+        buf = self._buf
+        if self._body_start < 0:
+            start = buf.find(self._delimiter)
+            if start < 0:
+                # 保留可能是分隔符前半截的尾部
+                del buf[:max(0, len(buf) - len(self._delimiter))]
+                return None
+            header_end = buf.find(b"\r\n\r\n", start)
+            if header_end < 0:
+                del buf[:start]
+                return None
+            match = _CONTENT_LENGTH_RE.search(buf, start, header_end)
+            self._body_length = int(match.group(1)) if match else -1
+            self._body_start = self._scan = header_end + 4
+
+        body = self._body_start
+        if self._body_length >= 0:
+            end = body + self._body_length
+            if len(buf) < end:
+                return None
+        else:
+            end = buf.find(b"\r\n" + self._delimiter, self._scan)
+            if end < 0:
+                self._scan = max(body, len(buf) - len(self._delimiter) - 2)
+                return None
+        part = bytes(memoryview(buf)[body:end])
+        del buf[:end]
+        self._body_start = -1
+        return part
+
+
+class CameraStreamReader:
+    def __init__(self, url: str, headers: Optional[dict] = None, boundary: bytes = b"frame",
+                 chunk_size: int = 16384, reconnect_delay: float = 1.0):
+        self.url = url
+        self.headers = headers or {}
+        self.boundary = boundary
+        self.chunk_size = chunk_size
+        self.reconnect_delay = reconnect_delay
+        self._cond = threading.Condition()
+        self._jpeg: Optional[bytes] = None
+        self._seq = 0
+        self._timestamp = 0.0
+        self._decoded: Tuple[int, Optional[np.ndarray]] = (0, None)
+        self._running = False
+        self._response = None
+        self._thread: Optional[threading.Thread] = None
+        self.frames = 0
+        self.reconnects = 0
+
+    def start(self) -> "CameraStreamReader":
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        response = self._response
+        if response is not None:
+            response.close()  # 打断阻塞中的读取
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        while self._running:
+            try:
+                with requests.get(self.url, stream=True, timeout=10, headers=self.headers) as response:
+                    self._response = response
+                    response.raise_for_status()
+                    parser = MultipartParser(self.boundary)
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if not self._running:
+                            return
+                        jpeg = parser.feed(chunk)
+                        if jpeg is not None:
+                            self._publish(jpeg)
+            except Exception as e:
+                if self._running:
+                    print(f"  - [摄像头流] 连接中断: {e}，{self.reconnect_delay:.0f} 秒后重连...")
+            finally:
+                self._response = None
+            if self._running:
+                self.reconnects += 1
+                time.sleep(self.reconnect_delay)
+
+    def _publish(self, jpeg: bytes):
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._timestamp = time.time()
+            self.frames += 1
+            self._cond.notify_all()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def latest_bgr(self, newer_than: int = 0, wait: float = 2.0) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        (序号, BGR 图像)：序号大于 newer_than 的最新一帧，最多等待 wait 秒；
+        超时返回 (当前序号, None)。
+        """
+        deadline = time.monotonic() + wait
+        with self._cond:
+            while self._seq <= newer_than or self._jpeg is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self._seq, None
+                self._cond.wait(remaining)
+            seq, jpeg = self._seq, self._jpeg
+        if self._decoded[0] != seq:
+            self._decoded = (seq, cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR))
+        return self._decoded
+
+    def latest_image(self, newer_than: int = 0, wait: float = 2.0) -> Tuple[int, Optional[Image.Image]]:
+        seq, frame = self.latest_bgr(newer_than, wait)
+        if frame is None:
+            return seq, None
+        return seq, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def stats(self) -> dict:
+        return {"frames": self.frames, "reconnects": self.reconnects,
+                "age_s": time.time() - self._timestamp if self._timestamp else None}
@@ -0,0 +1,117 @@
+# fake_wcf_server.py
+
+"""
+本地模拟的 WCF 硬件控制服务（/MyWcfService/getstring），用于在没有机械臂时
+测试 MotionController 和网关。
+
+- duankou 非 "0"：打开串口，返回资源号 1
+- duankou == "0"：执行 daima 中的指令（可用 ";" 一次发送多条），
+  每条指令模拟 command_latency 秒的执行时间，执行完毕后返回 "ok"
+- 记录收到的每条指令和时间戳，并跟踪笔尖的当前位置
+
+    python fake_wcf_server.py --port 8082 --latency 0.15
+"""
+
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+SERVICE_PATH = "/MyWcfService/getstring"
+ACK = "ok"
+
+
+class FakeWcfServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, command_latency: float = 0.0,
+                 separator: str = ";"):
+        self.command_latency = command_latency
+        self.separator = separator
+        self.commands: List[Tuple[float, str]] = []
+        self.requests = 0
+        self.position = (0, 0)
+        self.z = 0
+        # 串口一次只能执行一条指令
+        self._serial_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{SERVICE_PATH}"
+
+    def start(self) -> "FakeWcfServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _execute(self, code: str) -> None:
+        with self._serial_lock:
+            if self.command_latency:
+                time.sleep(self.command_latency)
+            if code.startswith("x") and "y" in code:
+                x, y = code[1:].split("y")
+                self.position = (int(x), int(y))
+            elif code.startswith("z"):
+                self.z = int(code[1:])
+            self.commands.append((time.time(), code))
+
+    def _handle(self, params: dict) -> str:
+        self.requests += 1
+        if params.get("duankou", "0") != "0":
+            return "1"
+        codes = params.get("daima", "")
+        for code in codes.split(self.separator) if self.separator else [codes]:
+            if code:
+                self._execute(code)
+        return ACK
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path != SERVICE_PATH:
+                    self.send_error(404)
+                    return
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                out = server._handle(params).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 WCF 硬件控制服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.15, help="每条指令的模拟执行时间（秒）")
+    opts = parser.parse_args()
+    server = FakeWcfServer(opts.host, opts.port, opts.latency).start()
+    print(f"模拟 WCF 服务已启动: {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# frame_hub.py
+
+"""
+单生产者的摄像头帧缓存：一个采集线程读取摄像头、只编码一次 JPEG，
+所有 /video_feed 观看者和 /snapshot 共享同一份最新帧，
+N 个观看者不再意味着 N 倍的摄像头读取和 JPEG 编码。
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+import shared_modules  # noqa: F401  (把 ../test 加入 sys.path)
+import tracing
+
+
+@dataclass(frozen=True)
+class Frame:
+    seq: int  # 从 1 开始递增
+    timestamp: float
+    image: np.ndarray  # 已旋转的 BGR 画面，只读
+    jpeg: bytes
+
+
+class FrameHub:
+    def __init__(self, source: Callable[[], Optional[np.ndarray]], jpeg_quality: int = 95,
+                 idle_timeout: float = 5.0):
+        """
+        source 返回一帧 BGR 图像（或 None）；没有观看者且 idle_timeout 秒内
+        无人取快照时，采集线程暂停读取摄像头。
+        """
+        self._source = source
+        self._encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        # 已发布的帧不再被修改；新帧在采集线程里单独生成，完成后整体替换，
+        # 读者拿到的引用始终是一帧完整的画面（双缓冲）
+        self._latest: Optional[Frame] = None
+        self._subscribers = 0
+        self._last_demand = 0.0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.captured = 0
+        self.failed = 0
+
+    def start(self) -> "FrameHub":
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="frame-hub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _wanted(self) -> bool:
+        return self._subscribers > 0 or time.monotonic() - self._last_demand < self.idle_timeout
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._wanted():
+                    self._cond.wait(timeout=1.0)
+                if not self._running:
+                    return
+            image = self._source()
+            if image is None:
+                self.failed += 1
+                time.sleep(0.1)
+                continue
+            with tracing.span("encode", format="jpeg"):
+                ret, buffer = cv2.imencode('.jpg', image, self._encode_params)
+            if not ret:
+                self.failed += 1
+                continue
+            image.flags.writeable = False
+            with self._cond:
+                seq = self._latest.seq + 1 if self._latest is not None else 1
+                self._latest = Frame(seq, time.time(), image, buffer.tobytes())
+                self.captured += 1
+                self._cond.notify_all()
+
+    def _demand(self):
+        self._last_demand = time.monotonic()
+        self._cond.notify_all()
+
+    def latest(self, wait: float = 2.0, max_age: Optional[float] = None) -> Optional[Frame]:
+        """
+        最新一帧；没有帧（或最新帧比 max_age 秒更旧，如采集刚从暂停恢复）时
+        最多等待 wait 秒，仍没有则返回 None。
+        """
+        deadline = time.monotonic() + wait
+        with self._cond:
+            self._demand()
+            while True:
+                frame = self._latest
+                if frame is not None and (max_age is None or time.time() - frame.timestamp <= max_age):
+                    return frame
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def subscribe(self):
+        """依次产出新帧（跳过观看者来不及取走的旧帧），直到生成器被关闭。"""
+        with self._cond:
+            self._subscribers += 1
+            self._demand()
+        try:
+            last_seq = 0
+            while self._running:
+                with self._cond:
+                    while self._running and (self._latest is None or self._latest.seq == last_seq):
+                        self._cond.wait(timeout=1.0)
+                    frame = self._latest
+                if frame is None:
+                    continue
+                last_seq = frame.seq
+                yield frame
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def stats(self) -> dict:
+        frame = self._latest
+        return {
+            "subscribers": self._subscribers,
+            "captured": self.captured,
+            "failed": self.failed,
+            "latest_seq": frame.seq if frame is not None else None,
+            "latest_age_s": time.time() - frame.timestamp if frame is not None else None,
+        }
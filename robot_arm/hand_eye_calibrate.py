@@ -1,9 +1,11 @@
 # final_calibrate.py (The Simplest Correct Version)
+import argparse
 import cv2
 import motion_controller
 import time
 import json
 import numpy as np
+from calibration import HandEyeModel, detect_cross, fit_homography
 
 # --- 全局变量和鼠标回调 ---
 mouse_click_pos = None
@@ -110,5 +112,85 @@ def run_final_calibration():
         cv2.destroyAllWindows()
 
 
+def capture_cross(arm, attempts=5):
+    """读几帧丢掉摄像头缓冲里的旧画面，连续两帧检测结果一致（1.5 像素内）才采用。"""
+    previous = None
+    for _ in range(attempts):
+        for _ in range(3):
+            frame = arm.capture_image()
+        if frame is None:
+            continue
+        point = detect_cross(frame)
+        if point is not None and previous is not None and np.hypot(point[0] - previous[0], point[1] - previous[1]) < 1.5:
+            return point, frame.shape[1::-1]
+        previous = point
+    return None, None
+
+
+def run_homography_calibration(grid=5, span_mm=20.0, settle_s=1.0, camera_mount="arm"):
+    """
+    自动标定：机械臂走 grid x grid 个位置（以原点为中心、边长 2*span_mm），
+    每个位置自动检测十字标记，RANSAC 拟合单应矩阵后写入 final_config.json。
+    """
+    arm = None
+    try:
+        config = motion_controller.Config()
+        arm = motion_controller.MotionController(config)
+        cv2.namedWindow("Final Calibration")
+        cv2.setMouseCallback("Final Calibration", mouse_callback)
+
+        print("\n--- 单应矩阵手眼标定程序 ---")
+        arm.move_to(0, 0)
+        time.sleep(settle_s)
+        input("  - 请把白纸上的十字标记放在摄像头视野中央附近，然后按回车键开始自动采集...")
+
+        pixels, poses, resolution = [], [], None
+        for y in np.linspace(-span_mm, span_mm, grid):
+            for x in np.linspace(-span_mm, span_mm, grid):
+                arm.move_to(x, y)
+                time.sleep(settle_s)
+                point, size = capture_cross(arm)
+                if point is None:
+                    print(f"  - 位置 ({x:.1f}, {y:.1f})mm: 未检测到十字，跳过。")
+                    continue
+                resolution = resolution or size
+                pixels.append(point)
+                poses.append((x, y))
+                print(f"  - 位置 ({x:.1f}, {y:.1f})mm -> 十字像素 ({point[0]:.1f}, {point[1]:.1f})")
+        arm.move_to(0, 0)
+        time.sleep(settle_s)
+
+        H, inliers, rms = fit_homography(pixels, poses, camera_mount)
+        print(f"  - 拟合完成: {int(inliers.sum())}/{len(pixels)} 个内点，均方根误差 {rms:.3f}mm")
+        for (px, pose), ok in zip(zip(pixels, poses), inliers):
+            if not ok:
+                print(f"    剔除的误检: 位置 {pose} 像素 {px}")
+
+        print("\n  - 请将【黄色点击头】精确地对准十字中心。")
+        input("  - 对准后按回车键...")
+        clicker_px = get_user_click(arm, "对准已完成。请在窗口中点击【十字的中心】（也就是点击头的位置）。")
+
+        model = HandEyeModel(H, clicker_px, resolution, camera_mount)
+        calibration_data = {**model.to_config(), "rms_error_mm": rms, "inliers": int(inliers.sum())}
+        with open('final_config.json', 'w') as f:
+            json.dump(calibration_data, f, indent=4)
+        print("\n标定成功！单应矩阵已保存到 final_config.json")
+
+    except (KeyboardInterrupt, ValueError) as e:
+        print(f"\n操作被中断或出错: {e}")
+    finally:
+        if arm: arm.shutdown()
+        cv2.destroyAllWindows()
+
+
 if __name__ == '__main__':
-    run_final_calibration()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="手眼标定")
+    parser.add_argument("--homography", action="store_true", help="自动采集十字标记并拟合单应矩阵")
+    parser.add_argument("--grid", type=int, default=5, help="每个方向的采样点数")
+    parser.add_argument("--span", type=float, default=20.0, help="采样范围（mm，以原点为中心的半边长）")
+    parser.add_argument("--mount", choices=["arm", "fixed"], default="arm", help="摄像头安装方式")
+    opts = parser.parse_args()
+    if opts.homography:
+        run_homography_calibration(opts.grid, opts.span, camera_mount=opts.mount)
+    else:
+        run_final_calibration()
\ No newline at end of file
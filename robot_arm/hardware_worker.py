@@ -0,0 +1,207 @@
+# hardware_worker.py
+
+"""
+机械臂指令队列：由唯一的硬件线程持有 MotionController，按顺序执行排队的指令。
+
+网关的 Flask 是多线程的，多个 /click 请求若直接调用控制器，
+x..y.. / z9 / z-8 指令会互相穿插。这里所有动作都先进入一个有界队列，
+每个请求拿到一个 id 和 Future，可以等待完成或稍后查询状态；
+队列满时 submit 直接抛出 QueueFull（网关返回 429），而不是无限堆积。
+"""
+
+import collections
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import shared_modules  # noqa: F401  (把 ../test 加入 sys.path)
+import tracing
+
+# 指令名 -> MotionController 方法名
+COMMANDS = {
+    "click": "move_and_click",
+    "move": "move_to",
+    "swipe": "swipe",
+    "trajectory": "run_trajectory",
+}
+
+
+class QueueFull(RuntimeError):
+    """指令队列已满，调用方应稍后重试。"""
+
+
+class HardwareNotReady(RuntimeError):
+    """硬件尚未初始化完成（或初始化失败）。"""
+
+
+class CommandFailed(RuntimeError):
+    """控制器报告指令执行失败（返回 False，例如串口未确认）。"""
+
+
+@dataclass
+class Job:
+    id: int
+    command: str
+    args: tuple
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    future: Future = field(default_factory=Future, repr=False)
+
+    @property
+    def state(self) -> str:
+        if not self.future.done():
+            return "running" if self.started is not None else "queued"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def to_dict(self) -> dict:
+        info = {"id": self.id, "command": self.command, "args": list(self.args), "state": self.state,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished}
+        if self.state == "failed":
+            info["error"] = str(self.future.exception())
+        return info
+
+
+class HardwareWorker:
+    def __init__(self, controller_factory: Callable[[], Any], max_queue: int = 8, history: int = 256):
+        """
+        controller_factory 在硬件线程里调用，返回 MotionController；
+        max_queue 为排队（不含正在执行）的指令上限，history 为可查询状态的最近指令数。
+        """
+        self._factory = controller_factory
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=max_queue)
+        self.max_queue = max_queue
+        self._ids = itertools.count(1)
+        self._jobs: "collections.OrderedDict[int, Job]" = collections.OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.controller = None
+        self.state = "initializing"  # -> ready / failed / stopped
+        self.error: Optional[str] = None
+        self._ready = threading.Event()
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self.current: Optional[Job] = None
+
+    def start(self) -> "HardwareWorker":
+        self._thread = threading.Thread(target=self._run, name="hardware-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        self._ready.wait(timeout)
+        return self.state == "ready"
+
+    def _run(self):
+        print("\n[硬件线程]: 正在初始化硬件...")
+        try:
+            self.controller = self._factory()
+            self.state = "ready"
+            print("[硬件线程]: 硬件已就绪！网关现在可以接收指令。")
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            print(f"[硬件线程]: CRITICAL! 硬件初始化失败: {e}")
+        finally:
+            self._ready.set()
+        if self.state != "ready":
+            self._fail_pending(HardwareNotReady(self.error))
+            return
+
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self._execute(job)
+        self._fail_pending(HardwareNotReady("worker stopped"))
+
+    def _execute(self, job: Job):
+        job.started = time.time()
+        self.current = job
+        try:
+            with tracing.span("hardware_job", command=job.command, id=job.id):
+                result = getattr(self.controller, COMMANDS[job.command])(*job.args)
+            if not result:
+                raise CommandFailed(f"{job.command} was not acknowledged by the controller")
+        except Exception as e:
+            job.finished = time.time()
+            self._account(job, ok=False)
+            job.future.set_exception(e)
+            print(f"ERROR: 执行指令 #{job.id} {job.command}{job.args} 时出错: {e}")
+        else:
+            job.finished = time.time()
+            self._account(job, ok=True)
+            job.future.set_result(result)
+        finally:
+            self.current = None
+
+    def _account(self, job: Job, ok: bool):
+        with self._lock:
+            self.counters["completed" if ok else "failed"] += 1
+            self._wait_total += job.started - job.submitted
+            self._run_total += job.finished - job.started
+
+    def _fail_pending(self, error: Exception):
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and not job.future.done():
+                job.future.set_exception(error)
+
+    def submit(self, command: str, *args) -> Job:
+        """把指令放入队列并立即返回；队列满时抛出 QueueFull。"""
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command: {command}")
+        with self._lock:  # 与 stop() 互斥：状态检查和入队之间不会插入结束标记
+            if self.state != "ready":
+                raise HardwareNotReady(self.error or f"hardware {self.state}")
+            job = Job(next(self._ids), command, args)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.counters["rejected"] += 1
+                raise QueueFull(f"{self.max_queue} commands already queued") from None
+            self.counters["submitted"] += 1
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._history:
+                self._jobs.popitem(last=False)
+        return job
+
+    def job(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            done = self.counters["completed"] + self.counters["failed"]
+            current = self.current
+            return {
+                "state": self.state,
+                "error": self.error,
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "busy": current is not None,
+                "current": current.id if current is not None else None,
+                **self.counters,
+                "mean_wait_s": self._wait_total / done if done else 0.0,
+                "mean_run_s": self._run_total / done if done else 0.0,
+            }
+
+    def stop(self, timeout: float = 10.0):
+        """处理完已排队的指令后停止硬件线程并关闭控制器。"""
+        # 先改状态再放入结束标记，之后的 submit 会被拒绝，不会排在标记后面永远得不到结果
+        with self._lock:
+            self.state = "stopped"
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        if self.controller is not None:
+            self.controller.shutdown()
+            self.controller = None
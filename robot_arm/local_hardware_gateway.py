@@ -2,36 +2,62 @@
 
 from flask import Flask, request, jsonify, Response
 import cv2
-import motion_controller
-import time
+import json
+import math
 import threading
+import motion_controller
+from concurrent.futures import TimeoutError as FutureTimeout
+from hardware_worker import CommandFailed, HardwareWorker, HardwareNotReady, QueueFull
+from frame_hub import FrameHub
+from screen_rectifier import ScreenRectifier
 
 print("--- 本地硬件网关启动程序 ---")
 
 # --- 全局变量 ---
 app = Flask(__name__)
-arm_controller = None
+# 唯一持有 MotionController 的硬件线程；所有机械臂动作都经它排队执行
+worker = HardwareWorker(lambda: motion_controller.MotionController(motion_controller.Config()), max_queue=8)
+# /click 等请求默认等待动作完成的最长时间（秒），超时则返回 202 和指令 id
+WAIT_TIMEOUT = 8.0
 
 
-# --- 摄像头相关 ---
-def gen_frames():
-    """摄像头视频流生成器"""
-    while True:
-        if arm_controller is None:
-            time.sleep(1)
-            continue
+def read_camera():
+    arm_controller = worker.controller
+    return arm_controller.capture_image() if arm_controller is not None else None
 
-        frame = arm_controller.capture_image()
-        if frame is None:
-            time.sleep(0.1)
-            continue
 
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
+# 唯一读取摄像头的线程；每帧只编码一次 JPEG，分发给所有观看者
+frames = FrameHub(read_camera)
+# 手机屏幕区域校正（/screen_feed、/screen_snapshot）；每帧只校正、编码一次
+screen = ScreenRectifier()
+_screen_lock = threading.Lock()
+_screen_frame = (0, None, None)  # (帧序号, JPEG, 屏幕四角)
+
+
+def screen_jpeg(frame):
+    """frame 对应的屏幕校正 JPEG 和四角坐标；画面中找不到屏幕时 JPEG 为 None。"""
+    global _screen_frame
+    with _screen_lock:
+        if _screen_frame[0] != frame.seq:
+            view = screen.rectify(frame.image)
+            if view is None:
+                _screen_frame = (frame.seq, None, None)
+            else:
+                _screen_frame = (frame.seq, cv2.imencode('.jpg', view.image)[1].tobytes(), view.quad.tolist())
+        return _screen_frame[1], _screen_frame[2]
+
+
+# --- 摄像头相关 ---
+def gen_frames(screen_only=False):
+    """摄像头视频流生成器（共享采集线程的帧）；screen_only 时只输出校正后的手机屏幕"""
+    for frame in frames.subscribe():
+        jpeg = screen_jpeg(frame)[0] if screen_only else frame.jpeg
+        if jpeg is None:
             continue
-        frame_bytes = buffer.tobytes()
+        # Content-Length 让客户端按长度截取分段，不必在 JPEG 数据里搜索分隔符
         yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+               b'Content-Type: image/jpeg\r\n'
+               b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
 
 
 @app.route('/video_feed')
@@ -41,56 +67,183 @@ def video_feed():
     return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+@app.route('/screen_feed')
+def screen_feed():
+    """校正后的手机屏幕直播"""
+    return Response(gen_frames(screen_only=True), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+@app.route('/screen_snapshot')
+def screen_snapshot():
+    """最新一帧的手机屏幕正视图；X-Screen-Quad 为屏幕四角在摄像头画面中的坐标"""
+    frame = frames.latest(wait=2.0, max_age=1.0)
+    jpeg, quad = screen_jpeg(frame) if frame is not None else (None, None)
+    if jpeg is None:
+        return jsonify({"status": "error", "message": "No screen found in the camera frame."}), 503
+    response = Response(jpeg, mimetype='image/jpeg')
+    response.headers['X-Frame-Seq'] = str(frame.seq)
+    response.headers['X-Screen-Quad'] = json.dumps(quad)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/snapshot')
+def snapshot():
+    """立即返回最新一帧 JPEG（采集暂停过时会等待新的一帧）"""
+    frame = frames.latest(wait=2.0, max_age=1.0)
+    if frame is None:
+        return jsonify({"status": "error", "message": "No camera frame available."}), 503
+    response = Response(frame.jpeg, mimetype='image/jpeg')
+    response.headers['X-Frame-Seq'] = str(frame.seq)
+    response.headers['X-Frame-Timestamp'] = f"{frame.timestamp:.3f}"
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
 # --- 机械臂相关 ---
-@app.route('/click', methods=['POST'])
-def click_at_coordinate():
-    """机械臂点击的网址"""
-    if arm_controller is None:
-        return jsonify({"status": "error", "message": "Hardware not ready."}), 503
+def json_body():
+    """请求体中的 JSON 对象；没有（或无法解析的）请求体视为 {}，其他 JSON 类型抛出 ValueError。"""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object.")
+    return data
 
-    data = request.get_json()
-    x = data.get('x')
-    y = data.get('y')
-    if x is None or y is None:
-        return jsonify({"status": "error", "message": "Missing coordinates."}), 400
 
-    print(f"收到网络指令: 点击物理坐标 ({x}, {y})")
+def read_number(data, name, default=None, minimum=None):
+    """data[name] 转为有限的 float；缺失（且没有默认值）、不是数字或小于 minimum 时抛出 ValueError。"""
+    value = data.get(name, default)
+    if value is None:
+        raise ValueError(f"Missing {name}.")
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid {name}: {value!r}")
     try:
-        # 直接使用全局的、已经连接好的控制器实例
-        arm_controller.move_and_click(float(x), float(y))
-        return jsonify({"status": "success"})
-    except Exception as e:
-        print(f"ERROR: 执行点击时出错: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r}") from None
+    if not math.isfinite(number) or (minimum is not None and number < minimum):
+        raise ValueError(f"Invalid {name}: {value!r}")
+    return number
 
 
-# --- 主启动流程 ---
-def initialize_hardware():
+def bad_request(error):
+    return jsonify({"status": "error", "message": str(error)}), 400
+
+
+def submit_job(command, *args):
     """
-    这是核心初始化函数，它会在一个独立的线程中运行，
-    以避免阻塞 Flask 主服务。
+    把动作放入硬件队列。请求体里 "wait": false 时立即返回 202 和指令 id，
+    否则等待动作完成（最多 WAIT_TIMEOUT 秒）。队列满时返回 429，
+    控制器报告执行失败时返回 502。
     """
-    global arm_controller
-    print("\n[硬件线程]: 正在初始化硬件...")
     try:
-        config = motion_controller.Config()
-        arm_controller = motion_controller.MotionController(config)
-        print("[硬件线程]: 硬件已就绪！网关现在可以接收指令。")
+        data = json_body()
+        timeout = read_number(data, "timeout", WAIT_TIMEOUT, minimum=0)
+    except ValueError as e:
+        return bad_request(e)
+    try:
+        job = worker.submit(command, *args)
+    except HardwareNotReady as e:
+        return jsonify({"status": "error", "message": f"Hardware not ready: {e}"}), 503
+    except QueueFull as e:
+        response = jsonify({"status": "busy", "message": str(e), "queue_depth": worker.metrics()["queue_depth"]})
+        response.headers["Retry-After"] = "1"
+        return response, 429
+
+    if not data.get("wait", True):
+        return jsonify({"status": "queued", "id": job.id}), 202
+    try:
+        job.future.result(timeout=timeout)
+    except FutureTimeout:
+        return jsonify({"status": job.state, "id": job.id}), 202
+    except CommandFailed as e:
+        return jsonify({"status": "error", "id": job.id, "message": str(e)}), 502
     except Exception as e:
-        print(f"[硬件线程]: CRITICAL! 硬件初始化失败: {e}")
+        return jsonify({"status": "error", "id": job.id, "message": str(e)}), 500
+    return jsonify({"status": "success", "id": job.id})
+
+
+def read_coordinates(*names):
+    """请求体中的坐标列表；缺失或不是数字时抛出 ValueError。"""
+    data = json_body()
+    if any(data.get(name) is None for name in names):
+        raise ValueError("Missing coordinates.")
+    return [read_number(data, name) for name in names]
+
+
+@app.route('/click', methods=['POST'])
+def click_at_coordinate():
+    """机械臂点击的网址"""
+    try:
+        coords = read_coordinates('x', 'y')
+    except ValueError as e:
+        return bad_request(e)
+    print(f"收到网络指令: 点击物理坐标 ({coords[0]}, {coords[1]})")
+    return submit_job("click", *coords)
+
+
+@app.route('/move', methods=['POST'])
+def move_to_coordinate():
+    """机械臂只移动、不点击的网址"""
+    try:
+        coords = read_coordinates('x', 'y')
+    except ValueError as e:
+        return bad_request(e)
+    return submit_job("move", *coords)
+
+
+@app.route('/swipe', methods=['POST'])
+def swipe_between_coordinates():
+    """机械臂滑动的网址"""
+    try:
+        coords = read_coordinates('x1', 'y1', 'x2', 'y2')
+        duration = read_number(json_body(), 'duration', 1.0, minimum=0)
+    except ValueError as e:
+        return bad_request(e)
+    return submit_job("swipe", *coords, duration)
+
+
+@app.route('/trajectory', methods=['POST'])
+def run_trajectory():
+    """一次提交整条轨迹：{"steps": [["move", x, y], ["z", 9], ["wait", 0.1], ["z", -8]]}"""
+    body = request.get_json(silent=True)
+    try:
+        steps = motion_controller.MotionController.parse_trajectory(
+            body.get('steps') if isinstance(body, dict) else None)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid steps: {e}"}), 400
+    return submit_job("trajectory", steps)
+
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """查询某条指令的状态（queued / running / done / failed）"""
+    job = worker.job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job id."}), 404
+    return jsonify(job.to_dict())
 
 
+@app.route('/status')
+def gateway_status():
+    """硬件状态、队列指标与摄像头采集统计"""
+    position = getattr(worker.controller, "position", None)
+    return jsonify({**worker.metrics(), "position": position, "camera": frames.stats()})
+
+
+# --- 主启动流程 ---
 if __name__ == '__main__':
-    # 1. 启动一个独立的后台线程来处理耗时且可能失败的硬件初始化
-    init_thread = threading.Thread(target=initialize_hardware, daemon=True)
-    init_thread.start()
+    # 1. 启动硬件线程：它先在后台完成耗时且可能失败的硬件初始化，然后按顺序执行排队的指令
+    worker.start()
+    frames.start()
 
     # 2. Flask Web 服务器立刻在前台启动，不会被硬件初始化卡住
     print("\n--- 本地硬件网关已启动 ---")
     print("硬件正在后台初始化，请稍候...")
     print("您可以随时通过下面的地址访问服务：")
-    print("  - 摄像头: http://<您的IP>:5000/video_feed")
-    print("  - 机械臂: POST http://<您的IP>:5001/click")
+    print("  - 摄像头: http://<您的IP>:5000/video_feed  (最新一帧: /snapshot)")
+    print("  - 机械臂: POST http://<您的IP>:5000/click  (/swipe, /jobs/<id>, /status)")
     print("--------------------------\n")
 
 
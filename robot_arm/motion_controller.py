@@ -1,18 +1,37 @@
 # motion_controller.py (V3 - 纯净驱动版)
 
+import math
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
 import cv2
 
+import shared_modules  # noqa: F401  (把 ../test 加入 sys.path)
+import tracing
+
 
 # ==============================================================================
 # ======================== PART 1: 配置区域 ==================================
 # ==============================================================================
 
+# 轨迹步骤类型 -> 参数个数
+TRAJECTORY_ARITY = {"move": 2, "z": 1, "wait": 1}
+
+
 class Config:
     SERVER_URL = "http://127.0.0.1:8082/MyWcfService/getstring"
     SERIAL_PORT = 'COM10'
     CAMERA_INDEX = 1
+    # 服务未确认完成时，每条指令发出后留给硬件执行的时间（秒）
+    COMMAND_SETTLE_S = 0.2
+    # 服务的响应内容属于其中之一时视为硬件已执行完毕，不再固定等待；
+    # 空元组表示不信任响应内容，总是等待 COMMAND_SETTLE_S
+    ACK_RESPONSES = ()
+    # 服务支持一次请求携带多条指令时的分隔符（如 ";"），None 表示逐条发送
+    BATCH_SEPARATOR = None
+    # 点击时笔尖按下后停留的时间（秒）
+    PRESS_DWELL_S = 0.1
 
 
 # ==============================================================================
@@ -28,6 +47,16 @@ class MotionController:
         self.config = config
         self.resource_handle = None
         self.camera = None
+        # 复用连接：每条指令不再新建 TCP 连接
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.acked_commands = 0
+        self.timed_commands = 0
+        # 最近一次成功发送的移动目标（物理坐标），启动时未知
+        self.position = None
+        # 视频流可能在多个 Flask 线程里同时取帧，VideoCapture 本身不是线程安全的
+        self._camera_lock = threading.Lock()
 
         # 连接硬件和摄像头
         self._connect_to_service()
@@ -48,7 +77,7 @@ class MotionController:
         for attempt in range(max_retries):
             params = {"duankou": self.config.SERIAL_PORT, "hco": 0, "daima": 0}
             try:
-                response = requests.get(self.config.SERVER_URL, params=params, timeout=5)
+                response = self.session.get(self.config.SERVER_URL, params=params, timeout=5)
                 response.raise_for_status()
                 response_text = response.text.strip()
 
@@ -81,54 +110,128 @@ class MotionController:
         raise ConnectionError(
             f"在 {max_retries} 次尝试后，仍未能从本地服务获取到有效的资源号。请检查硬件服务是否正在运行且稳定。")
 
-    def _send_command(self, command_code: str):
+    def _send_command(self, command_code: str) -> bool:
         """向硬件发送一个指令字符串。"""
+        return self._send_codes([command_code])
+
+    def _send_codes(self, codes) -> bool:
+        """
+        按顺序发送若干条指令。配置了 BATCH_SEPARATOR 时合并成一次请求；
+        服务返回 ACK 即视为执行完毕，否则按 COMMAND_SETTLE_S 等待。
+        """
         if self.resource_handle is None:
             print("ERROR: 资源号无效，无法发送指令。")
-            return
-        params = {"duankou": "0", "hco": self.resource_handle, "daima": command_code}
-        # print(f"DEBUG: 发送指令代码: {command_code}") # 可以改为DEBUG级别
-        try:
-            requests.get(self.config.SERVER_URL, params=params, timeout=2)
-            time.sleep(0.2)  # 留出硬件响应时间
-        except requests.exceptions.RequestException as e:
-            print(f"WARNING: 发送指令 '{command_code}' 时出错: {e}")
+            return False
+        sep = self.config.BATCH_SEPARATOR
+        requests_codes = [sep.join(codes)] if sep else list(codes)
+        for daima in requests_codes:
+            count = len(codes) if sep else 1
+            params = {"duankou": "0", "hco": self.resource_handle, "daima": daima}
+            try:
+                with tracing.span("actuate", command=daima):
+                    response = self.session.get(self.config.SERVER_URL, params=params,
+                                                timeout=2 + self.config.COMMAND_SETTLE_S * count)
+                    if response.ok and response.text.strip().strip('"') in self.config.ACK_RESPONSES:
+                        self.acked_commands += count
+                    else:
+                        time.sleep(self.config.COMMAND_SETTLE_S * count)  # 留出硬件响应时间
+                        self.timed_commands += count
+            except requests.exceptions.RequestException as e:
+                print(f"WARNING: 发送指令 '{daima}' 时出错: {e}")
+                return False
+        return True
 
+    @staticmethod
+    def parse_trajectory(steps) -> list:
+        """
+        校验外部传入的轨迹（如网关收到的 JSON）：每步为 ["move", x, y]、["z", 深度]
+        或 ["wait", 秒]，参数必须是数值（wait 不能为负）。返回元组列表，不合法时抛出 ValueError。
+        """
+        if not isinstance(steps, (list, tuple)) or not steps:
+            raise ValueError("steps 必须是非空列表")
+        parsed = []
+        for i, step in enumerate(steps):
+            if not isinstance(step, (list, tuple)) or not step or not isinstance(step[0], str) \
+                    or step[0] not in TRAJECTORY_ARITY:
+                raise ValueError(f"第 {i} 步无效: {step!r}")
+            args = step[1:]
+            if len(args) != TRAJECTORY_ARITY[step[0]]:
+                raise ValueError(f"第 {i} 步参数个数错误: {step!r}")
+            if any(isinstance(a, bool) or not isinstance(a, (int, float)) or not math.isfinite(a) for a in args):
+                raise ValueError(f"第 {i} 步参数必须是数值: {step!r}")
+            if step[0] == "wait" and args[0] < 0:
+                raise ValueError(f"第 {i} 步等待时间不能为负: {step!r}")
+            parsed.append((step[0], *args))
+        return parsed
+
+    @staticmethod
+    def _step_code(step) -> str:
+        kind = step[0]
+        if kind == "move":
+            return f"x{int(step[1])}y{int(step[2])}"
+        if kind == "z":
+            return f"z{int(step[1])}"
+        raise ValueError(f"未知的轨迹步骤: {step}")
+
+    def run_trajectory(self, steps) -> bool:
+        """
+        按顺序执行一条轨迹。steps 中每项为 ("move", x, y)、("z", 深度) 或 ("wait", 秒)；
+        两个 wait 之间的硬件指令作为一批发送。任何一批失败即中止并返回 False。
+        """
+        pending, target = [], None
+        for step in list(steps) + [("wait", 0)]:
+            if step[0] == "wait":
+                if pending and not self._send_codes(pending):
+                    return False
+                if target is not None:
+                    self.position = target
+                pending, target = [], None
+                if step[1]:
+                    time.sleep(step[1])
+            else:
+                pending.append(self._step_code(step))
+                if step[0] == "move":
+                    target = (float(step[1]), float(step[2]))
+        return True
+
+    def click_trajectory(self, x: float = None, y: float = None):
+        """（可选移动到物理坐标后）按下、停留、抬起。"""
+        dwell = self.config.PRESS_DWELL_S
+        # 移动后先停顿再按下，避免机械臂尚未到位就开始下压
+        steps = [("move", x, y), ("wait", dwell)] if x is not None else []
+        return steps + [("z", 9), ("wait", dwell), ("z", -8)]
+
+    @staticmethod
+    def swipe_trajectory(x1: float, y1: float, x2: float, y2: float, duration: float = 1.0):
+        return [("move", x1, y1), ("z", 3), ("move", x2, y2), ("wait", duration), ("z", -8)]
 
     def move_to(self, x: float, y: float):
         """移动到指定的【物理】坐标。"""
         print(f"INFO: 移动到物理坐标 ({x:.2f}, {y:.2f})")
-        move_command = f"x{int(x)}y{int(y)}"
-        self._send_command(move_command)
+        return self.run_trajectory([("move", x, y)])
 
     def click(self):
         """在当前位置执行一次点击（下降后抬起）。"""
         print("INFO: 执行点击...")
-        self._send_command("z9")  # 下降
-        time.sleep(0.1)
-        self._send_command("z-8")  # 抬起
+        return self.run_trajectory(self.click_trajectory())
 
     def swipe(self, x1: float, y1: float, x2: float, y2: float, duration: float = 1.0):
         """执行一次从物理坐标A到物理坐标B的滑动。"""
         print(f"INFO: 从({x1:.2f},{y1:.2f}) 滑动到 ({x2:.2f},{y2:.2f})")
-        self.move_to(x1, y1)
-        self._send_command("z3")  # 下降到滑动高度
-        self.move_to(x2, y2)
-        time.sleep(duration)
-        self._send_command("z-8")  # 抬起
+        return self.run_trajectory(self.swipe_trajectory(x1, y1, x2, y2, duration))
 
     def move_and_click(self, x: float, y: float):
         """组合操作：移动到指定物理坐标然后点击。"""
-        self.move_to(x, y)
-        time.sleep(0.1)
-        self.click()
+        print(f"INFO: 移动到物理坐标 ({x:.2f}, {y:.2f}) 并点击")
+        return self.run_trajectory(self.click_trajectory(x, y))
 
     def capture_image(self):
         """从控制器关联的摄像头捕获一帧图像。"""
         if not self.camera or not self.camera.isOpened():
             print("ERROR: 摄像头未初始化或已关闭。")
             return None
-        ret, frame = self.camera.read()
+        with self._camera_lock, tracing.span("capture", camera=self.config.CAMERA_INDEX):
+            ret, frame = self.camera.read()
         if not ret:
             print("WARNING: 无法从摄像头读取画面。")
             return None
@@ -142,9 +245,11 @@ class MotionController:
             self._send_command("0")  # 发送关闭指令
             self.resource_handle = None
             print("  - 硬件资源已释放。")
+        self.session.close()
         if self.camera:
-            self.camera.release()
-            self.camera = None
+            with self._camera_lock:
+                self.camera.release()
+                self.camera = None
             print("  - 摄像头已释放。")
         print("控制器已关闭。")
 
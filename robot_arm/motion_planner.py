@@ -0,0 +1,203 @@
+# motion_planner.py
+
+"""
+机械臂运动规划：记住机械臂的当前位置，在任意位置观察、按当前位姿换算目标坐标，
+不再每一步都回到原点。可选闭环修正：先悬停到目标上方，在画面中重新找到
+目标和黄色点击头，按两者的像素误差修正后再按下。
+"""
+
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from calibration import HandEyeModel
+
+# 黄色点击头的 HSV 范围（OpenCV 的 H 取值 0~180）
+STYLUS_HSV_LOW = (18, 90, 90)
+STYLUS_HSV_HIGH = (38, 255, 255)
+
+
+def to_bgr(image) -> np.ndarray:
+    """PIL.Image（RGB）或 BGR ndarray -> BGR ndarray"""
+    if isinstance(image, np.ndarray):
+        return image
+    return cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+def detect_stylus_tip(frame_bgr: np.ndarray, near: Optional[Tuple[float, float]] = None,
+                      min_area: int = 30) -> Optional[Tuple[int, int]]:
+    """黄色点击头在画面中的位置（色块质心）；有多个色块时取离 near 最近的，否则取最大的。"""
+    hsv = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, np.array(STYLUS_HSV_LOW), np.array(STYLUS_HSV_HIGH))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    blobs = []
+    for contour in contours:
+        m = cv2.moments(contour)
+        if m["m00"] >= min_area:
+            blobs.append((m["m00"], (int(m["m10"] / m["m00"]), int(m["m01"] / m["m00"]))))
+    if not blobs:
+        return None
+    if near is not None:
+        return min(blobs, key=lambda b: (b[1][0] - near[0]) ** 2 + (b[1][1] - near[1]) ** 2)[1]
+    return max(blobs)[1]
+
+
+def locate_patch(frame_bgr: np.ndarray, patch: np.ndarray, predicted: Tuple[float, float],
+                 search_radius: int, min_score: float = 0.6) -> Optional[Tuple[int, int]]:
+    """在 predicted 附近 search_radius 像素内匹配 patch，返回匹配中心（分数过低则 None）。"""
+    ph, pw = patch.shape[:2]
+    h, w = frame_bgr.shape[:2]
+    x0 = max(0, int(predicted[0] - search_radius - pw / 2))
+    y0 = max(0, int(predicted[1] - search_radius - ph / 2))
+    x1 = min(w, int(predicted[0] + search_radius + pw / 2))
+    y1 = min(h, int(predicted[1] + search_radius + ph / 2))
+    region = frame_bgr[y0:y1, x0:x1]
+    if region.shape[0] < ph or region.shape[1] < pw:
+        return None
+    scores = cv2.matchTemplate(region, patch, cv2.TM_CCOEFF_NORMED)
+    _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+    if best < min_score:
+        return None
+    return x0 + bx + pw // 2, y0 + by + ph // 2
+
+
+class MotionPlanner:
+    def __init__(self, calibration: dict, move_fn: Callable[[float, float], bool],
+                 click_fn: Callable[[float, float], bool], capture_fn: Optional[Callable] = None,
+                 swipe_fn: Optional[Callable] = None, camera_mount: str = "arm", closed_loop: bool = False, max_correction_mm: float = 8.0,
+                 tolerance_px: float = 3.0, patch_size: int = 48):
+        """
+        calibration 为 final_config.json 的内容：含 homography 时用单应矩阵换算
+        （安装方式以标定文件为准），否则用 mm_per_pixel、offset_px。
+        camera_mount="arm"：摄像头随机械臂移动，目标 = 当前位置 + 像素偏移；
+        camera_mount="fixed"：摄像头固定，像素与物理坐标的关系与当前位置无关。
+        swipe_fn(x1, y1, x2, y2, duration) 用于 swipe_px。
+        closed_loop 需要 capture_fn（返回移动结束、画面稳定后拍到的一帧，取不到时返回 None），
+        按下前用画面修正一次位置，修正量超过 max_correction_mm 时认为检测不可靠，不修正。
+        """
+        if camera_mount not in ("arm", "fixed"):
+            raise ValueError(f"camera_mount must be 'arm' or 'fixed', got {camera_mount!r}")
+        self.calibration = calibration
+        self.model = HandEyeModel.from_config(calibration)
+        if self.model is not None:
+            camera_mount = self.model.camera_mount
+        self.mm_per_pixel = calibration['mm_per_pixel']
+        self._move_fn = move_fn
+        self._click_fn = click_fn
+        self._capture_fn = capture_fn
+        self._swipe_fn = swipe_fn
+        self.camera_mount = camera_mount
+        self.closed_loop = closed_loop and capture_fn is not None
+        self.max_correction_mm = max_correction_mm
+        self.tolerance_px = tolerance_px
+        self.patch_size = patch_size
+        self.pose_mm: Optional[Tuple[float, float]] = None  # 未知（尚未移动过）
+        self.last_correction_mm: Optional[Tuple[float, float]] = None
+
+    def clicker_px(self, resolution) -> Tuple[float, float]:
+        """点击头在画面中的像素位置（摄像头随臂移动时固定不变；固定摄像头时为原点处的位置）。"""
+        cam_w, cam_h = resolution
+        if self.model is not None:
+            cal_w, cal_h = self.model.resolution
+            return self.model.clicker_px[0] * cam_w / cal_w, self.model.clicker_px[1] * cam_h / cal_h
+        offset_x, offset_y = self.calibration['offset_px']
+        return cam_w / 2 + offset_x, cam_h / 2 + offset_y
+
+    def points_to_mm(self, points_px, resolution) -> np.ndarray:
+        """一组画面像素 (N, 2) -> 物理坐标 (N, 2)，一次矩阵运算完成。摄像头随臂移动时以当前位置为基准。"""
+        base = self.pose_mm if self.camera_mount == "arm" and self.pose_mm else (0.0, 0.0)
+        if self.model is not None:
+            return self.model.px_to_mm(points_px, base, resolution)
+        points = np.asarray(points_px, dtype=np.float64).reshape(-1, 2)
+        return np.asarray(base) + (points - np.asarray(self.clicker_px(resolution))) * self.mm_per_pixel
+
+    def px_to_mm(self, target_px, resolution) -> Tuple[float, float]:
+        """画面像素 -> 物理坐标。"""
+        x, y = self.points_to_mm([target_px], resolution)[0]
+        return float(x), float(y)
+
+    def _mm_per_px(self, resolution) -> float:
+        """当前分辨率下点击头附近每像素对应的毫米数。"""
+        if self.model is None:
+            return self.mm_per_pixel
+        return self.model.mm_per_pixel() * self.model.resolution[0] / resolution[0]
+
+    def home(self) -> bool:
+        return self.move_to(0.0, 0.0)
+
+    def move_to(self, x: float, y: float) -> bool:
+        if not self._move_fn(x, y):
+            return False
+        self.pose_mm = (x, y)
+        return True
+
+    def click_px(self, target_px, frame, resolution=None) -> bool:
+        """点击 frame 上的像素 target_px（frame 为做出决策时的画面）。"""
+        frame_bgr = to_bgr(frame)
+        if resolution is None:
+            resolution = (frame_bgr.shape[1], frame_bgr.shape[0])
+        target_mm = self.px_to_mm(target_px, resolution)
+        self.last_correction_mm = None
+        if self.closed_loop:
+            target_mm = self._corrected_target(target_px, frame_bgr, target_mm, resolution)
+        if not self._click_fn(*target_mm):
+            return False
+        self.pose_mm = target_mm
+        return True
+
+    def swipe_px(self, start_px, end_px, resolution, duration: float = 1.0) -> bool:
+        """在画面上从 start_px 滑到 end_px（两端点一次换算）。"""
+        if self._swipe_fn is None:
+            raise RuntimeError("MotionPlanner 未提供 swipe_fn")
+        (x1, y1), (x2, y2) = self.points_to_mm([start_px, end_px], resolution)
+        if not self._swipe_fn(float(x1), float(y1), float(x2), float(y2), duration):
+            return False
+        self.pose_mm = (float(x2), float(y2))
+        return True
+
+    def _corrected_target(self, target_px, frame_bgr, target_mm, resolution):
+        """悬停到目标上方，重新检测目标与点击头，返回修正后的物理坐标。"""
+        half = self.patch_size // 2
+        tx, ty = int(target_px[0]), int(target_px[1])
+        patch = frame_bgr[max(0, ty - half):ty + half, max(0, tx - half):tx + half]
+        if patch.shape[0] < half or patch.shape[1] < half or not self.move_to(*target_mm):
+            return target_mm
+        hover = self._capture_fn()
+        if hover is None:
+            return target_mm
+        hover_bgr = to_bgr(hover)
+        clicker = self.clicker_px(resolution)
+        if self.camera_mount == "arm":
+            predicted_target = clicker  # 移动后目标应出现在点击头下方
+            expected_tip = clicker
+        elif self.model is not None:
+            predicted_target = target_px
+            expected_tip = tuple(self.model.mm_to_px([target_mm], resolution=resolution)[0])
+        else:
+            predicted_target = target_px
+            expected_tip = (clicker[0] + target_mm[0] / self.mm_per_pixel,
+                            clicker[1] + target_mm[1] / self.mm_per_pixel)
+        search = int(self.max_correction_mm / self._mm_per_px(resolution))
+        seen_target = locate_patch(hover_bgr, patch, predicted_target, search)
+        tip = detect_stylus_tip(hover_bgr, near=expected_tip)
+        if seen_target is None or tip is None:
+            print("  - [闭环] 未能检测到目标或点击头，按开环坐标点击。")
+            return target_mm
+        err_x, err_y = seen_target[0] - tip[0], seen_target[1] - tip[1]
+        if abs(err_x) <= self.tolerance_px and abs(err_y) <= self.tolerance_px:
+            self.last_correction_mm = (0.0, 0.0)
+            return target_mm
+        if self.model is not None:
+            # 经单应矩阵换算，保留标定中的旋转与各向异性
+            seen_mm, tip_mm = self.model.px_to_mm([seen_target, tip], resolution=resolution)
+            dx, dy = (float(v) for v in seen_mm - tip_mm)
+        else:
+            dx, dy = err_x * self.mm_per_pixel, err_y * self.mm_per_pixel
+        if max(abs(dx), abs(dy)) > self.max_correction_mm:
+            print(f"  - [闭环] 修正量 ({dx:.1f}, {dy:.1f})mm 过大，忽略。")
+            return target_mm
+        self.last_correction_mm = (dx, dy)
+        print(f"  - [闭环] 点击头偏离目标 ({err_x}, {err_y})px，修正 ({dx:.2f}, {dy:.2f})mm")
+        return target_mm[0] + dx, target_mm[1] + dy
@@ -1,45 +1,49 @@
 # run_agent_physical.py
 
+import importlib.util
 import json
 import os
 import time
 import requests
 from PIL import Image
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import numpy as np
 import cv2
 
-# === MODIFIED VOICE RECOGNIZER  ===
-import sounddevice as sd
-import numpy as np
-import torch
-
-try:
-    import whisper
+# 复用 test/ 目录下与手机端共享的模块
+import shared_modules  # noqa: F401  (把 ../test 加入 sys.path)
+import tracing
+from action_parser import ACTION_VALIDATOR
+from agent_wrapper import MiniCPMWrapper
+from inference_backends import backend_from_spec
+from screen_settle import wait_until_stable
+from camera_stream import CameraStreamReader
+from motion_planner import MotionPlanner
+from screen_rectifier import ScreenRectifier
 
-    VOICE_ENABLED = True
-except ImportError:
-    print("WARNING: 'whisper' 库未安装，语音输入功能将不可用。")
-    print("请运行: pip install openai-whisper")
-    VOICE_ENABLED = False
-
-try:
-    # 检查是否有可用的麦克风
-    sd.query_devices()
-except Exception as e:
-    print(f"WARNING: sounddevice 库无法正常工作: {e}")
-    print("语音输入功能可能不可用。请确保已安装 sounddevice 并且有可用的麦克风。")
-    print("Linux 用户可能需要安装: sudo apt-get install libportaudio2")
-    VOICE_ENABLED = False
+# === MODIFIED VOICE RECOGNIZER  ===
+# whisper（连带 torch）和 sounddevice 只在选择语音输入时才导入，这里只检查是否已安装
+VOICE_ENABLED = all(importlib.util.find_spec(name) is not None for name in ("whisper", "sounddevice"))
+if not VOICE_ENABLED:
+    print("WARNING: 'whisper' 或 'sounddevice' 库未安装，语音输入功能将不可用。")
+    print("请运行: pip install openai-whisper sounddevice")
 
 
 class VoiceRecognizer:
     def __init__(self, model_size="base"):
         if not VOICE_ENABLED:
             raise ImportError("语音识别所需库未安装或麦克风不可用，无法初始化。")
+        import sounddevice as sd
+        try:
+            # 检查是否有可用的麦克风
+            sd.query_devices()
+        except Exception as e:
+            print("Linux 用户可能需要安装: sudo apt-get install libportaudio2")
+            raise RuntimeError(f"sounddevice 库无法正常工作: {e}") from e
+        self.sd = sd
         print(f"  - 正在加载 Whisper 模型 ({model_size})...")
         try:
+            import whisper
+
             self.model = whisper.load_model(model_size)
             print("  - Whisper 模型加载成功！")
         except Exception as e:
@@ -50,6 +54,8 @@ class VoiceRecognizer:
         print("  - Whisper 正在识别录制的语音...")
         # 将音频数据展平为一维数组
         audio_data = audio_data.flatten().astype(np.float32)
+        import torch
+
         result = self.model.transcribe(audio_data, fp16=torch.cuda.is_available())
         recognized_text = result["text"].strip()
         print(f"  - 识别结果: '{recognized_text}'")
@@ -68,8 +74,8 @@ class VoiceRecognizer:
         print(f"  - 开始录音，请说话...")
 
         # 录制音频
-        audio_data = sd.rec(int(DURATION * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=1, dtype='float32')
-        sd.wait()  # 等待录音完成
+        audio_data = self.sd.rec(int(DURATION * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=1, dtype='float32')
+        self.sd.wait()  # 等待录音完成
 
         print("  - 录音结束。")
 
@@ -84,78 +90,176 @@ class VoiceRecognizer:
 CAMERA_NGROK_URL = "https://03f9a4bd524e.ngrok-free.app"
 ROBOT_ARM_NGROK_URL = "https://03f9a4bd524e.ngrok-free.app"
 MODEL_PATH = "model/AgentCPM-GUI"
+# 推理后端：本地模型路径（进程内 transformers）、vLLM 服务地址
+# （如 "http://localhost:8000/v1/chat/completions"）或 "replay:回放文件.jsonl"
+INFERENCE_BACKEND = MODEL_PATH
 NGROK_VIP_HEADERS = {'ngrok-skip-browser-warning': 'true'}
+# 摄像头安装方式："arm" 随机械臂移动，"fixed" 固定在支架上
+CAMERA_MOUNT = "arm"
+# 点击前悬停到目标上方、用画面中的黄色点击头修正一次位置
+CLOSED_LOOP_CLICK = False
+# 只把校正后的手机屏幕区域交给模型；SCREEN_SIZE 为手机分辨率（用于宽高比）
+RECTIFY_SCREEN = True
+SCREEN_SIZE = (1080, 2400)
+# 方向滑动（"to": "up" 等）的位移，单位为 0~1000 归一化坐标，与 adb_utils 的手机端一致
+SWIPE_DIRECTIONS = {"up": (0, -150), "down": (0, 150), "left": (-150, 0), "right": (150, 0)}
 
 
 # === PART 2: 远程硬件的 Python 接口  ===
-def get_image_from_camera_stream():
-    full_url = CAMERA_NGROK_URL + "/video_feed"
-    try:
-        response = requests.get(full_url, stream=True, timeout=10, headers=NGROK_VIP_HEADERS)
-        if response.status_code == 200:
-            bytes_data = b''
-            for chunk in response.iter_content(chunk_size=1024):
-                bytes_data += chunk
-                a = bytes_data.find(b'\xff\xd8')
-                b = bytes_data.find(b'\xff\xd9')
-                if a != -1 and b != -1:
-                    jpg = bytes_data[a:b + 2]
-                    bytes_data = bytes_data[b + 2:]
-                    frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-                    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+# 常驻的视频流读取器（首次取帧时启动），以及上一次返回的帧序号
+camera_stream = None
+_last_frame_seq = 0
+screen_rectifier = ScreenRectifier(SCREEN_SIZE)
+
+
+def get_image_from_camera_stream(wait=1.0, rectify=RECTIFY_SCREEN):
+    """
+    返回比上一次更新的一帧（PIL.Image）。优先取常驻视频流里的最新帧；
+    流在 wait 秒内没有新帧时，改用网关的 /snapshot 单帧接口。
+    rectify 时返回校正后的屏幕图，image.info["screen_view"] 为对应的 ScreenView
+    （用于把模型坐标映射回摄像头像素）；画面中找不到屏幕时返回原始画面。
+    """
+    global camera_stream, _last_frame_seq
+    with tracing.span("capture", source="video_feed"):
+        if camera_stream is None:
+            camera_stream = CameraStreamReader(CAMERA_NGROK_URL + "/video_feed", headers=NGROK_VIP_HEADERS).start()
+        seq, frame = camera_stream.latest_bgr(newer_than=_last_frame_seq, wait=wait)
+        if frame is not None:
+            _last_frame_seq = seq
+        else:
+            frame = _read_snapshot()
+    if frame is None:
         return None
+    return _to_pil(frame, rectify)
+
+
+def _to_pil(frame, rectify):
+    view = None
+    if rectify:
+        with tracing.span("rectify"):
+            view = screen_rectifier.rectify(frame)
+    image = Image.fromarray(cv2.cvtColor(view.image if view is not None else frame, cv2.COLOR_BGR2RGB))
+    if view is not None:
+        image.info["screen_view"] = view
+    return image
+
+
+def to_camera_px(points, observed):
+    """
+    模型的 0~1000 归一化坐标 -> 摄像头像素。observed 带有 screen_view 时经逆透视变换，
+    否则按整幅画面换算。返回 (像素点列表, 对应的摄像头画面, 画面分辨率)。
+    """
+    view = observed.info.get("screen_view")
+    if view is not None:
+        # 模型坐标相对校正后的屏幕图，经逆透视变换回到摄像头像素
+        mapped = view.normalized_to_camera(points)
+        return [(int(x), int(y)) for x, y in mapped], view.camera_image, view.camera_size
+    w, h = observed.size
+    return [(int(x / 1000 * w), int(y / 1000 * h)) for x, y in points], observed, (w, h)
+
+
+def _read_snapshot():
+    full_url = CAMERA_NGROK_URL + "/snapshot"
+    try:
+        response = requests.get(full_url, timeout=10, headers=NGROK_VIP_HEADERS)
+        if response.status_code != 200:
+            return None
+        return cv2.imdecode(np.frombuffer(response.content, dtype=np.uint8), cv2.IMREAD_COLOR)
     except requests.exceptions.RequestException as e:
         return None
 
 
+def close_camera_stream():
+    global camera_stream
+    if camera_stream is not None:
+        camera_stream.stop()
+        camera_stream = None
+
+
+def wait_for_camera_settle(timeout=5.0, min_wait=0.3):
+    """等待摄像头画面稳定（机械臂停止运动、屏幕动画结束），返回最后一帧 PIL.Image（可能为 None）。"""
+    settled, image = wait_until_stable(get_image_from_camera_stream, timeout=timeout, interval=0.1,
+                                       threshold=0.02, stable_frames=2, min_wait=min_wait)
+    if not settled:
+        print(f"  - [提示] {timeout} 秒内画面仍在变化，继续执行。")
+    return image
+
+
+def capture_hover_frame(timeout=2.0):
+    """
+    闭环点击用：机械臂移动后等画面稳定，返回未校正的摄像头画面；
+    timeout 秒内仍不稳定时返回 None（不修正），避免用移动中或移动前的旧帧检测点击头。
+    """
+    settled, image = wait_until_stable(lambda: get_image_from_camera_stream(rectify=False), timeout=timeout,
+                                       interval=0.05, threshold=0.02, stable_frames=2, min_wait=0.1)
+    return image if settled else None
+
+
 def command_robot_arm_click(x, y):
-    full_url = ROBOT_ARM_NGROK_URL + "/click"
+    return post_robot_job("/click", x=x, y=y)
+
+
+def command_robot_arm_move(x, y):
+    """只移动、不点击。"""
+    return post_robot_job("/move", x=x, y=y)
+
+
+def command_robot_arm_swipe(x1, y1, x2, y2, duration=1.0):
+    return post_robot_job("/swipe", x1=x1, y1=y1, x2=x2, y2=y2, duration=duration)
+
+
+def post_robot_job(path, retries=3, poll_timeout=30.0, **coords):
+    """网关队列满（429）时按 Retry-After 重试；动作未在网关等待时间内完成（202）时轮询 /jobs/<id>。"""
+    full_url = ROBOT_ARM_NGROK_URL + path
     try:
-        payload = {"x": float(x), "y": float(y)}
-        response = requests.post(full_url, json=payload, timeout=10, headers=NGROK_VIP_HEADERS)
+        payload = {k: float(v) for k, v in coords.items()}
+        with tracing.span("actuate", action=path.strip("/"), **payload):
+            for _ in range(retries + 1):
+                response = requests.post(full_url, json=payload, timeout=10, headers=NGROK_VIP_HEADERS)
+                if response.status_code != 429:
+                    break
+                time.sleep(float(response.headers.get("Retry-After", 1)))
+            if response.status_code == 202:
+                return wait_for_robot_job(response.json()["id"], poll_timeout)
         return response.status_code == 200 and response.json().get('status') == 'success'
     except requests.exceptions.RequestException as e:
         return False
 
 
-def command_robot_arm_move(x, y):
-    return command_robot_arm_click(x, y)
-
-
-# === PART 3: 坐标系转换的核心逻辑  ===
-def convert_px_to_mm_relative(target_px, current_robot_pos_mm, camera_resolution, calibration_data):
-    mm_per_pixel = calibration_data['mm_per_pixel']
-    offset_px = tuple(calibration_data['offset_px'])
-    cam_w, cam_h = camera_resolution
-    camera_center_px = (cam_w / 2, cam_h / 2)
-    clicker_pos_px = (camera_center_px[0] + offset_px[0], camera_center_px[1] + offset_px[1])
-    move_vector_px = (target_px[0] - clicker_pos_px[0], target_px[1] - clicker_pos_px[1])
-    move_mm_x = move_vector_px[0] * mm_per_pixel
-    move_mm_y = move_vector_px[1] * mm_per_pixel
-    target_robot_mm = (current_robot_pos_mm[0] + move_mm_x, current_robot_pos_mm[1] + move_mm_y)
-    print(
-        f"  - [相对坐标转换] 目标像素:{target_px}, 当前物理位置:{current_robot_pos_mm} -> 最终目标物理坐标:{target_robot_mm}")
-    return target_robot_mm
+def wait_for_robot_job(job_id, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = requests.get(f"{ROBOT_ARM_NGROK_URL}/jobs/{job_id}", timeout=10, headers=NGROK_VIP_HEADERS)
+        state = response.json().get("state")
+        if state in ("done", "failed"):
+            return state == "done"
+        time.sleep(0.2)
+    return False
 
 
 # ======================== PART 4: 主执行流程  ===============================
 def run_main_agent_task():
     recognizer = None
+    agent = None
     try:
         # --- 步骤 1: 初始化 ---
         print("\n--- 步骤 1: 正在初始化所有模块 ---")
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH, trust_remote_code=True)
-        ai_model = AutoModelForCausalLM.from_pretrained(MODEL_PATH, trust_remote_code=True,
-                                                        torch_dtype=torch.bfloat16).to("cuda:0")
-        print("  - AI 模型加载完成！")
+        # 与手机端 run_agent.py 共用提示词、请求构造和动作解析，只是后端不同
+        agent = MiniCPMWrapper(model_name=MODEL_PATH, temperature=0.1,
+                               backend=backend_from_spec(INFERENCE_BACKEND))
+        print(f"  - AI 模型加载完成！（后端: {agent.backend.name}）")
         print("  - 正在加载手眼标定配置...")
         if not os.path.exists('final_config.json'):
             raise FileNotFoundError("CRITICAL: 未找到手眼标定文件 'final_config.json'！")
         with open('final_config.json', 'r') as f:
             calibration_data = json.load(f)
-        if 'offset_px' not in calibration_data:
-            raise ValueError("CRITICAL: 标定文件格式不正确！这个脚本需要包含 'offset_px' 的旧版配置文件。")
+        if 'homography' not in calibration_data and 'offset_px' not in calibration_data:
+            raise ValueError("CRITICAL: 标定文件格式不正确！需要包含 'homography' 或 'offset_px'。")
         print(f"  - 标定数据加载成功: {calibration_data}")
+        planner = MotionPlanner(calibration_data, command_robot_arm_move, command_robot_arm_click,
+                                capture_fn=capture_hover_frame,
+                                swipe_fn=command_robot_arm_swipe,
+                                camera_mount=CAMERA_MOUNT, closed_loop=CLOSED_LOOP_CLICK)
 
         # --- 选择指令输入方式 ---
         instruction = ""
@@ -169,7 +273,12 @@ def run_main_agent_task():
                 instruction = input("请输入你的任务指令: ")
                 break
             elif choice == '2' and VOICE_ENABLED:
-                if recognizer is None: recognizer = VoiceRecognizer()
+                if recognizer is None:
+                    try:
+                        recognizer = VoiceRecognizer()
+                    except Exception as e:
+                        print(f"WARNING: 语音输入不可用: {e}，请改用文本输入。")
+                        continue
                 instruction = recognizer.get_instruction_from_voice()
                 break
             else:
@@ -184,59 +293,65 @@ def run_main_agent_task():
         print(f"最终执行的指令是: \"{instruction}\"")
         print("--------------------")
 
+        # 只在开始时归位一次，之后从机械臂所在的位置直接观察
+        print("  - [归位] 正在移动到原点(0,0)...")
+        if not planner.home():
+            print("  - [失败] 无法移动到原点，任务终止。")
+            return
+        image = None
         for i in range(MAX_STEPS):
             print(f"\n--- 第 {i + 1} 步 ---")
-            print("  - [归位] 正在移动到原点(0,0)以获得全局视野...")
-            if not command_robot_arm_move(0, 0):
-                print("  - [失败] 无法移动到原点，任务终止。")
-                break
-            time.sleep(2)
-            print("  - [观察] 正在从原点位置进行观察...")
-            image = get_image_from_camera_stream()
+            if image is None:
+                print(f"  - [观察] 等待画面稳定后在 {planner.pose_mm} 处观察...")
+                image = wait_for_camera_settle(timeout=4.0)
             if image is None:
                 print("  - [失败] 观察失败，跳过此步。")
                 continue
-            camera_resolution = image.size
-            prompt = f"""
-你是一个能够控制机械臂的智能代理。你的任务是根据我的【总指令】和【当前屏幕截图】，一步一步地完成任务。
-你必须以严格的 JSON 格式进行响应。
----
-**总指令**: <Question>{instruction}</Question>
----
-**你的思考过程**:
-1.  **观察**: 描述一下你当前在屏幕上看到了什么关键元素。
-2.  **判断**: 对比你观察到的，和总指令的要求，判断任务是否已经【完全】完成。
-3.  **决策**:
-    *   如果任务【未完成】，请给出下一步要点击的坐标: {{"POINT": [x, y], "REASON": "简要说明你为什么要点这里"}}
-    *   只有当总指令中的【所有要求】都已满足时，才能返回: {{"STATUS": "finish", "REASON": "简要说明任务是如何完成的"}}
----
-**当前屏幕截图**：
-"""
-            messages = [{"role": "user", "content": [prompt, image]}]
-            outputs_str = ai_model.chat(image=None, msgs=messages, tokenizer=tokenizer)
-            try:
-                json_part = outputs_str[outputs_str.find('{'):outputs_str.rfind('}') + 1]
-                action = json.loads(json_part)
-                print(f"  - AI 决策: {action}")
-            except (json.JSONDecodeError, IndexError):
-                print(f"  - WARNING: AI 输出不是有效的 JSON: {outputs_str}，跳过此步。")
+            action_dict = agent.predict_mm(instruction, [np.asarray(image.convert("RGB"))])[3]
+            action = ACTION_VALIDATOR.to_action(action_dict) if action_dict is not None else None
+            observed, image = image, None
+            if action is None:
+                print("  - WARNING: AI 输出不是有效的动作 JSON，跳过此步。")
                 continue
-            if "POINT" in action:
-                rel_x, rel_y = action["POINT"]
-                target_camera_px = (int(rel_x / 1000 * camera_resolution[0]), int(rel_y / 1000 * camera_resolution[1]))
-                target_robot_mm = convert_px_to_mm_relative(target_camera_px, [0.0, 0.0], camera_resolution,
-                                                            calibration_data)
-                print(f"  - [行动] 正在从原点移动到目标点并点击...")
-                if not command_robot_arm_click(target_robot_mm[0], target_robot_mm[1]):
-                    print("  - [失败] 机械臂点击指令执行失败，任务终止。")
-                    break
-            elif "STATUS" in action and action["STATUS"] == "finish":
-                print("  - [完成] AI 认为任务已全部完成，流程结束。")
+            print(f"  - AI 决策: {action.to_dict()}")
+            if action.finished:
+                if action.status == "finish":
+                    print("  - [完成] AI 认为任务已全部完成，流程结束。")
+                else:
+                    print("  - [结束] AI 认为任务无法完成，流程结束。")
                 break
+            if action.type is not None or action.press is not None or action.deep_link or action.clear:
+                # 机械臂只能点击和滑动，不能输入文字或按系统键
+                print(f"  - [不支持] 机械臂无法执行该动作: {action.to_dict()}，任务终止。")
+                break
+            if action.point is not None:
+                if action.to is None:
+                    points, what = [action.point], "点击"
+                elif isinstance(action.to, str):
+                    dx, dy = SWIPE_DIRECTIONS[action.to]
+                    end = (min(max(action.point[0] + dx, 0), 1000), min(max(action.point[1] + dy, 0), 1000))
+                    points, what = [action.point, end], "滑动"
+                else:
+                    points, what = [action.point, action.to], "滑动"
+                targets, observed, camera_resolution = to_camera_px(points, observed)
+                print(f"  - [行动] {what} 目标像素 {targets}，机械臂当前位置 {planner.pose_mm}...")
+                if action.to is None:
+                    ok = planner.click_px(targets[0], observed, camera_resolution)
+                else:
+                    duration = action.duration / 1000 if action.duration else 1.0
+                    ok = planner.swipe_px(targets[0], targets[1], camera_resolution, duration)
+                if not ok:
+                    print(f"  - [失败] 机械臂{what}指令执行失败，任务终止。")
+                    break
+                print(f"  - [行动] 已{what}，机械臂位于物理坐标 {planner.pose_mm}")
+            elif action.duration is not None:
+                print(f"  - [等待] {action.duration} ms")
+                time.sleep(action.duration / 1000)
             else:
-                print(f"  - [未知/未发现] AI未给出有效点击点: {action}。将在原点重新观察。")
-            print("  - 等待 3 秒，让操作生效...")
-            time.sleep(3)
+                print(f"  - [未知/未发现] AI未给出可执行的动作: {action.to_dict()}。将重新观察。")
+            print("  - 等待画面稳定，让操作生效...")
+            # 稳定后的这一帧直接作为下一步的观察
+            image = wait_for_camera_settle(timeout=5.0)
         print("\n--- 任务流程已结束 ---")
     except Exception as e:
         print(f"\nCRITICAL: 主代理程序运行出错: {e}")
@@ -248,6 +363,11 @@ def run_main_agent_task():
             command_robot_arm_move(0, 0)
         except Exception:
             pass
+        close_camera_stream()
+        if agent is not None:
+            agent.close()
+        if tracing.TRACER.enabled:
+            print(tracing.summary())
         print("--- 程序已完全结束 ---")
 
 
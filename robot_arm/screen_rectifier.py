@@ -0,0 +1,205 @@
+# screen_rectifier.py
+
+"""
+手机屏幕区域校正：在摄像头画面中找到手机显示区域的四边形，透视变换成与设备
+宽高比一致的正视图，再交给模型；模型给出的坐标经逆变换映射回摄像头像素。
+
+四边形检测结果会缓存：每帧只沿缓存四边形的边采样一次梯度，边缘明显变弱
+（手机被移动）或超过 redetect_interval 秒时才重新检测。
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def order_corners(points) -> np.ndarray:
+    """四个角点排成 左上、右上、右下、左下。"""
+    pts = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    s = pts.sum(axis=1)
+    d = pts[:, 1] - pts[:, 0]
+    return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]],
+                    dtype=np.float32)
+
+
+def detect_screen_quad(frame_bgr: np.ndarray, min_area_frac: float = 0.05,
+                       work_width: int = 480) -> Optional[np.ndarray]:
+    """
+    亮着的屏幕在深色边框/桌面上形成最大的凸四边形亮区。在缩小的灰度图上
+    用 Otsu 阈值分割，取面积最大且能近似成四边形的轮廓，返回原图坐标下的四个角点。
+    """
+    h, w = frame_bgr.shape[:2]
+    scale = min(1.0, work_width / w)
+    small = cv2.resize(frame_bgr, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((7, 7), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = min_area_frac * mask.shape[0] * mask.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+        if cv2.contourArea(contour) < min_area:
+            return None
+        hull = cv2.convexHull(contour)
+        approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+        if len(approx) == 4:
+            rough = order_corners(approx.reshape(4, 2) / scale)
+            return refine_quad(frame_bgr, rough, margin=int(4 / scale)) if scale < 1.0 else rough
+    return None
+
+
+def _intersect(line_a, line_b) -> Optional[np.ndarray]:
+    (vx1, vy1, x1, y1), (vx2, vy2, x2, y2) = line_a, line_b
+    det = vx1 * vy2 - vy1 * vx2
+    if abs(det) < 1e-9:
+        return None
+    t = ((x2 - x1) * vy2 - (y2 - y1) * vx2) / det
+    return np.array([x1 + t * vx1, y1 + t * vy1], dtype=np.float32)
+
+
+def refine_quad(frame_bgr: np.ndarray, rough: np.ndarray, margin: int = 10) -> np.ndarray:
+    """
+    在原分辨率下细化缩小图上得到的四边形：在四边形附近重新分割取轮廓，
+    轮廓点按最近的边分组，每条边拟合直线，相邻直线求交得到亚像素角点。
+    """
+    h, w = frame_bgr.shape[:2]
+    x0, y0 = np.maximum(rough.min(axis=0).astype(int) - margin, 0)
+    x1, y1 = np.minimum(rough.max(axis=0).astype(int) + margin, (w, h))
+    gray = cv2.cvtColor(frame_bgr[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(cv2.GaussianBlur(gray, (5, 5), 0), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    if not contours:
+        return rough
+    points = max(contours, key=cv2.contourArea).reshape(-1, 2).astype(np.float32) + (x0, y0)
+    # 每个轮廓点到四条边（线段）的距离，只保留离某条边足够近且不在角附近的点
+    starts, ends = rough, np.roll(rough, -1, axis=0)
+    seg = ends - starts
+    t = np.clip(((points[:, None, :] - starts) * seg).sum(-1) / (seg * seg).sum(-1), 0, 1)
+    dist = np.linalg.norm(points[:, None, :] - (starts + t[..., None] * seg), axis=-1)
+    nearest = dist.argmin(axis=1)
+    lines = []
+    for i in range(4):
+        sel = (nearest == i) & (dist[:, i] < margin) & (t[:, i] > 0.1) & (t[:, i] < 0.9)
+        if sel.sum() < 10:
+            return rough
+        lines.append(cv2.fitLine(points[sel], cv2.DIST_HUBER, 0, 0.01, 0.01).ravel())
+    corners = [_intersect(lines[i - 1], lines[i]) for i in range(4)]
+    if any(c is None for c in corners) or np.abs(np.array(corners) - rough).max() > 2 * margin:
+        return rough
+    return np.array(corners, dtype=np.float32)
+
+
+@dataclass
+class ScreenView:
+    image: np.ndarray  # 校正后的屏幕正视图（BGR）
+    quad: np.ndarray  # 摄像头画面中的屏幕四角（左上、右上、右下、左下）
+    matrix: np.ndarray  # 摄像头像素 -> 屏幕图像素
+    inverse: np.ndarray  # 屏幕图像素 -> 摄像头像素
+    camera_image: np.ndarray  # 原始摄像头画面（BGR）
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.image.shape[1], self.image.shape[0]
+
+    @property
+    def camera_size(self) -> Tuple[int, int]:
+        return self.camera_image.shape[1], self.camera_image.shape[0]
+
+    def to_camera(self, points) -> np.ndarray:
+        """屏幕图像素 (N, 2) -> 摄像头像素 (N, 2)"""
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(pts, self.inverse).reshape(-1, 2)
+
+    def normalized_to_camera(self, points) -> np.ndarray:
+        """模型的 0~1000 归一化坐标 (N, 2) -> 摄像头像素 (N, 2)"""
+        w, h = self.size
+        return self.to_camera(np.asarray(points, dtype=np.float32).reshape(-1, 2) / 1000.0 * (w, h))
+
+    def from_camera(self, points) -> np.ndarray:
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(pts, self.matrix).reshape(-1, 2)
+
+
+class ScreenRectifier:
+    def __init__(self, screen_size: Tuple[int, int] = (1080, 2400), output_long_side: int = 1120,
+                 redetect_interval: float = 5.0, edge_drop: float = 0.5):
+        """
+        screen_size 为设备屏幕的像素尺寸（只用其宽高比）；输出图像长边为 output_long_side。
+        缓存四边形边缘上的梯度均值低于检测时的 edge_drop 倍即认为手机被移动。
+        """
+        long_side = max(screen_size)
+        self.output_size = (int(round(screen_size[0] * output_long_side / long_side)),
+                            int(round(screen_size[1] * output_long_side / long_side)))
+        self.redetect_interval = redetect_interval
+        self.edge_drop = edge_drop
+        self._lock = threading.Lock()
+        self._quad: Optional[np.ndarray] = None
+        self._matrix = self._inverse = None
+        self._edge_ref = 0.0
+        self._edge_samples: Optional[np.ndarray] = None
+        self._detected_at = 0.0
+        self.detections = 0
+
+    def _orient(self, quad: np.ndarray) -> np.ndarray:
+        """屏幕在画面中横竖与输出不一致时，把角点顺序转 90 度，让输出保持设备方向。"""
+        top = np.linalg.norm(quad[1] - quad[0])
+        side = np.linalg.norm(quad[3] - quad[0])
+        out_w, out_h = self.output_size
+        if (top > side) != (out_w > out_h):
+            quad = np.roll(quad, -1, axis=0)
+        return quad
+
+    def _edge_points(self, quad: np.ndarray, per_edge: int = 48) -> np.ndarray:
+        t = np.linspace(0.1, 0.9, per_edge, dtype=np.float32)[:, None]
+        return np.concatenate([quad[i] + t * (quad[(i + 1) % 4] - quad[i]) for i in range(4)])
+
+    @staticmethod
+    def _edge_strength(gray: np.ndarray, points: np.ndarray) -> float:
+        """沿四边形各边采样点的局部灰度梯度均值（只计算采样点附近的小邻域）。"""
+        h, w = gray.shape
+        xs = np.clip(points[:, 0].astype(int), 2, w - 3)
+        ys = np.clip(points[:, 1].astype(int), 2, h - 3)
+        gx = gray[ys, xs + 2].astype(np.int16) - gray[ys, xs - 2]
+        gy = gray[ys + 2, xs].astype(np.int16) - gray[ys - 2, xs]
+        return float(np.mean(np.abs(gx) + np.abs(gy)))
+
+    def _moved(self, frame_bgr: np.ndarray) -> bool:
+        if self._quad is None or time.monotonic() - self._detected_at > self.redetect_interval:
+            return True
+        gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+        return self._edge_strength(gray, self._edge_samples) < self.edge_drop * self._edge_ref
+
+    def _update(self, frame_bgr: np.ndarray) -> bool:
+        quad = detect_screen_quad(frame_bgr)
+        if quad is None:
+            # 需要重新检测说明旧四边形已不可信（手机或摄像头移动过），不能沿用，
+            # 返回 False 让调用方退回原始画面，下一帧再检测
+            self._quad = None
+            return False
+        self._detected_at = time.monotonic()
+        quad = self._orient(quad)
+        out_w, out_h = self.output_size
+        target = np.array([[0, 0], [out_w - 1, 0], [out_w - 1, out_h - 1], [0, out_h - 1]], dtype=np.float32)
+        self._quad = quad
+        self._matrix = cv2.getPerspectiveTransform(quad, target)
+        self._inverse = np.linalg.inv(self._matrix)
+        self._edge_samples = self._edge_points(quad)
+        self._edge_ref = self._edge_strength(cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY), self._edge_samples)
+        self.detections += 1
+        return True
+
+    def rectify(self, frame_bgr: np.ndarray) -> Optional[ScreenView]:
+        """校正一帧；检测不到屏幕（包括移动后重新检测失败）时返回 None。"""
+        with self._lock:
+            if self._moved(frame_bgr) and not self._update(frame_bgr):
+                return None
+            quad, matrix, inverse = self._quad, self._matrix, self._inverse
+        image = cv2.warpPerspective(frame_bgr, matrix, self.output_size, flags=cv2.INTER_LINEAR)
+        return ScreenView(image, quad, matrix, inverse, frame_bgr)
+
+    def reset(self):
+        with self._lock:
+            self._quad = None
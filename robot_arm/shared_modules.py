@@ -0,0 +1,15 @@
+# shared_modules.py
+
+"""
+与手机端共用的模块（tracing、action_parser、agent_wrapper、screen_settle 等）
+都在 ../test 目录下。需要它们的模块先 `import shared_modules`，由这里统一把
+test/ 加入 sys.path（只加一次），不依赖其他模块的导入顺序。
+"""
+
+import os
+import sys
+
+TEST_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test"))
+
+if TEST_DIR not in sys.path:
+    sys.path.insert(0, TEST_DIR)
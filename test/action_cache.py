@@ -0,0 +1,139 @@
+"""Screen-state keyed cache of model actions.
+
+Tasks keep revisiting identical screens (home, settings root, an app's launch
+page); for the same instruction and recent actions the model answers the same
+way, so `MiniCPMWrapper(action_cache=...)` looks the step up here first and
+skips the request on a hit.
+
+The key is (instruction, `screen_settle.screen_digest` of the screenshot,
+last `history_len` actions).  The digest covers every pixel below the status
+bar of an area-averaged, quantised thumbnail: a perceptual hash that samples a
+few pixels would replay the previous action on a screen that differs only in
+typed text or a toast, while the clock and battery icons must not split keys
+between runs.  Entries are evicted LRU beyond `max_entries` and
+expire after `ttl` seconds.  With `path`, every insert is appended to a JSONL
+file that is reloaded (and compacted) on start-up.
+"""
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from screen_settle import screen_digest
+
+logger = logging.getLogger(__name__)
+
+
+class ActionCache:
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 24 * 3600,
+                 path: Optional[str] = None, history_len: int = 2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.history_len = history_len
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        # key -> (assistant_text, action, stored_at)
+        self._entries: "collections.OrderedDict[str, tuple[str, dict, float]]" = collections.OrderedDict()
+        self._file = None
+        if path and os.path.exists(path):
+            self._load()
+
+    def key(self, instruction: str, image: np.ndarray, recent_actions: Sequence[str]) -> str:
+        recent = list(recent_actions[-self.history_len:]) if self.history_len > 0 else []
+        return json.dumps([instruction, screen_digest(image), recent],
+                          ensure_ascii=False, separators=(",", ":"))
+
+    def _alive(self, stored_at: float, now: float) -> bool:
+        return self.ttl is None or now - stored_at <= self.ttl
+
+    def get(self, key: str) -> Optional[tuple[str, dict]]:
+        """(assistant_text, action) cached for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._alive(entry[2], time.time()):
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key: str, assistant_text: str, action: dict) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._insert(key, (assistant_text, action, stored_at))
+            if self.path:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps({"key": key, "text": assistant_text, "action": action,
+                                             "t": stored_at}, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def _insert(self, key: str, entry: tuple[str, dict, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self) -> None:
+        now = time.time()
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    rec = json.loads(line)
+                    entry = (rec["text"], rec["action"], float(rec["t"]))
+                except (ValueError, KeyError, TypeError):
+                    continue  # a line cut short by a crash
+                if self._alive(entry[2], now):
+                    self._insert(rec["key"], entry)
+        logger.info("Action cache: %d entries loaded from %s", len(self._entries), self.path)
+        if lines > 2 * len(self._entries):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the cache file with only the live entries."""
+        if not self.path:
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for key, (text, action, stored_at) in self._entries.items():
+                    f.write(json.dumps({"key": key, "text": text, "action": action, "t": stored_at},
+                                       ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
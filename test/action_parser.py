@@ -0,0 +1,364 @@
+"""Parsing of the agent's compact-JSON action output.
+
+`StreamingActionParser` consumes a completion as it streams in and reports the
+top-level members of the action object as soon as each one has closed, so the
+device can start acting before the rest (typically `thought`) has arrived.
+
+`parse_action` is the one-shot path used once a completion is complete:
+`repair_json` recovers the object from fenced, prose-wrapped or truncated
+output, and `ActionValidator` checks it against the action space of
+`schema_for_extraction.json` with plain Python tests compiled from the schema
+(no generic Draft 7 / `$ref` walk per step), returning a typed `Action`.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+# Keys that make the device do something.
+PRIMARY_ACTION_KEYS = ("POINT", "PRESS", "TYPE", "CLEAR", "DEEP_LINK", "STATUS")
+# Keys that belong to the action; anything else (`thought`) can trail behind it.
+ACTION_KEYS = PRIMARY_ACTION_KEYS + ("to", "duration")
+
+
+class StreamingActionParser:
+    """Incremental scanner for one top-level JSON object.
+
+    Only the nesting depth and string/escape state are tracked character by
+    character; each completed member is decoded with `json.loads` on its own
+    slice, so the cost stays linear in the output length.
+    """
+
+    def __init__(self):
+        self.text: str = ""
+        self.fields: dict[str, Any] = {}
+        self.current_key: Optional[str] = None
+        self.done: bool = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start: Optional[int] = None
+        self._colon: Optional[int] = None
+        # set by close(): the output was cut off inside an action member
+        self.truncated_action: bool = False
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """Add streamed text; return the (key, value) members completed by it."""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self.done:
+                break
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = i + 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed += self._close_member(i)
+                    self.done = True
+            elif self._depth == 1 and ch == ":" and self._colon is None:
+                self._colon = i
+                try:
+                    self.current_key = json.loads(text[self._member_start:i])
+                except ValueError:
+                    self.current_key = None
+            elif self._depth == 1 and ch == ",":
+                completed += self._close_member(i)
+                self._member_start = i + 1
+        self._pos = len(text)
+        return completed
+
+    def _close_member(self, end: int) -> list[tuple[str, Any]]:
+        key, colon = self.current_key, self._colon
+        self._colon = None
+        self.current_key = None
+        if colon is None or key is None:  # "{}", a trailing comma or a broken key
+            return []
+        try:
+            value = json.loads(self.text[colon + 1:end])
+        except ValueError:  # malformed member: leave it to the full-text parse
+            return []
+        self.fields[key] = value
+        return [(key, value)]
+
+    def close(self) -> list[tuple[str, Any]]:
+        """End of input without the closing brace (truncated output).
+
+        Only a trailing non-action member (`thought`) is repaired, by
+        terminating its unfinished string; it is dropped if it cannot be.  If
+        the cut falls inside an action member (or a key that may become one),
+        its value cannot be trusted (`"to":[300` or `"TYPE":"hello wor`), so
+        `truncated_action` is set and nothing is returned.
+        """
+        if self.done or self._member_start is None:
+            return []
+        if self._colon is None:
+            partial = self.text[self._member_start:].strip().strip('"')
+            if partial and any(k.startswith(partial) for k in ACTION_KEYS):
+                self.truncated_action = True
+            return []
+        if self.current_key is None or self.current_key in ACTION_KEYS:
+            value = self.text[self._colon + 1:].strip()
+            # a closed string/list/literal is complete; a number may have lost
+            # digits, and a POINT may have lost the `to` that makes it a swipe
+            if self._depth != 1 or self._in_string or not value or value[-1] not in '"]el' \
+                    or self.current_key == "POINT":
+                self.truncated_action = True
+                return []
+            return self._close_member(len(self.text))
+        if self._depth != 1:
+            return []
+        if self._in_string:
+            if self._escape:
+                self.text = self.text[:-1]
+            self.text += '"'
+        return self._close_member(len(self.text))
+
+    def action_ready(self) -> bool:
+        """True once the action is final: it has a primary key and either the
+        object has closed or a non-action key (e.g. `thought`) has started."""
+        if not any(k in self.fields for k in PRIMARY_ACTION_KEYS):
+            return False
+        return self.done or (self.current_key is not None and self.current_key not in ACTION_KEYS)
+
+    def action(self) -> dict[str, Any]:
+        """The action members seen so far, in output order."""
+        return {k: v for k, v in self.fields.items() if k in ACTION_KEYS}
+
+
+# ---------------------------------------------------------------------------
+# One-shot parsing: repair + compiled validation
+# ---------------------------------------------------------------------------
+EXTRACT_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_for_extraction.json")
+
+# Upper bound on the text the repair pass looks at; completions are capped at
+# max_tokens anyway, this only keeps a runaway output from costing more.
+MAX_REPAIR_CHARS = 16384
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S)
+_DECODER = json.JSONDecoder()
+
+Location = tuple[int, int]
+
+
+@dataclass(frozen=True, slots=True)
+class Action:
+    """A validated agent action; field names follow the schema keys."""
+
+    point: Optional[Location] = None
+    to: Union[str, Location, None] = None
+    duration: Optional[int] = None
+    press: Optional[str] = None
+    type: Optional[str] = None
+    clear: bool = False
+    deep_link: bool = False
+    status: Optional[str] = None
+    thought: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        """The same test `AndroidDevice.step` uses to end a task."""
+        return self.status in ("finish", "impossible")
+
+    def to_dict(self) -> dict[str, Any]:
+        """The action in the schema's JSON form (`AndroidDevice.step` input)."""
+        out: dict[str, Any] = {}
+        if self.thought is not None:
+            out["thought"] = self.thought
+        if self.point is not None:
+            out["POINT"] = list(self.point)
+        if self.to is not None:
+            out["to"] = self.to if isinstance(self.to, str) else list(self.to)
+        if self.duration is not None:
+            out["duration"] = self.duration
+        if self.press is not None:
+            out["PRESS"] = self.press
+        if self.type is not None:
+            out["TYPE"] = self.type
+        if self.deep_link:
+            out["DEEP_LINK"] = None
+        if self.clear:
+            out["CLEAR"] = None
+        if self.status is not None:
+            out["STATUS"] = self.status
+        return out
+
+
+def _is_int(value: Any) -> bool:
+    # JSON Schema "integer": no bools, integral floats (e.g. 200.0) allowed
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, float) and value.is_integer())
+
+
+class ActionValidator:
+    """Validator for the action space, compiled from the extraction schema.
+
+    Enums, coordinate bounds and the allowed key set are read from `schema`;
+    the cross-key rules mirror its `allOf`: `to` needs `POINT`, at most one of
+    POINT/PRESS/TYPE/DEEP_LINK/CLEAR, and a `continue`/`start` (or missing)
+    STATUS needs one of those or `duration`.  Accepts exactly what
+    `Draft7Validator(schema)` accepts.  Keys in `thought_keys` are free-text
+    aliases of `thought` (e.g. the robot-arm prompt's `REASON`).
+    """
+
+    EXCLUSIVE_KEYS = ("POINT", "PRESS", "TYPE", "DEEP_LINK", "CLEAR")
+    OPEN_STATUSES = ("continue", "start")
+
+    def __init__(self, schema: dict, thought_keys: tuple[str, ...] = ("thought",)):
+        props = schema["properties"]
+        location = schema["$defs"]["Location"]
+        self.thought_keys = tuple(thought_keys)
+        self.allowed_keys = frozenset(props) | frozenset(self.thought_keys)
+        self.press_values = frozenset(props["PRESS"]["enum"])
+        self.status_values = frozenset(props["STATUS"]["enum"])
+        self.to_values = frozenset(
+            v for branch in props["to"]["oneOf"] for v in branch.get("enum", ())
+        )
+        self.coord_min = location["items"]["minimum"]
+        self.coord_max = location["items"]["maximum"]
+        self.coord_len = location["minItems"]
+        self.duration_min = props["duration"].get("minimum", 0)
+
+    @classmethod
+    def from_file(cls, path: str = EXTRACT_SCHEMA_PATH, **kwargs) -> "ActionValidator":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def _location_error(self, value: Any) -> Optional[str]:
+        if not isinstance(value, (list, tuple)) or len(value) != self.coord_len:
+            return f"expected [x, y], got {value!r}"
+        for v in value:
+            if not _is_int(v) or not self.coord_min <= v <= self.coord_max:
+                return f"coordinate {v!r} outside {self.coord_min}..{self.coord_max}"
+        return None
+
+    def error(self, obj: Any) -> Optional[str]:
+        """First violation found, or None if `obj` is a valid action."""
+        if not isinstance(obj, dict):
+            return f"expected an object, got {type(obj).__name__}"
+        for key, value in obj.items():
+            if key not in self.allowed_keys:
+                return f"unexpected key {key!r}"
+            if key in self.thought_keys:
+                if not isinstance(value, str):
+                    return f"{key} must be a string"
+            elif key == "POINT":
+                err = self._location_error(value)
+                if err:
+                    return "POINT: " + err
+            elif key == "to":
+                if isinstance(value, str):
+                    if value not in self.to_values:
+                        return f"to: invalid direction {value!r}"
+                elif self._location_error(value):
+                    return "to: " + self._location_error(value)
+            elif key == "duration":
+                if not _is_int(value) or value < self.duration_min:
+                    return f"duration: invalid value {value!r}"
+            elif key == "PRESS":
+                if not isinstance(value, str) or value not in self.press_values:
+                    return f"PRESS: invalid key {value!r}"
+            elif key == "TYPE":
+                if not isinstance(value, str):
+                    return "TYPE must be a string"
+            elif key in ("DEEP_LINK", "CLEAR"):
+                if value is not None:
+                    return f"{key} must be null"
+            elif key == "STATUS":
+                if not isinstance(value, str) or value not in self.status_values:
+                    return f"STATUS: invalid value {value!r}"
+        if "to" in obj and "POINT" not in obj:
+            return "'to' requires POINT"
+        exclusive = [k for k in self.EXCLUSIVE_KEYS if k in obj]
+        if len(exclusive) > 1:
+            return f"conflicting actions {exclusive}"
+        if not exclusive and "duration" not in obj and obj.get("STATUS", "continue") in self.OPEN_STATUSES:
+            return "no action given"
+        return None
+
+    def is_valid(self, obj: Any) -> bool:
+        return self.error(obj) is None
+
+    def to_action(self, obj: dict[str, Any]) -> Action:
+        """Typed view of an object that passed `error()`."""
+        thought = next((obj[k] for k in self.thought_keys if k in obj), None)
+        point = obj.get("POINT")
+        to = obj.get("to")
+        duration = obj.get("duration")
+        return Action(
+            point=(int(point[0]), int(point[1])) if point is not None else None,
+            to=to if to is None or isinstance(to, str) else (int(to[0]), int(to[1])),
+            duration=int(duration) if duration is not None else None,
+            press=obj.get("PRESS"),
+            type=obj.get("TYPE"),
+            clear="CLEAR" in obj,
+            deep_link="DEEP_LINK" in obj,
+            status=obj.get("STATUS"),
+            thought=thought,
+        )
+
+
+def repair_json(text: str) -> Optional[dict[str, Any]]:
+    """The JSON object in a model completion, or None.
+
+    Tries `json.loads` first; otherwise, within MAX_REPAIR_CHARS, strips a
+    Markdown code fence and surrounding prose, decodes the first `{...}`, and
+    for truncated output keeps the top-level members that are complete (an
+    unterminated non-action string such as `thought` is closed).  Output cut
+    off inside an action member gives None, so the caller asks again instead
+    of running a different action.
+    """
+    try:
+        obj = json.loads(text)
+    except ValueError:
+        pass
+    else:
+        return obj if isinstance(obj, dict) else None
+    text = text[:MAX_REPAIR_CHARS]
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        obj, _ = _DECODER.raw_decode(text, start)
+    except ValueError:
+        pass
+    else:
+        return obj if isinstance(obj, dict) else None
+    parser = StreamingActionParser()
+    parser.feed(text[start:])
+    parser.close()
+    if parser.truncated_action:
+        return None
+    return dict(parser.fields) or None
+
+
+ACTION_VALIDATOR = ActionValidator.from_file()
+
+
+def parse_action(text: str, validator: Optional[ActionValidator] = None) -> Optional[Action]:
+    """Repair, validate and type a completion; None if no valid action is in it."""
+    validator = validator or ACTION_VALIDATOR
+    obj = repair_json(text)
+    if obj is None or validator.error(obj) is not None:
+        return None
+    return validator.to_action(obj)
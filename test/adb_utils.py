@@ -3,10 +3,19 @@ import datetime
 import urllib.parse
 import logging
 import os
+import socket
+import struct
+import threading
+import uuid
+from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
 import io
+import numpy as np
 import PIL.Image as Image
 
+import screen_settle
+import tracing
+
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO,
@@ -26,9 +35,40 @@ def _adb_prefix(serial: str | None) -> List[str]:
     return ["adb", "-s", serial] if serial else ["adb"]
 
 
-def _resize_pillow(origin_img, max_line_res: int = 1120):
-    """Resize PIL image so that longest edge ≤ `max_line_res` using Lanczos."""
-    w, h = origin_img.size
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("adb server closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_all(sock: socket.socket) -> bytes:
+    buf = bytearray()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return bytes(buf)
+        buf += chunk
+
+
+def _adb_request(sock: socket.socket, payload: str) -> None:
+    """Send one smart-socket request (`%04x` length + payload) and check OKAY/FAIL."""
+    data = payload.encode()
+    sock.sendall(b"%04x" % len(data) + data)
+    status = _recv_exact(sock, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        length = int(_recv_exact(sock, 4), 16)
+        raise RuntimeError(f"adb server refused {payload!r}: {_recv_exact(sock, length).decode(errors='replace')}")
+    raise RuntimeError(f"Unexpected adb server reply to {payload!r}: {status!r}")
+
+
+def _fit_size(w: int, h: int, max_line_res: int | None) -> tuple[int, int]:
+    """Target (w, h) so that the longest edge ≤ `max_line_res`."""
     if max_line_res is not None:
         max_line = max_line_res
         if h > max_line:
@@ -37,8 +77,59 @@ def _resize_pillow(origin_img, max_line_res: int = 1120):
         if w > max_line:
             h = int(h * max_line / w)
             w = max_line
+    return w, h
+
+
+def _resize_pillow(origin_img, max_line_res: int = 1120):
+    """Resize PIL image so that longest edge ≤ `max_line_res` using Lanczos."""
+    w, h = _fit_size(*origin_img.size, max_line_res)
     return origin_img.resize((w, h), resample=Image.Resampling.LANCZOS)
 
+
+def _resize_array(arr: np.ndarray, max_line_res: int = 1120) -> np.ndarray:
+    """Fast downscale of an (h, w, c) uint8 array with the same size rule.
+
+    An integer box filter removes most of the scale (and the aliasing), then a
+    nearest-neighbour gather lands on the exact target size.
+    """
+    h, w = arr.shape[:2]
+    tw, th = _fit_size(w, h, max_line_res)
+    if (tw, th) == (w, h):
+        return arr
+    k = min(h // th, w // tw, 16)  # 16*16*255 still fits uint16
+    if k >= 2:
+        hh, ww = h // k * k, w // k * k
+        acc = np.zeros((hh // k, ww // k, arr.shape[2]), dtype=np.uint16)
+        for dy in range(k):
+            for dx in range(k):
+                acc += arr[dy:hh:k, dx:ww:k]
+        arr = (acc // (k * k)).astype(np.uint8)
+        h, w = arr.shape[:2]
+    ys = np.arange(th) * h // th
+    xs = np.arange(tw) * w // tw
+    return arr[ys[:, None], xs]
+
+
+# `screencap` (no -p) PixelFormat values that carry 4 bytes per pixel
+_RAW_4BPP_FORMATS = {1: "RGBA_8888", 2: "RGBX_8888"}
+
+
+def _parse_raw_screencap(data: bytes) -> np.ndarray:
+    """Zero-copy (h, w, 4) uint8 view over raw `screencap` output.
+
+    The header is width, height, format (u32 LE each), followed on Android 9+
+    by a u32 colour space; its length is inferred from the payload size.
+    """
+    if len(data) < 12:
+        raise RuntimeError(f"Raw screencap too short ({len(data)} bytes)")
+    w, h, fmt = struct.unpack_from("<III", data, 0)
+    if fmt not in _RAW_4BPP_FORMATS:
+        raise RuntimeError(f"Unsupported raw screencap pixel format: {fmt}")
+    header = len(data) - w * h * 4
+    if header not in (12, 16):
+        raise RuntimeError(f"Raw screencap size mismatch: {len(data)} bytes for {w}x{h}")
+    return np.frombuffer(data, dtype=np.uint8, count=w * h * 4, offset=header).reshape(h, w, 4)
+
 def _encode_text_for_adb(text: str) -> str:
     """Encode text for adb shell input.  URL?encode spaces as %s."""
     def _esc(ch: str) -> str:
@@ -53,6 +144,224 @@ def _encode_ascii_for_adb(text: str) -> str:
     """Encode ASCII?only string for `adb shell input text …` (spaces→%s)."""
     return text.replace(" ", "%s")
 
+_SWIPE_DIRECTIONS = {
+    "up": (0, -0.15),
+    "down": (0, 0.15),
+    "left": (-0.15, 0),
+    "right": (0.15, 0),
+}
+
+_PRESS_KEYCODES = {
+    "HOME": "KEYCODE_HOME",
+    "BACK": "KEYCODE_BACK",
+    "MENU": "KEYCODE_MENU",
+    "ENTER": "KEYCODE_ENTER",
+    "APPSELECT": "KEYCODE_APP_SWITCH",
+    "power": "KEYCODE_POWER",
+    "volume_up": "KEYCODE_VOLUME_UP",
+    "volume_down": "KEYCODE_VOLUME_DOWN",
+    "volume_mute": "KEYCODE_VOLUME_MUTE",
+}
+
+
+def _is_finish(data: Dict[str, Any]) -> bool:
+    return data.get("STATUS") in ("finish", "impossible")
+
+
+@dataclass
+class ActionResult:
+    """Outcome of one action in `AndroidDevice.step_batch`."""
+
+    action: Optional[Dict[str, Any]]
+    status: Optional[int] = None  # shell exit status; None if skipped
+    output: bytes = b""
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 0
+
+    @property
+    def finished(self) -> bool:
+        """The action ends the task (STATUS finish/impossible)."""
+        return self.action is not None and _is_finish(self.action)
+
+# ---------------------------------------------------------------------------
+# Transports: how `shell` / `exec-out` reach the device
+# ---------------------------------------------------------------------------
+
+ADB_SERVER_HOST = os.environ.get("ADB_SERVER_HOST", "127.0.0.1")
+ADB_SERVER_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))
+
+
+class ExecStream:
+    """Readable byte stream from a long-running `exec-out` command."""
+
+    def __init__(self, read, close):
+        self._read = read
+        self._close = close
+
+    def read(self, n: int = 65536) -> bytes:
+        """Return up to `n` bytes; b"" once the command has exited."""
+        return self._read(n)
+
+    def close(self) -> None:
+        self._close()
+
+
+class ForkTransport:
+    """One `adb` client process per call (the original behaviour)."""
+
+    name = "fork"
+
+    def __init__(self, serial: str | None):
+        self.serial = serial
+
+    def shell(self, *args: str, timeout: int = 30) -> bytes:
+        return _run(_adb_prefix(self.serial) + ["shell", *args], timeout)
+
+    def exec_out(self, *args: str, timeout: int = 30) -> bytes:
+        return _run(_adb_prefix(self.serial) + ["exec-out", *args], timeout)
+
+    def open_stream(self, *args: str) -> ExecStream:
+        cmd = _adb_prefix(self.serial) + ["exec-out", *args]
+        logger.debug("$ %s &", " ".join(cmd))
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        def _close():
+            proc.kill()
+            proc.wait()
+
+        return ExecStream(proc.stdout.read1, _close)
+
+    def close(self) -> None:
+        pass
+
+
+class SocketTransport:
+    """Speaks the adb smart-socket protocol to the local adb server.
+
+    Shell commands share one long-lived `exec:sh` session per device, each
+    terminated by a unique marker carrying the exit status.  Binary output
+    (`exec-out screencap`) gets its own short-lived socket, so every call costs
+    a loopback TCP connect instead of forking an adb client.
+    """
+
+    name = "socket"
+
+    def __init__(self, serial: str | None,
+                 host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT):
+        self.serial = serial
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        self._sock: socket.socket | None = None
+        self._buf = bytearray()
+        self._marker = f"__adb_done_{uuid.uuid4().hex}__".encode()
+
+    def _connect(self, timeout: float) -> socket.socket:
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        try:
+            _adb_request(sock, f"host:transport:{self.serial}" if self.serial
+                         else "host:transport-any")
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _session(self, timeout: float) -> socket.socket:
+        if self._sock is None:
+            sock = self._connect(timeout)
+            try:
+                _adb_request(sock, "exec:sh")
+            except Exception:
+                sock.close()
+                raise
+            self._sock = sock
+            self._buf.clear()
+        self._sock.settimeout(timeout)
+        return self._sock
+
+    def shell(self, *args: str, timeout: int = 30) -> bytes:
+        cmd = " ".join(args)
+        logger.debug("[socket] $ %s", cmd)
+        script = "{ %s\n} </dev/null 2>&1; printf '\\n%s %%d\\n' $?\n" % (
+            cmd, self._marker.decode())
+        with self._lock:
+            try:
+                sock = self._session(timeout)
+                sock.sendall(script.encode())
+                output, status = self._read_until_marker(sock)
+            except socket.timeout:
+                self._drop_session()
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            except Exception:
+                self._drop_session()
+                raise
+        if status != 0:
+            raise subprocess.CalledProcessError(status, cmd, output)
+        return output
+
+    def _read_until_marker(self, sock: socket.socket) -> tuple[bytes, int]:
+        tag = b"\n" + self._marker + b" "
+        while True:
+            start = self._buf.find(tag)
+            if start != -1:
+                end = self._buf.find(b"\n", start + len(tag))
+                if end != -1:
+                    output = bytes(self._buf[:start])
+                    status = int(self._buf[start + len(tag):end])
+                    del self._buf[:end + 1]
+                    return output, status
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("adb shell session closed")
+            self._buf += chunk
+
+    def exec_out(self, *args: str, timeout: int = 30) -> bytes:
+        cmd = " ".join(args)
+        logger.debug("[socket] exec-out %s", cmd)
+        try:
+            with self._connect(timeout) as sock:
+                _adb_request(sock, "exec:" + cmd)
+                return _recv_all(sock)
+        except socket.timeout:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+
+    def open_stream(self, *args: str) -> ExecStream:
+        cmd = " ".join(args)
+        logger.debug("[socket] exec-out %s &", cmd)
+        sock = self._connect(timeout=10)
+        try:
+            _adb_request(sock, "exec:" + cmd)
+        except Exception:
+            sock.close()
+            raise
+        sock.settimeout(None)
+
+        def _close():
+            try:  # unblocks a reader thread sitting in recv()
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+        return ExecStream(sock.recv, _close)
+
+    def _drop_session(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop_session()
+
+
+TRANSPORTS = {
+    ForkTransport.name: ForkTransport,
+    SocketTransport.name: SocketTransport,
+}
+
 # ---------------------------------------------------------------------------
 # AndroidDevice class
 # ---------------------------------------------------------------------------
@@ -60,32 +369,144 @@ def _encode_ascii_for_adb(text: str) -> str:
 class AndroidDevice:
     """Encapsulates a single, already?connected Android handset."""
 
-    _yadb_pushed: bool = False
     _yadb_local: str = os.path.join(os.path.dirname(__file__), "yadb/yadb")
 
-    def __init__(self, serial: str | None):
+    def __init__(self, serial: str | None, transport: Any = "socket",
+                 capture: str = "png"):
+        """`transport` is a TRANSPORTS name or a ready transport object (e.g. a
+        stand-in that records commands, see fake_backends.py)."""
+        if isinstance(transport, str) and transport not in TRANSPORTS:
+            raise ValueError(f"Unknown adb transport: {transport}")
+        if capture not in ("png", "raw"):
+            raise ValueError(f"Unknown capture mode: {capture}")
         self.serial: str | None = serial
+        self.capture: str = capture
         self.width: int = 0
         self.height: int = 0
         self.last_req_time: datetime.datetime = datetime.datetime.now()
+        self.yadb_pushed: bool = False
+        self._transport = TRANSPORTS[transport](serial) if isinstance(transport, str) else transport
+        self._stream = None
+        self._layouts = None  # ui_layout.LayoutCache, created on first use
 
     # ---------- internal ----------
     def _adb(self, *args: str, timeout: int = 30) -> bytes:
         return _run(_adb_prefix(self.serial) + list(args), timeout)
 
+    def _shell(self, *args: str, timeout: int = 30) -> bytes:
+        return self._transport.shell(*args, timeout=timeout)
+
+    def _exec_out(self, *args: str, timeout: int = 30) -> bytes:
+        return self._transport.exec_out(*args, timeout=timeout)
+
+    def close(self) -> None:
+        """Release the transport's persistent connection (if any)."""
+        self.stop_stream()
+        self._transport.close()
+
     def _ensure_yadb(self):
-        if AndroidDevice._yadb_pushed:
+        if self.yadb_pushed:
             return
         if not os.path.exists(AndroidDevice._yadb_local):
             raise FileNotFoundError(f"yadb helper not found: {AndroidDevice._yadb_local}")
         self._adb("push", AndroidDevice._yadb_local, "/data/local/tmp")
-        AndroidDevice._yadb_pushed = True
-        logger.info("yadb pushed to device for Unicode input support")
+        self.yadb_pushed = True
+        logger.info("yadb pushed to %s for Unicode input support", self.serial or "<default>")
+
+    def dump_layout(self) -> bytes:
+        """UI hierarchy XML of the current screen (yadb `-layout`)."""
+        return self._exec_out("cat", self._dump_layout_file())
+
+    def _dump_layout_file(self) -> str:
+        self._ensure_yadb()
+        path = "/data/local/tmp/yadb_layout_dump.xml"
+        self._shell("app_process -Djava.class.path=/data/local/tmp/yadb /data/local/tmp "
+                    "com.ysbing.yadb.Main -layout " + path)
+        return path
+
+    def _layout_nodes(self) -> list:
+        """Parse the layout dump; when the transport can stream it is parsed
+        while `cat` streams it over, instead of after the whole file has arrived."""
+        from ui_layout import LayoutParser, parse_layout
+
+        open_stream = getattr(self._transport, "open_stream", None)
+        if open_stream is None:
+            return parse_layout(self.dump_layout())
+        parser = LayoutParser()
+        stream = open_stream("cat", self._dump_layout_file())
+        try:
+            while True:
+                chunk = stream.read()
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        finally:
+            stream.close()
+        parser.close()
+        return parser.nodes
+
+    def layout_index(self, screen: Optional[np.ndarray] = None):
+        """`ui_layout.LayoutIndex` of the current screen, cached per screen digest.
+
+        Pass the screenshot already taken for this step as `screen` to avoid
+        another capture; an unchanged screen reuses the cached index.
+        """
+        from ui_layout import LayoutCache, LayoutIndex
+
+        if self._layouts is None:
+            self._layouts = LayoutCache()
+        if not self.width or not self.height:
+            self.refresh_resolution()
+        key = screen_settle.screen_digest(screen if screen is not None else self.screenshot_array(1120))
+        index = self._layouts.get(key)
+        if index is None:
+            with tracing.span("layout", device=self.serial):
+                index = LayoutIndex(self._layout_nodes(), self.width, self.height)
+            self._layouts.put(key, index)
+        return index
+
+    def _try_layout_index(self, screen: Optional[np.ndarray]):
+        try:
+            return self.layout_index(screen)
+        except (RuntimeError, OSError, subprocess.SubprocessError, SyntaxError) as exc:
+            # SyntaxError covers xml.etree.ElementTree.ParseError
+            logger.warning("UI layout unavailable (%s); using the model's coordinates.", exc)
+            return None
+
+    def _to_relative(self, x: int, y: int) -> List[int]:
+        return [min(max(round(x * 1000 / self.width), 0), 1000),
+                min(max(round(y * 1000 / self.height), 0), 1000)]
+
+    def snap_action(self, data: Optional[Dict[str, Any]], screen: Optional[np.ndarray] = None,
+                    radius: int = 48) -> Optional[Dict[str, Any]]:
+        """`data` with a tap POINT moved onto the clickable element under it, or
+        the nearest one within `radius` px.  Swipes, other actions and points
+        with nothing clickable nearby are returned unchanged."""
+        if not data or "POINT" not in data or "to" in data:
+            return data
+        index = self._try_layout_index(screen)
+        if index is None:
+            return data
+        x, y, _ = self._point_target(data)
+        snapped = index.snap(x, y, radius)
+        if snapped is None or snapped == (x, y):
+            return data
+        logger.debug("Snapped POINT (%d, %d) -> %s", x, y, snapped)
+        return {**data, "POINT": self._to_relative(*snapped)}
+
+    def text_action(self, label: str, screen: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """A POINT action tapping the clickable element labelled `label`, or
+        None if the current layout has no such element."""
+        index = self._try_layout_index(screen)
+        target = index.text_target(label) if index is not None else None
+        if target is None:
+            return None
+        return {"POINT": self._to_relative(*target)}
 
     # ---------- public API ----------
     def refresh_resolution(self) -> None:
         """Query and cache `wm size` (sets .width / .height)."""
-        raw = self._adb("shell", "wm", "size").decode()
+        raw = self._shell("wm", "size").decode()
         try:
             size_line = raw.split("Physical size: ")[1].splitlines()[0]
             self.width, self.height = map(int, size_line.split("x"))
@@ -97,46 +518,182 @@ class AndroidDevice:
     # -------------------------------------------------------------------
     # Step: execute user action
     # -------------------------------------------------------------------
-    def step(self, data: Dict[str, Any]) -> None:
-        """Execute a control step on the device (tap/swipe/key/text/clear)."""
+    def step(self, data: Optional[Dict[str, Any]]) -> bool:
+        """Execute a control step on the device (tap/swipe/key/text/clear).
+
+        `data` is None when the model output held no valid action; nothing is
+        done and the task continues.  Returns True once the task is finished.
+        """
         logger.debug("Step: %s", data)
-        if "POINT" in data:
-            self._handle_point(data)
-        if "PRESS" in data:
-            self._handle_press(data["PRESS"])
-        if "TYPE" in data:
-            self._handle_type(data["TYPE"])
-        if "CLEAR" in data:
-            self._adb("shell", "input", "keyevent", "KEYCODE_CLEAR")
+        if data is None:
+            logger.warning("No valid action to execute; skipping step.")
+            return False
+        with tracing.span("actuate", device=self.serial):
+            for cmd in self._action_commands(data):
+                self._shell(cmd)
         self.last_req_time = datetime.datetime.now()
 
-        if ("STATUS", "finish") in data.items() or ("STATUS", "impossible") in data.items():
+        if _is_finish(data):
             logger.info("Task finished")
             return True
         return False
 
+    def step_batch(self, actions: List[Optional[Dict[str, Any]]],
+                   stop_on_error: bool = True) -> List["ActionResult"]:
+        """Execute several actions in a single shell round trip.
+
+        The actions are compiled into one script; each one's exit status and
+        output come back behind a marker line, so e.g. CLEAR → TYPE → PRESS
+        ENTER costs one `adb shell` instead of three.  With `stop_on_error`,
+        actions after the first failing one are skipped (`status` None).
+        Unlike `step`, failures are reported in the results, not raised.
+        """
+        results = [ActionResult(action) for action in actions]
+        marker = f"__act_{uuid.uuid4().hex[:12]}__"
+        lines = ["__ok=0"]
+        for i, action in enumerate(actions):
+            cmds = self._action_commands(action) if action is not None else []
+            if not cmds:
+                results[i].status = 0  # nothing to run (e.g. STATUS only)
+                continue
+            lines.append(
+                "if [ $__ok = 0 ]; then { %s; } </dev/null 2>&1; __s=$?; "
+                "printf '\\n%s %d %%d\\n' $__s;%s fi"
+                % ("; ".join(cmds), marker, i, " [ $__s = 0 ] || __ok=1;" if stop_on_error else ""))
+        if len(lines) > 1:
+            with tracing.span("actuate", device=self.serial, batch=len(actions)):
+                output = self._shell("; ".join(lines))
+            tag = b"\n" + marker.encode() + b" "
+            start = 0
+            while True:
+                pos = output.find(tag, start)
+                if pos == -1:
+                    break
+                end = output.index(b"\n", pos + len(tag))
+                index, status = output[pos + len(tag):end].split()
+                results[int(index)].status = int(status)
+                results[int(index)].output = output[start:pos]
+                start = end + 1
+        self.last_req_time = datetime.datetime.now()
+        return results
+
     # -------------------------------------------------------------------
     # State snapshot
     # -------------------------------------------------------------------
     def state(self) -> Dict[str, Any]:
         return {
+            "serial": self.serial,
+            "yadb_pushed": self.yadb_pushed,
             "width": self.width,
             "height": self.height,
             "last_req_time": self.last_req_time.isoformat(),
             "screenshot": self.screenshot(),
         }
 
+    # --- Screen streaming -----------------------------------------------
+    def start_stream(self, max_side: Optional[int] = 1120, **kwargs: Any) -> None:
+        """Start a background `screenrecord` H.264 feed (see screen_stream.py).
+
+        While it runs, `screenshot` / `screenshot_array` return the newest
+        decoded frame instead of doing a capture round trip.  The device encodes
+        at the `max_side` size rule, so keep it ≥ the size you will request.
+        """
+        from screen_stream import ScreenStream
+
+        if self._stream is not None:
+            return
+        if not self.width or not self.height:
+            self.refresh_resolution()
+        w, h = _fit_size(self.width, self.height, max_side)
+        self._stream = ScreenStream(self._transport, size=(w // 2 * 2, h // 2 * 2), **kwargs)
+        self._stream.start()
+
+    def stop_stream(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream = None
+
+    def wait_until_stable(self, max_side: Optional[int] = 1120, timeout: float = 5.0,
+                          **kwargs: Any) -> np.ndarray:
+        """Block until the screen stops changing (or `timeout`); return the last frame.
+
+        The returned array is what `screenshot_array(max_side)` would give, so
+        the caller can use it as the next observation.  Extra keyword arguments
+        go to `screen_settle.wait_until_stable`.
+        """
+        settled, frame = screen_settle.wait_until_stable(
+            lambda: self.screenshot_array(max_side), timeout=timeout, **kwargs)
+        if not settled:
+            logger.info("Screen still changing after %.1fs; continuing anyway.", timeout)
+        return frame
+
     # --- Device state ---------------------------------------------------
     def screenshot(self, max_side: Optional[int] = None) -> Image.Image:
         """Grab screen; return Pillow Image.  Optionally down?scale with user rule."""
-        png_bytes = self._adb("exec-out", "screencap", "-p")
-        img = Image.open(io.BytesIO(png_bytes))
+        if self.capture == "raw" or self._stream is not None:
+            return Image.fromarray(self.screenshot_array(max_side))
+        return self._screenshot_png(max_side)
+
+    def _screenshot_png(self, max_side: Optional[int]) -> Image.Image:
+        with tracing.span("capture", device=self.serial, mode="png"):
+            png_bytes = self._exec_out("screencap", "-p")
+            img = Image.open(io.BytesIO(png_bytes))
+            img.load()
         if max_side is not None:
-            img = _resize_pillow(img, max_side)
+            with tracing.span("resize", device=self.serial):
+                img = _resize_pillow(img, max_side)
         return img
 
+    def _resize(self, frame: np.ndarray, max_side: Optional[int]) -> np.ndarray:
+        if max_side is None:
+            return frame
+        with tracing.span("resize", device=self.serial):
+            return _resize_array(frame, max_side)
+
+    def screenshot_array(self, max_side: Optional[int] = None) -> np.ndarray:
+        """Grab screen as an (h, w, 3) RGB uint8 array, ready to feed the model.
+
+        In "raw" capture mode the framebuffer is pulled without PNG encoding on
+        the device and downscaled with `_resize_array`; unsupported pixel
+        formats fall back to "png" for the rest of the session.  A screen stream
+        whose reader has stopped is dropped and capture goes back to round trips.
+        """
+        if self._stream is not None and not self._stream.alive:
+            logger.warning("Screen stream stopped; capturing screenshots directly.")
+            self.stop_stream()
+        if self._stream is not None:
+            with tracing.span("capture", device=self.serial, mode="stream"):
+                frame = self._stream.latest()
+            if frame is not None:
+                return self._resize(frame, max_side)
+        if self.capture == "raw":
+            try:
+                with tracing.span("capture", device=self.serial, mode="raw"):
+                    rgb = _parse_raw_screencap(self._exec_out("screencap"))[..., :3]
+            except RuntimeError as exc:
+                logger.warning("Raw screencap unusable (%s); falling back to PNG.", exc)
+                self.capture = "png"
+            else:
+                return self._resize(rgb, max_side)
+        return np.asarray(self._screenshot_png(max_side).convert("RGB"))
+
     # =================== private helpers ===================
-    def _handle_point(self, data: Dict[str, Any]) -> None:
+    def _action_commands(self, data: Dict[str, Any]) -> List[str]:
+        """Shell command lines that carry out one action, in execution order."""
+        cmds = []
+        if "POINT" in data:
+            x, y, swipe = self._point_target(data)
+            cmds.append("input swipe %d %d %d %d %s" % (x, y, *swipe) if swipe else f"input tap {x} {y}")
+        if "PRESS" in data:
+            cmds.append("input keyevent " + self._keycode(data["PRESS"]))
+        if "TYPE" in data:
+            cmds.append(self._type_command(data["TYPE"]))
+        if "CLEAR" in data:
+            cmds.append("input keyevent KEYCODE_CLEAR")
+        return cmds
+
+    def _point_target(self, data: Dict[str, Any]):
+        """(x, y, None) for a tap or (x, y, (x2, y2, duration)) for a swipe, in pixels."""
         x, y = data["POINT"]
         x = int(x / 1000 * self.width)
         y = int(y / 1000 * self.height)
@@ -146,70 +703,68 @@ class AndroidDevice:
                 x2 = int(x2 / 1000 * self.width)
                 y2 = int(y2 / 1000 * self.height)
             else:  # directional swipe (up/down/left/right)
-                dirs = {
-                    "up": (0, -0.15),
-                    "down": (0, 0.15),
-                    "left": (-0.15, 0),
-                    "right": (0.15, 0),
-                }
-                if data["to"] not in dirs:
+                if data["to"] not in _SWIPE_DIRECTIONS:
                     raise ValueError(f"Invalid swipe direction: {data['to']}")
-                dx_ratio, dy_ratio = dirs[data["to"]]
+                dx_ratio, dy_ratio = _SWIPE_DIRECTIONS[data["to"]]
                 x2 = int(max(min(x + dx_ratio * self.width, self.width), 0))
                 y2 = int(max(min(y + dy_ratio * self.height, self.height), 0))
-            dur = str(data.get("duration", 150))
-            self._adb("shell", "input", "swipe", str(x), str(y), str(x2), str(y2), dur)
-        else:  # simple tap
-            self._adb("shell", "input", "tap", str(x), str(y))
-
-    def _handle_press(self, key: str) -> None:
-        KEYS = {
-            "HOME": "KEYCODE_HOME",
-            "BACK": "KEYCODE_BACK",
-            "MENU": "KEYCODE_MENU",
-            "ENTER": "KEYCODE_ENTER",
-            "APPSELECT": "KEYCODE_APP_SWITCH",
-            "power": "KEYCODE_POWER",
-            "volume_up": "KEYCODE_VOLUME_UP",
-            "volume_down": "KEYCODE_VOLUME_DOWN",
-            "volume_mute": "KEYCODE_VOLUME_MUTE",
-        }
-        if key not in KEYS:
+            return x, y, (x2, y2, data.get("duration", 150))
+        return x, y, None  # simple tap
+
+    def _keycode(self, key: str) -> str:
+        if key not in _PRESS_KEYCODES:
             raise ValueError(f"Unknown PRESS value: {key}")
-        self._adb("shell", "input", "keyevent", KEYS[key])
+        return _PRESS_KEYCODES[key]
 
     # def _handle_type(self, raw):
     #     decoded = urllib.parse.unquote(raw)
     #     self._adb("shell", "am", "broadcast", '-a', 'ADB_INPUT_TEXT', '--es msg' , decoded)
     #     # self._adb("shell", "input", "text", decoded)
 
-    def _handle_type(self, raw):
+    def _type_command(self, raw: str) -> str:
         text = urllib.parse.unquote(raw)
         if all(ord(c) < 128 for c in text):  # quick ASCII path
-            self._adb("shell", "input", "text", _encode_ascii_for_adb(text))
-            return
+            return "input text " + _encode_ascii_for_adb(text)
         # Unicode → yadb
         self._ensure_yadb()
         safe = text.replace("'", "'\\''")  # escape single quotes for sh
-        cmd = (
+        return (
             "app_process -Djava.class.path=/data/local/tmp/yadb /data/local/tmp "
             "com.ysbing.yadb.Main -keyboard '%s'" % safe
         )
-        self._adb("shell", cmd)
 
 # ---------------------------------------------------------------------------
 # Public utility function
 # ---------------------------------------------------------------------------
 
-def setup_device() -> AndroidDevice:
-    """Detect the first connected & authorised Android phone and return an object."""
+def list_devices() -> List[str]:
+    """Serials of every connected & authorised Android phone."""
     lines = _run(["adb", "devices"]).decode().strip().splitlines()[1:]
-    serials = [l.split()[0] for l in lines if l.strip() and "device" in l]
+    return [l.split()[0] for l in lines if l.strip() and l.split()[-1] == "device"]
+
+
+def setup_devices(serials: Optional[List[str]] = None, transport: str = "socket",
+                  capture: str = "png") -> List[AndroidDevice]:
+    """Open every authorised phone (or just `serials`) with its resolution cached."""
+    serials = serials or list_devices()
+    if not serials:
+        raise RuntimeError("No authorised Android device found. Plug in & check adb.")
+    devices = []
+    for serial in serials:
+        dev = AndroidDevice(serial, transport=transport, capture=capture)
+        dev.refresh_resolution()
+        devices.append(dev)
+    return devices
+
+
+def setup_device(transport: str = "socket", capture: str = "png") -> AndroidDevice:
+    """Detect the first connected & authorised Android phone and return an object."""
+    serials = list_devices()
     if not serials:
         raise RuntimeError("No authorised Android device found. Plug in & check adb.")
     if len(serials) > 1:
         logger.warning("Multiple devices detected; defaulting to the first (%s).", serials[0])
-    dev = AndroidDevice(serials[0])
+    dev = AndroidDevice(serials[0], transport=transport, capture=capture)
     dev.refresh_resolution()
     return dev
 
@@ -1,23 +1,31 @@
 import abc
+import asyncio
 import base64
 import io
 import os
 import time
-from typing import Any, Optional
-import google.generativeai as genai
-from google.generativeai import types
-from google.generativeai.types import answer_types
-from google.generativeai.types import content_types
-from google.generativeai.types import generation_types
-from google.generativeai.types import safety_types
+from typing import Any, Callable, Optional
 import numpy as np
 from PIL import Image
 import requests
 import json
-from jsonschema import Draft7Validator
+
+import tracing
+from action_parser import ActionValidator, StreamingActionParser, repair_json
+from inference_backends import (
+    END_POINT,
+    InferenceBackend,
+    OpenAIHttpBackend,
+    make_async_client,
+    make_session,
+)
+
+try:  # optional: encodes straight from the numpy array, no PIL round trip
+    import cv2
+except ImportError:
+    cv2 = None
 
 ERROR_CALLING_LLM = "Error calling LLM"
-END_POINT = "http://localhost:8000/v1/chat/completions"
 
 # 鑾峰彇褰撳墠鏂囦欢鐨勭粷瀵硅矾寰�
 current_file_path = os.path.abspath(__file__)
@@ -36,7 +44,10 @@ insert_index = 3  # 鍋囪瑕佹彃鍏ュ埌绱㈠紩1鐨勪綅缃�
 items.insert(insert_index, ("required", ["thought"]))
 # items.insert(insert_index, ("optional", ["thought"]))
 ACTION_SCHEMA = dict(items)
-SYSTEM_PROMPT = f"""# Role
+
+
+def build_system_prompt(schema: dict) -> str:
+    return f"""# Role
 浣犳槸涓€鍚嶇啛鎮夊畨鍗撶郴缁熻Е灞廏UI鎿嶄綔鐨勬櫤鑳戒綋锛屽皢鏍规嵁鐢ㄦ埛鐨勯棶棰橈紝鍒嗘瀽褰撳墠鐣岄潰鐨凣UI鍏冪礌鍜屽竷灞€锛岀敓鎴愮浉搴旂殑鎿嶄綔銆�
 
 # Task
@@ -47,27 +58,96 @@ SYSTEM_PROMPT = f"""# Role
 - 杈撳嚭鎿嶄綔蹇呴』閬靛惊Schema绾︽潫
 
 # Schema
-{json.dumps(ACTION_SCHEMA, indent=None, ensure_ascii=False, separators=(',', ':'))}"""
+{json.dumps(schema, indent=None, ensure_ascii=False, separators=(',', ':'))}"""
+
+
+def thought_last(schema: dict) -> dict:
+    """Copy of an action schema with `thought` listed after the action keys.
+
+    The model tends to follow the schema's key order, so this makes it emit the
+    action first and lets predict_mm_stream dispatch it before the thought.
+    """
+    properties = dict(schema["properties"])
+    if "thought" in properties:
+        properties["thought"] = properties.pop("thought")
+    return {**schema, "properties": properties}
+
+
+SYSTEM_PROMPT = build_system_prompt(ACTION_SCHEMA)
+SYSTEM_PROMPT_ACTION_FIRST = build_system_prompt(thought_last(ACTION_SCHEMA))
 
 EXTRACT_SCHEMA = json.load(
     open(os.path.join(current_dir, "schema_for_extraction.json"), encoding="utf-8")
 )
-validator = Draft7Validator(EXTRACT_SCHEMA)
+validator = ActionValidator(EXTRACT_SCHEMA)
 
 
-def array_to_jpeg_bytes(image: np.ndarray) -> bytes:
-    """Converts a numpy array into a byte string for a JPEG image."""
-    image = Image.fromarray(image)
-    return image_to_jpeg_bytes(image)
+HISTORY_MODES = ("image", "thumbnail", "action")
+
+IMAGE_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+_CV2_ENCODE_PARAMS = {
+    "jpeg": (".jpg", "IMWRITE_JPEG_QUALITY"),
+    "webp": (".webp", "IMWRITE_WEBP_QUALITY"),
+    "png": (".png", None),
+}
 
 
-def image_to_jpeg_bytes(image: Image.Image) -> bytes:
+def _limit_side(image: np.ndarray, max_side: Optional[int]) -> np.ndarray:
+    h, w = image.shape[:2]
+    if max_side is None or max(h, w) <= max_side:
+        return image
+    scale = max_side / max(h, w)
+    size = (max(int(w * scale), 1), max(int(h * scale), 1))
+    if cv2 is not None:
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return np.asarray(Image.fromarray(image).resize(size, resample=Image.Resampling.LANCZOS))
+
+
+def encode_image_bytes(
+    image: np.ndarray, fmt: str = "jpeg", quality: int = 90, max_side: Optional[int] = None
+) -> bytes:
+    """Encodes an RGB(A) numpy array as JPEG / WebP / PNG bytes.
+
+    Args:
+      image: (h, w, 3|4) uint8 array in RGB(A) order.
+      fmt: one of IMAGE_MIME_TYPES.
+      quality: 1-100, ignored for PNG.
+      max_side: if set, downscale so the longest side is at most this.
+    """
+    if fmt not in IMAGE_MIME_TYPES:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    image = _limit_side(np.asarray(image), max_side)
+    if image.ndim == 3 and image.shape[2] == 4 and fmt != "png":
+        image = image[..., :3]
+    if cv2 is not None:
+        ext, flag = _CV2_ENCODE_PARAMS[fmt]
+        params = [getattr(cv2, flag), int(quality)] if flag else []
+        if image.ndim == 3:
+            bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR if image.shape[2] == 3 else cv2.COLOR_RGBA2BGRA)
+        else:
+            bgr = image
+        ok, buf = cv2.imencode(ext, bgr, params)
+        if ok:
+            return buf.tobytes()
+    return _pil_encode(Image.fromarray(image), fmt, quality)
+
+
+def _pil_encode(image: Image.Image, fmt: str, quality: int) -> bytes:
     in_mem_file = io.BytesIO()
-    image.save(in_mem_file, format="PNG")
-    # Reset file pointer to start
-    in_mem_file.seek(0)
-    img_bytes = in_mem_file.read()
-    return img_bytes
+    if fmt == "png":
+        image.save(in_mem_file, format="PNG")
+    else:
+        image.convert("RGB").save(in_mem_file, format=fmt.upper(), quality=int(quality))
+    return in_mem_file.getvalue()
+
+
+def array_to_jpeg_bytes(image: np.ndarray, quality: int = 90) -> bytes:
+    """Converts a numpy array into a byte string for a JPEG image."""
+    return encode_image_bytes(image, "jpeg", quality)
+
+
+def image_to_jpeg_bytes(image: Image.Image, quality: int = 90) -> bytes:
+    return _pil_encode(image, "jpeg", quality)
 
 
 class LlmWrapper(abc.ABC):
@@ -106,21 +186,34 @@ class MultimodalLlmWrapper(abc.ABC):
         """
 
 
-SAFETY_SETTINGS_BLOCK_NONE = {
-    types.HarmCategory.HARM_CATEGORY_HARASSMENT: (types.HarmBlockThreshold.BLOCK_NONE),
-    types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: (types.HarmBlockThreshold.BLOCK_NONE),
-    types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: (
-        types.HarmBlockThreshold.BLOCK_NONE
-    ),
-    types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: (
-        types.HarmBlockThreshold.BLOCK_NONE
-    ),
-}
+def _safety_settings_block_none() -> dict:
+    # google.generativeai takes about a second to import; only Gemini callers pay for it
+    from google.generativeai import types
+
+    return {
+        types.HarmCategory.HARM_CATEGORY_HARASSMENT: (types.HarmBlockThreshold.BLOCK_NONE),
+        types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: (types.HarmBlockThreshold.BLOCK_NONE),
+        types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: (
+            types.HarmBlockThreshold.BLOCK_NONE
+        ),
+        types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: (
+            types.HarmBlockThreshold.BLOCK_NONE
+        ),
+    }
+
+
+def __getattr__(name: str):
+    """SAFETY_SETTINGS_BLOCK_NONE is built on first access (PEP 562)."""
+    if name == "SAFETY_SETTINGS_BLOCK_NONE":
+        value = globals()[name] = _safety_settings_block_none()
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class MiniCPMWrapper(LlmWrapper, MultimodalLlmWrapper):
 
     RETRY_WAITING_SECONDS = 20
+    REQUEST_TIMEOUT_SECONDS = 300
 
     def __init__(
         self,
@@ -129,23 +222,90 @@ class MiniCPMWrapper(LlmWrapper, MultimodalLlmWrapper):
         temperature: float = 0.1,
         use_history: bool = False,
         history_size: int = 10,  # 鏈€澶氫繚鐣欐渶杩� history_size 杞�
+        image_format: str = "jpeg",
+        image_quality: int = 90,
+        image_max_side: Optional[int] = None,
+        session: Optional[requests.Session] = None,
+        async_client: Any = None,
+        action_first: bool = False,
+        history_mode: str = "image",
+        history_thumbnail_side: int = 336,
+        endpoint: Optional[str] = None,
+        action_cache: Any = None,
+        backend: Optional[InferenceBackend] = None,
     ):
+        """history_mode controls how past steps are replayed when use_history is on:
+
+        "image"      full screenshots, sliding window (the original behaviour);
+        "thumbnail"  screenshots re-encoded once at `history_thumbnail_side`;
+        "action"     screenshots dropped, the past assistant turns carry the actions.
+
+        History entries are rendered once and never rewritten, so what vLLM's
+        automatic prefix caching can reuse is the system prompt plus the history
+        that was already in the previous request.  In "image" mode that also
+        covers the previous user turn (it enters history unchanged), but once the
+        window is full it slides every step and only the system prompt is shared.
+        The compact modes replace the previous full-size user turn with its
+        compact form, so that turn is never reused; they trim in blocks of
+        history_size/2 steps, so the older history stays a shared prefix for
+        several steps in a row.
+
+        action_cache (an action_cache.ActionCache) is consulted before every
+        request; on a hit the cached action is returned without calling the
+        model, and the history is advanced as if the model had answered.
+
+        backend (see inference_backends) runs the rendered request; by default
+        an OpenAIHttpBackend on `endpoint` / `session` / `async_client`.
+        """
         if max_retry <= 0:
             max_retry = 3
             print("Max_retry must be positive. Reset it to 3")
         self.max_retry = min(max_retry, 5)
         self.temperature = temperature
         self.model = model_name
+        if image_format not in IMAGE_MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.image_max_side = image_max_side
+        if backend is None:
+            backend = OpenAIHttpBackend(endpoint, session, async_client, self.REQUEST_TIMEOUT_SECONDS)
+        self.backend = backend
+        self.system_prompt = SYSTEM_PROMPT_ACTION_FIRST if action_first else SYSTEM_PROMPT
+        self._system_message = {
+            "role": "system",
+            "content": [{"type": "text", "text": self.system_prompt}],
+        }
 
         # ---------- 鏂板 ----------
         self.use_history  = use_history
         self.history_size = max(history_size, 1)
         # history 浠ャ€屽崟鏉℃秷鎭€嶄负绮掑害锛� [{'role': .., 'content': ..}, ...]
         self.history: list[dict] = []
-
-    @classmethod
-    def encode_image(cls, image: np.ndarray) -> str:
-        return base64.b64encode(array_to_jpeg_bytes(image)).decode("utf-8")
+        if history_mode not in HISTORY_MODES:
+            raise ValueError(f"Unknown history mode: {history_mode}")
+        self.history_mode = history_mode
+        self.history_thumbnail_side = history_thumbnail_side
+        # one entry per completed request, see prompt_report()
+        self.step_stats: list[dict] = []
+        self.action_cache = action_cache
+        # compact JSON of the latest actions, part of the action-cache key
+        self._recent_actions: list[str] = []
+
+    def encode_image(self, image: np.ndarray, max_side: Optional[int] = None) -> str:
+        data = encode_image_bytes(
+            image, self.image_format, self.image_quality, max_side or self.image_max_side
+        )
+        return base64.b64encode(data).decode("utf-8")
+
+    def close(self):
+        self.backend.close()
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+    def image_data_url(self, image: np.ndarray, max_side: Optional[int] = None) -> str:
+        return f"data:{IMAGE_MIME_TYPES[self.image_format]};base64,{self.encode_image(image, max_side)}"
 
     def _push_history(self, role: str, content: Any):
         """鎶婁竴鏉℃秷鎭啓鍏ュ巻鍙诧紝骞惰嚜鍔ㄨ鍓暱搴︺€�"""
@@ -154,25 +314,43 @@ class MiniCPMWrapper(LlmWrapper, MultimodalLlmWrapper):
         self.history.append({"role": role, "content": content})
         # 姣忚疆瀵硅瘽鍖呭惈 user + assistant 涓ゆ潯娑堟伅
         max_msgs = self.history_size * 2
-        if len(self.history) > max_msgs:
-            self.history = self.history[-max_msgs:]
+        if role == "assistant" and len(self.history) > max_msgs:
+            keep = max_msgs if self.history_mode == "image" else 2 * max(self.history_size // 2, 1)
+            self.history = self.history[-keep:]
+
+    def _history_user_content(self, user_content: list[dict], image: np.ndarray) -> list[dict]:
+        """Compact form of a finished step's user turn, per history_mode."""
+        if self.history_mode == "image":
+            return user_content
+        if self.history_mode == "thumbnail":
+            return [
+                user_content[0],
+                {
+                    "type": "image_url",
+                    "image_url": {"url": self.image_data_url(image, self.history_thumbnail_side)},
+                },
+            ]
+        # "action": keep only the question line; the assistant turn holds the action
+        question = user_content[0]["text"].rsplit("\n", 1)[0]
+        return [{"type": "text", "text": question}]
 
     def clear_history(self):
         """澶栭儴鍙墜鍔ㄦ竻绌鸿蹇嗐€�"""
         self.history.clear()
 
 
-    def extract_and_validate_json(self, input_string):
-        try:
-            json_obj = json.loads(input_string)
-            validator.validate(json_obj, EXTRACT_SCHEMA)
-            return json_obj
-        except json.JSONDecodeError as e:
+    def extract_and_validate_json(self, input_string) -> Optional[dict]:
+        """The validated action dict in the model output (fenced or truncated
+        JSON is repaired, see action_parser.repair_json), or None."""
+        json_obj = repair_json(input_string)
+        if json_obj is None:
             print("Error, JSON is NOT valid.")
-            return input_string
-        except Exception as e:
-            print(f"Error, JSON is NOT valid according to the schema.{input_string}", e)
-            return input_string
+            return None
+        error = validator.error(json_obj)
+        if error is not None:
+            print(f"Error, JSON is NOT valid according to the schema.{input_string}", error)
+            return None
+        return json_obj
 
     def predict(
         self,
@@ -180,36 +358,36 @@ class MiniCPMWrapper(LlmWrapper, MultimodalLlmWrapper):
     ) -> tuple[str, Optional[bool], Any]:
         return self.predict_mm(text_prompt, [])
 
-    def predict_mm(
+    def _user_content(self, text_prompt: str, image: np.ndarray) -> list[dict]:
+        with tracing.span("encode", format=self.image_format):
+            image_url = self.image_data_url(image)
+        user_content = [
+            {
+                "type": "text",
+                "text": f"<Question>{text_prompt}</Question>\n褰撳墠灞忓箷鎴浘锛�(<image>./</image>)",
+            },
+            {
+                "type": "image_url",
+                "image_url": {"url": image_url},
+            },
+        ]
+        return user_content
+
+    def _build_payload(
         self, text_prompt: str, images: list[np.ndarray]
-    ) -> tuple[str, Optional[bool], Any]:
+    ) -> tuple[dict, list[dict]]:
+        """Returns the chat-completions payload and the current user content."""
         assert len(images) == 1
 
         # -------- 鏋勯€� messages --------
-        messages: list[dict] = [
-            {
-                "role": "system",
-                "content": [{"type": "text", "text": SYSTEM_PROMPT}],
-            }
-        ]
+        messages: list[dict] = [self._system_message]
 
         # 1) 鎻掑叆鍘嗗彶
         if self.use_history and self.history:
             messages.extend(self.history)
 
         # 2) 褰撳墠 user 娑堟伅
-        user_content = [
-            {
-                "type": "text",
-                "text": f"<Question>{text_prompt}</Question>\n褰撳墠灞忓箷鎴浘锛�(<image>./</image>)",
-            },
-            {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{self.encode_image(images[0])}"
-                },
-            },
-        ]
+        user_content = self._user_content(text_prompt, images[0])
         messages.append({"role": "user", "content": user_content})
 
         payload = {
@@ -218,41 +396,204 @@ class MiniCPMWrapper(LlmWrapper, MultimodalLlmWrapper):
             "messages": messages,
             "max_tokens": 2048,
         }
+        return payload, user_content
+
+    def _cache_lookup(self, text_prompt: str, image: np.ndarray):
+        """(cache key, predict_mm-style result on a hit else None); (None, None)
+        when no action cache is set."""
+        if self.action_cache is None:
+            return None, None
+        with tracing.span("cache"):
+            key = self.action_cache.key(text_prompt, image, self._recent_actions)
+            entry = self.action_cache.get(key)
+        if entry is None:
+            return key, None
+        started = time.perf_counter()
+        assistant_text, action = entry
+        if self.use_history:
+            user_content = self._user_content(text_prompt, image)
+            self._push_history("user", self._history_user_content(user_content, image))
+        self._push_history("assistant", assistant_text)
+        self._remember_action(action)
+        self._record_stats({}, time.perf_counter() - started, cache_hit=True)
+        return key, (assistant_text, None, None, action)
+
+    def _remember_action(self, action: Optional[dict]):
+        if action is None:
+            self._recent_actions.append("null")
+        else:
+            self._recent_actions.append(compact_json_dumps({k: v for k, v in action.items() if k != "thought"}))
+        del self._recent_actions[:-8]
+
+    def _handle_completion(
+        self, data: dict, user_content: list[dict], response: Any, image: np.ndarray, started: float,
+        cache_key: Optional[str] = None,
+    ):
+        assistant_msg = data["choices"][0]["message"]
+        assistant_text = assistant_msg["content"]
+        with tracing.span("validate"):
+            action = self.extract_and_validate_json(assistant_text)
+        self._record_stats(data.get("usage") or {}, time.perf_counter() - started)
+        if cache_key is not None and action is not None:
+            self.action_cache.put(cache_key, assistant_text, action)
+        self._remember_action(action)
+
+        # -------- 鍐欏洖鍘嗗彶 --------
+        if self.use_history:
+            self._push_history("user", self._history_user_content(user_content, image))
+        self._push_history("assistant", assistant_msg["content"])
+
+        return assistant_text, None, response, action
+
+    def _record_stats(self, usage: dict, latency: float, cache_hit: bool = False):
+        details = usage.get("prompt_tokens_details") or {}
+        self.step_stats.append(
+            {
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "cached_tokens": details.get("cached_tokens"),
+                "completion_tokens": usage.get("completion_tokens"),
+                "history_msgs": len(self.history),
+                "latency_s": latency,
+                "cache_hit": cache_hit,
+            }
+        )
+
+    def prompt_report(self) -> str:
+        """Prompt tokens (and prefix-cache hits, if the server reports them) and
+        latency of every request made so far; `action` marks steps answered
+        from the action cache."""
+        lines = [f"{'step':>4}{'prompt_tok':>12}{'cached':>8}{'compl_tok':>11}{'history':>9}{'latency_s':>11}{'action':>8}"]
+        for i, st in enumerate(self.step_stats, 1):
+            lines.append(
+                f"{i:>4}{str(st['prompt_tokens']):>12}{str(st['cached_tokens']):>8}"
+                f"{str(st['completion_tokens']):>11}{st['history_msgs']:>9}{st['latency_s']:>11.2f}"
+                f"{'cache' if st['cache_hit'] else 'model':>8}"
+            )
+        if self.action_cache is not None:
+            lines.append(f"action cache: {self.action_cache.stats()}")
+        return "\n".join(lines)
 
-        headers = {
-            "Content-Type": "application/json",
-        }
+    def predict_mm(
+        self, text_prompt: str, images: list[np.ndarray]
+    ) -> tuple[str, Optional[bool], Any]:
+        cache_key, cached = self._cache_lookup(text_prompt, images[0])
+        if cached is not None:
+            return cached
+        payload, user_content = self._build_payload(text_prompt, images)
 
         counter = self.max_retry
         wait_seconds = self.RETRY_WAITING_SECONDS
         while counter > 0:
+            started = time.perf_counter()
             try:
-                response = requests.post(
-                    END_POINT,
-                    headers=headers,
-                    json=payload,
+                with tracing.span("inference", model=self.model, backend=self.backend.name):
+                    data = self.backend.complete(payload)
+                return self._handle_completion(
+                    data, user_content, data, images[0], started, cache_key
                 )
-                if response.ok and "choices" in response.json():
-                    assistant_msg = response.json()["choices"][0]["message"]
-                    assistant_text = assistant_msg["content"]
-                    action = self.extract_and_validate_json(assistant_text)
-
-                    # -------- 鍐欏洖鍘嗗彶 --------
-                    self._push_history("user",  user_content)
-                    self._push_history("assistant", assistant_msg["content"])
-
-                    return assistant_text, None, response, action
-                print(
-                    "Error calling OpenAI API with error message: "
-                    + response.json()["error"]["message"]
-                )
-                time.sleep(wait_seconds)
-                wait_seconds *= 2
             except Exception as e:  # pylint: disable=broad-exception-caught
                 # Want to catch all exceptions happened during LLM calls.
+                print("Error calling LLM, will retry soon...")
+                print(e)
+            counter -= 1
+            if counter > 0:
+                time.sleep(wait_seconds)
+                wait_seconds *= 2
+        return ERROR_CALLING_LLM, None, None, None
+
+    def predict_mm_stream(
+        self,
+        text_prompt: str,
+        images: list[np.ndarray],
+        on_action: Optional[Callable[[dict], Any]] = None,
+    ) -> tuple[str, Optional[bool], Any]:
+        """Streaming predict_mm that hands the action over as soon as it is final.
+
+        `on_action` is called exactly once: early, when the action keys have
+        closed and a non-action key (`thought`) has started (see
+        action_parser.StreamingActionParser), or with the validated action once
+        the completion ends.  Returns the same 4-tuple as predict_mm, with None
+        in place of the raw response.
+        """
+        cache_key, cached = self._cache_lookup(text_prompt, images[0])
+        if cached is not None:
+            if on_action is not None:
+                on_action(cached[3])
+            return cached
+        payload, user_content = self._build_payload(text_prompt, images)
+
+        counter = self.max_retry
+        wait_seconds = self.RETRY_WAITING_SECONDS
+        dispatched = False
+        while counter > 0:
+            parser = StreamingActionParser()
+            usage: dict = {}
+            started = time.perf_counter()
+            deltas = self.backend.stream(payload, usage)
+            error = None
+            with tracing.span("inference", model=self.model, backend=self.backend.name, stream=True):
+                while True:
+                    try:
+                        delta = next(deltas, None)
+                    except Exception as e:  # pylint: disable=broad-exception-caught
+                        error = e
+                        break
+                    if delta is None:
+                        break
+                    parser.feed(delta)
+                    if on_action is not None and not dispatched and parser.action_ready():
+                        early_action = parser.action()
+                        if validator.is_valid(early_action):
+                            dispatched = True
+                            on_action(early_action)
+            # Once the device has acted on this completion it must not be re-requested.
+            if error is None or dispatched:
+                data = {
+                    "choices": [{"message": {"role": "assistant", "content": parser.text}}],
+                    "usage": usage,
+                }
+                result = self._handle_completion(data, user_content, None, images[0], started, cache_key)
+                if on_action is not None and not dispatched:
+                    on_action(result[3])
+                return result
+            print("Error calling LLM, will retry soon...")
+            print(error)
+            counter -= 1
+            if counter > 0:
                 time.sleep(wait_seconds)
                 wait_seconds *= 2
-                counter -= 1
+        return ERROR_CALLING_LLM, None, None, None
+
+    async def apredict_mm(
+        self, text_prompt: str, images: list[np.ndarray]
+    ) -> tuple[str, Optional[bool], Any]:
+        """Same as predict_mm, but awaits the backend (for HTTP, a shared
+        httpx.AsyncClient).
+
+        Lets one event loop drive many agent sessions against the same vLLM
+        server without a thread per device.  Hashing and image encoding run in
+        worker threads so one session's encode does not stall the others.
+        """
+        cache_key, cached = await asyncio.to_thread(self._cache_lookup, text_prompt, images[0])
+        if cached is not None:
+            return cached
+        payload, user_content = await asyncio.to_thread(self._build_payload, text_prompt, images)
+
+        counter = self.max_retry
+        wait_seconds = self.RETRY_WAITING_SECONDS
+        while counter > 0:
+            started = time.perf_counter()
+            try:
+                with tracing.span("inference", model=self.model, backend=self.backend.name):
+                    data = await self.backend.acomplete(payload)
+                return await asyncio.to_thread(
+                    self._handle_completion, data, user_content, data, images[0], started, cache_key
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
                 print("Error calling LLM, will retry soon...")
                 print(e)
-        return ERROR_CALLING_LLM, None, None
\ No newline at end of file
+            counter -= 1
+            if counter > 0:
+                await asyncio.sleep(wait_seconds)
+                wait_seconds *= 2
+        return ERROR_CALLING_LLM, None, None, None
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Microbenchmark: action parsing + schema validation, old path vs action_parser.
+
+The old path is what `MiniCPMWrapper.extract_and_validate_json` did before:
+`json.loads` then `Draft7Validator.validate(obj, EXTRACT_SCHEMA)`, giving up on
+anything that is not bare JSON.  The new path is `action_parser.parse_action`
+(bounded repair + compiled validator).
+
+    python bench_action_parse.py --iterations 20000
+"""
+import argparse
+import json
+import time
+import warnings
+
+from jsonschema import Draft7Validator
+
+from action_parser import ACTION_VALIDATOR, EXTRACT_SCHEMA_PATH, parse_action
+
+VALID = [
+    '{"thought":"点击设置图标","POINT":[512,873]}',
+    '{"POINT":[500,800],"to":"up","thought":"向上滑动查看更多"}',
+    '{"thought":"输入关键词","TYPE":"北京天气"}',
+    '{"PRESS":"BACK","thought":"返回上一页"}',
+    '{"thought":"任务完成","STATUS":"finish"}',
+    '{"thought":"等待加载","duration":1000}',
+]
+# Outputs the old path rejected although the action is recoverable.
+REPAIRABLE = [
+    '```json\n{"thought":"点击搜索框","POINT":[300,120]}\n```',
+    '好的，下一步操作如下：{"PRESS":"HOME","thought":"回到主页"}',
+    '{"POINT":[640,220],"thought":"点击右上角的菜单按钮，然后',
+    '{"thought":"已经完成","STATUS":"finish"',
+]
+# Truncated inside an action member: repairing these would run a different
+# action (a swipe as a tap, half of the text), so they must be rejected.
+TRUNCATED_ACTION = [
+    '{"thought":"滑动","POINT":[100,200],"to":[300',
+    '{"thought":"搜索","TYPE":"hello wor',
+    '{"thought":"等待","duration":10',
+    '{"thought":"滑动","POINT":[100,200],"t',
+    '{"thought":"滑动","POINT":[100,200]',
+]
+INVALID = [
+    '{"thought":"两个动作","POINT":[1,2],"PRESS":"HOME"}',
+    '{"POINT":[1200,50]}',
+    "我无法完成这个任务",
+]
+SAMPLES = {"valid": VALID, "repairable": REPAIRABLE, "invalid": INVALID, "truncated": TRUNCATED_ACTION}
+
+
+def old_parse(text, validator, schema):
+    try:
+        obj = json.loads(text)
+        validator.validate(obj, schema)
+        return obj
+    except Exception:  # pylint: disable=broad-exception-caught
+        return None
+
+
+def time_per_call(fn, texts, iterations):
+    t0 = time.perf_counter()
+    for i in range(iterations):
+        fn(texts[i % len(texts)])
+    return (time.perf_counter() - t0) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    opts = parser.parse_args()
+
+    with open(EXTRACT_SCHEMA_PATH, encoding="utf-8") as f:
+        schema = json.load(f)
+    draft7 = Draft7Validator(schema)
+    warnings.simplefilter("ignore", DeprecationWarning)  # validate(obj, schema) form is deprecated
+
+    old = lambda text: old_parse(text, draft7, schema)  # noqa: E731
+    new = lambda text: parse_action(text)  # noqa: E731
+
+    # Both paths must agree wherever the old one produced an action.
+    for text in VALID + INVALID:
+        assert (old(text) is None) == (new(text) is None), text
+        if old(text) is not None:
+            assert ACTION_VALIDATOR.to_action(old(text)) == new(text), text
+    for text in REPAIRABLE:
+        assert new(text) is not None, text
+    for text in TRUNCATED_ACTION:
+        assert new(text) is None, text
+
+    print(f"{'samples':<12}{'old us':>10}{'new us':>10}{'speedup':>9}{'old ok':>8}{'new ok':>8}")
+    for name, texts in SAMPLES.items():
+        t_old = time_per_call(old, texts, opts.iterations)
+        t_new = time_per_call(new, texts, opts.iterations)
+        ok_old = sum(old(t) is not None for t in texts)
+        ok_new = sum(new(t) is not None for t in texts)
+        print(f"{name:<12}{t_old * 1e6:>10.1f}{t_new * 1e6:>10.1f}{t_old / t_new:>8.1f}x"
+              f"{ok_old:>5}/{len(texts):<2}{ok_new:>5}/{len(texts):<2}")
+
+
+if __name__ == "__main__":
+    main()
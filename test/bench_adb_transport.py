@@ -0,0 +1,66 @@
+"""Benchmark: actions/sec of the fork-per-call vs. persistent-socket adb transport.
+
+Run from this directory with one device attached:
+
+    python bench_adb_transport.py --iterations 50
+
+Workloads timed for every transport:
+  * ``echo``     – bare shell round trip (pure transport overhead)
+  * ``keyevent`` – `input keyevent KEYCODE_UNKNOWN`, a no-op device action
+  * ``macro``    – a 3-action CLEAR sequence via `step` (one round trip per
+    action) and via `step_batch` (one round trip in total); rates are actions/s
+"""
+import argparse
+import statistics
+import time
+
+from adb_utils import TRANSPORTS, AndroidDevice, setup_device
+
+WORKLOADS = {
+    "echo": ("echo", "ok"),
+    "keyevent": ("input", "keyevent", "KEYCODE_UNKNOWN"),
+}
+MACRO = [{"CLEAR": None}] * 3
+
+
+def bench(fn, iterations: int, actions: int = 1) -> list[float]:
+    """Per-action latency samples of `fn()`, which performs `actions` actions."""
+    fn()  # warm-up (opens the persistent session if any)
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) / actions)
+    return samples
+
+
+def report(transport: str, workload: str, samples: list[float]) -> None:
+    print(f"{transport:<10}{workload:<14}{len(samples) / sum(samples):>12.1f}"
+          f"{statistics.median(samples) * 1000:>10.1f}{max(samples) * 1000:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--serial", default=None,
+                        help="device serial (default: first authorised device)")
+    opts = parser.parse_args()
+
+    serial = opts.serial or setup_device(transport="fork").serial
+    print(f"device={serial} iterations={opts.iterations}")
+    print(f"{'transport':<10}{'workload':<14}{'actions/s':>12}{'p50 ms':>10}{'max ms':>10}")
+    for transport in TRANSPORTS:
+        device = AndroidDevice(serial, transport=transport)
+        try:
+            for workload, args in WORKLOADS.items():
+                report(transport, workload, bench(lambda: device._shell(*args), opts.iterations))
+            report(transport, "macro/step",
+                   bench(lambda: [device.step(a) for a in MACRO], opts.iterations, len(MACRO)))
+            report(transport, "macro/batch",
+                   bench(lambda: device.step_batch(MACRO), opts.iterations, len(MACRO)))
+        finally:
+            device.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Offline throughput benchmark of the agent loop on recorded episodes.
+
+Replays episodes (format in episodes.py) through the real
+`MiniCPMWrapper.predict_mm` and `AndroidDevice.step`.  The model is replaced by
+`fake_backends.FakeOpenAIServer` over HTTP (`--backend http`, default) or an
+in-process `inference_backends.ReplayBackend` (`--backend replay`), both
+answering every step with its expected action, and the phone by a
+`RecordingTransport`, so no GPU, handset or microphone is needed:
+
+    python bench_agent_loop.py --episodes episodes.jsonl --concurrency 4 --latency 0.05
+
+Reports steps/sec, p50/p99 latency per stage (capture, predict, actuate; and
+within predict the encode, inference and validate spans recorded by the
+wrapper) and peak traced memory.  `--trace out.json` additionally
+records the finer-grained `tracing` spans (capture vs resize, ...) and writes a
+Chrome trace.
+"""
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import time
+import tracemalloc
+
+import tracing
+from adb_utils import AndroidDevice
+from agent_wrapper import HISTORY_MODES, IMAGE_MIME_TYPES, MiniCPMWrapper, compact_json_dumps
+from episodes import load_episodes, load_step_image
+from fake_backends import REPLY_KEY_HEADER, FakeOpenAIServer, RecordingTransport
+from inference_backends import OpenAIHttpBackend, ReplayBackend, make_session
+
+STAGES = ("capture", "predict", "actuate")
+# spans recorded inside MiniCPMWrapper.predict_mm
+PREDICT_SPANS = ("encode", "inference", "validate")
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def run_episode(steps: list[dict], screens: dict[int, tuple], server: FakeOpenAIServer,
+                opts: argparse.Namespace, timings: dict[str, list[float]]) -> int:
+    transport = RecordingTransport()
+    device = AndroidDevice("fake", transport=transport, capture=opts.capture)
+    device.yadb_pushed = True  # nothing to push to a fake phone
+    session = None
+    if opts.backend == "replay":
+        backend = ReplayBackend([step["reply"] for step in steps], latency=opts.latency)
+    else:
+        # one session per episode, so the reply-key header can follow the step
+        session = make_session()
+        backend = OpenAIHttpBackend(server.url, session, timeout=MiniCPMWrapper.REQUEST_TIMEOUT_SECONDS)
+    wrapper = MiniCPMWrapper(model_name="AgentCPM-GUI", backend=backend,
+                             use_history=opts.history_mode is not None,
+                             history_mode=opts.history_mode or "image", history_size=2,
+                             image_format=opts.image_format, image_quality=opts.image_quality)
+
+    @contextlib.contextmanager
+    def stage(name):
+        t0 = time.perf_counter()
+        yield
+        timings[name].append(time.perf_counter() - t0)
+
+    for step in steps:
+        transport.set_screen(screens[id(step)])
+        if not device.width:
+            device.refresh_resolution()
+        with stage("capture"):
+            screenshot = device.screenshot_array(1120)
+        if session is not None:
+            session.headers[REPLY_KEY_HEADER] = step["key"]
+        with stage("predict"):
+            action = wrapper.predict_mm(step["instruction"], [screenshot])[3]
+        with stage("actuate"):
+            device.step(action)
+    wrapper.close()
+    return len(steps)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--episodes", required=True, help="episode JSONL file")
+    parser.add_argument("--repeat", type=int, default=1, help="replay every episode N times")
+    parser.add_argument("--concurrency", type=int, default=1, help="episodes run in parallel")
+    parser.add_argument("--backend", choices=("http", "replay"), default="http",
+                        help="fake vLLM server over HTTP, or an in-process ReplayBackend")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated model latency per request, seconds")
+    parser.add_argument("--capture", choices=("png", "raw"), default="raw")
+    parser.add_argument("--image-format", choices=tuple(IMAGE_MIME_TYPES), default="jpeg")
+    parser.add_argument("--image-quality", type=int, default=90)
+    parser.add_argument("--history-mode", choices=HISTORY_MODES, default=None,
+                        help="enable history in this mode (default: off)")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="skip peak-memory tracking (it slows allocation-heavy stages)")
+    parser.add_argument("--trace", metavar="PATH", help="write a Chrome trace / JSONL of all spans")
+    opts = parser.parse_args()
+
+    steps = load_episodes(opts.episodes)
+    episodes: dict[str, list[dict]] = collections.defaultdict(list)
+    for step in steps:
+        episodes[step["episode"]].append(step)
+    server = FakeOpenAIServer(latency=opts.latency).start()
+    screens = {}
+    for name, ep_steps in episodes.items():
+        for i, step in enumerate(ep_steps):
+            step["key"] = f"{name}/{i}"
+            step["reply"] = compact_json_dumps({"thought": "replay", **step["expected"]})
+            server.set_reply(step["key"], step["reply"])
+            screens[id(step)] = RecordingTransport.prepare_screen(load_step_image(step))
+
+    timings: dict[str, list[float]] = {name: [] for name in STAGES}
+    jobs = [ep for ep in episodes.values() for _ in range(opts.repeat)]
+    if not opts.no_tracemalloc:
+        tracemalloc.start()
+    # always on: the per-stage table inside predict comes from the wrapper's spans
+    tracing.enable(opts.trace)
+    t0 = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(opts.concurrency) as pool:
+        done = sum(pool.map(lambda ep: run_episode(ep, screens, server, opts, timings), jobs))
+    wall = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    server.stop()
+
+    print(f"episodes={len(jobs)} steps={done} concurrency={opts.concurrency} "
+          f"wall={wall:.2f}s steps/s={done / wall:.2f}")
+    print(f"{'stage':<10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name in STAGES:
+        samples = timings[name]
+        print(f"{name:<10}{percentile(samples, 50) * 1000:>10.2f}{percentile(samples, 99) * 1000:>10.2f}"
+              f"{sum(samples) / len(samples) * 1000:>10.2f}")
+    span_stats = tracing.stats()
+    for name in PREDICT_SPANS:
+        st = span_stats.get(name)
+        if st:
+            print(f"  {name:<8}{st['p50'] * 1000:>10.2f}{st['p99'] * 1000:>10.2f}{st['mean'] * 1000:>10.2f}")
+    if peak is not None:
+        print(f"peak traced memory: {peak / 2**20:.1f} MiB")
+    if opts.trace:
+        print(tracing.summary())
+        print("trace written to", tracing.export())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: payload size, encode time and grounding accuracy per image setting.
+
+Size/time only, on any screenshots:
+
+    python bench_image_encode.py --images shots/*.png
+
+Add accuracy against a running vLLM server (see episodes.py for the format):
+
+    python bench_image_encode.py --episodes episodes.jsonl --accuracy
+"""
+import argparse
+import base64
+import glob
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from agent_wrapper import MiniCPMWrapper, encode_image_bytes
+from episodes import action_matches, load_episodes, load_step_image
+
+# (format, quality, max_side)
+SETTINGS = [
+    ("png", 0, None),
+    ("jpeg", 95, None),
+    ("jpeg", 90, None),
+    ("jpeg", 75, None),
+    ("webp", 90, None),
+    ("webp", 75, None),
+    ("jpeg", 90, 840),
+    ("webp", 80, 840),
+]
+
+
+def measure(images: list[np.ndarray], fmt: str, quality: int, max_side, repeat: int):
+    sizes, times = [], []
+    for image in images:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            data = encode_image_bytes(image, fmt, quality, max_side)
+            times.append(time.perf_counter() - t0)
+        sizes.append(len(base64.b64encode(data)))
+    return statistics.mean(sizes), statistics.median(times)
+
+
+def accuracy(steps, fmt: str, quality: int, max_side, model: str, tolerance: float) -> float:
+    wrapper = MiniCPMWrapper(model_name=model, image_format=fmt, image_quality=quality,
+                             image_max_side=max_side)
+    hits = 0
+    for step in steps:
+        action = wrapper.predict_mm(step["instruction"], [load_step_image(step)])[3]
+        hits += action_matches(action, step["expected"], tolerance)
+    return hits / len(steps)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", nargs="*", default=[], help="screenshot files / globs")
+    parser.add_argument("--episodes", help="episode JSONL (images + expected actions)")
+    parser.add_argument("--accuracy", action="store_true",
+                        help="also query the model and score grounding accuracy")
+    parser.add_argument("--model", default="AgentCPM-GUI")
+    parser.add_argument("--tolerance", type=float, default=50,
+                        help="max POINT distance in 0-1000 space counted as a hit")
+    parser.add_argument("--repeat", type=int, default=3)
+    opts = parser.parse_args()
+
+    steps = load_episodes(opts.episodes) if opts.episodes else []
+    paths = [p for pattern in opts.images for p in glob.glob(pattern)]
+    images = [np.asarray(Image.open(p).convert("RGB")) for p in paths]
+    images += [load_step_image(step) for step in steps]
+    if not images:
+        parser.error("give --images and/or --episodes")
+    if opts.accuracy and not steps:
+        parser.error("--accuracy needs --episodes")
+
+    print(f"{len(images)} images")
+    header = f"{'format':<6}{'q':>4}{'max_side':>10}{'b64 KiB':>10}{'encode ms':>11}"
+    print(header + (f"{'accuracy':>10}" if opts.accuracy else ""))
+    for fmt, quality, max_side in SETTINGS:
+        size, t = measure(images, fmt, quality, max_side, opts.repeat)
+        line = f"{fmt:<6}{quality:>4}{str(max_side):>10}{size / 1024:>10.1f}{t * 1000:>11.1f}"
+        if opts.accuracy:
+            line += f"{accuracy(steps, fmt, quality, max_side, opts.model, opts.tolerance):>10.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Import-time regression check for the agent entry points.
+
+Imports each module in a fresh interpreter under `python -X importtime`,
+prints its cumulative import time and the slowest dependencies, and fails
+(exit 1) if a module fails to import, goes over the budget or pulls in a
+dependency that must stay lazy (Gemini SDK, torch, whisper, ...):
+
+    python bench_import_time.py
+    python bench_import_time.py --budget 0.5 --top 10
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROBOT_ARM = os.path.join(HERE, "..", "robot_arm")
+
+# (module, directory it is imported from)
+ENTRY_POINTS = [
+    ("agent_wrapper", HERE),
+    ("run_agent", HERE),
+    ("device_farm", HERE),
+    ("run_agent_physical", ROBOT_ARM),
+]
+
+# imported only on the code paths that use them
+LAZY_MODULES = (
+    "google.generativeai",
+    "torch",
+    "transformers",
+    "whisper",
+    "speech_recognition",
+    "sounddevice",
+    "httpx",
+)
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(module: str, cwd: str) -> list[tuple[str, int, int]]:
+    """[(name, self us, cumulative us)] for every module imported by `import module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per entry point")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per module (median is reported)")
+    parser.add_argument("--top", type=int, default=5, help="slowest dependencies to list")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="report entry points that fail to import as SKIP instead of failing")
+    opts = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<22}{'import s':>10}  status")
+    for module, cwd in ENTRY_POINTS:
+        try:
+            runs = [import_profile(module, cwd) for _ in range(opts.repeat)]
+        except RuntimeError as e:
+            reason = str(e).splitlines()[-1]
+            if opts.allow_missing:
+                print(f"{module:<22}{'-':>10}  SKIP ({reason})")
+            else:
+                print(f"{module:<22}{'-':>10}  import failed ({reason})")
+                failed = True
+            continue
+        totals = [next(cum for name, _, cum in rows if name == module) for rows in runs]
+        seconds = statistics.median(totals) / 1e6
+        names = {name for name, _, _ in runs[0]}
+        leaked = [lazy for lazy in LAZY_MODULES if lazy in names]
+        problems = []
+        if seconds > opts.budget:
+            problems.append(f"over budget {opts.budget:.2f}s")
+        if leaked:
+            problems.append("eager import of " + ", ".join(leaked))
+        failed |= bool(problems)
+        print(f"{module:<22}{seconds:>10.3f}  {'; '.join(problems) or 'ok'}")
+        slowest = sorted(runs[0], key=lambda row: row[1], reverse=True)[:opts.top]
+        for name, self_us, _ in slowest:
+            print(f"    {self_us / 1e3:8.1f} ms  {name}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
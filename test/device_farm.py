@@ -0,0 +1,108 @@
+"""Run independent agent loops on every connected phone from one process.
+
+Blocking device I/O (adb commands, screenshots, settle waits) runs on one
+shared thread pool, while model calls go through `MiniCPMWrapper.apredict_mm`
+on a single pooled httpx client.  Steps from different phones therefore reach
+the vLLM server concurrently and are batched by its scheduler, with no thread
+parked per device while a completion is pending.
+
+    python device_farm.py "打开设置" --max-steps 20
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import time
+from typing import Any, Optional
+
+from adb_utils import AndroidDevice, setup_devices
+from agent_wrapper import MiniCPMWrapper, make_async_client, make_session
+
+logger = logging.getLogger(__name__)
+
+
+async def arun_task(query: str, device: AndroidDevice, minicpm: MiniCPMWrapper,
+                    executor: Optional[concurrent.futures.Executor] = None,
+                    max_steps: int = 30, record: Optional[dict] = None) -> bool:
+    """Async counterpart of `run_agent.run_task` for an already-open device."""
+    loop = asyncio.get_running_loop()
+    record = record if record is not None else {}
+    record.setdefault("steps", 0)
+
+    screenshot = await loop.run_in_executor(executor, device.screenshot_array, 1120)
+    for _ in range(max_steps):
+        response = await minicpm.apredict_mm(query, [screenshot])
+        action = response[3]
+        logger.info("[%s] step %d: %s", device.serial, record["steps"] + 1, action)
+        is_finish = await loop.run_in_executor(executor, device.step, action)
+        record["steps"] += 1
+        if is_finish:
+            return True
+        screenshot = await loop.run_in_executor(
+            executor, functools.partial(device.wait_until_stable, 1120, timeout=6.0, min_wait=0.3))
+    return False
+
+
+async def arun_farm(query: str, devices: list[AndroidDevice], max_steps: int = 30,
+                    max_workers: Optional[int] = None,
+                    model_name: str = "AgentCPM-GUI") -> dict[str, dict[str, Any]]:
+    """Run `query` on every device concurrently; return per-device records."""
+    max_workers = max_workers or min(32, 2 * len(devices))
+    client = make_async_client(pool_size=2 * len(devices))
+    session = make_session(pool_size=2 * len(devices))
+    records: dict[str, dict[str, Any]] = {}
+    tasks = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="device") as executor:
+        for device in devices:
+            minicpm = MiniCPMWrapper(model_name=model_name, temperature=1, use_history=True,
+                                     history_size=2, session=session, async_client=client)
+            records[device.serial] = {"steps": 0, "finished": False, "error": None}
+            tasks.append(arun_task(query, device, minicpm, executor, max_steps,
+                                   records[device.serial]))
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await client.aclose()
+            session.close()
+    for device, result in zip(devices, results):
+        record = records[device.serial]
+        if isinstance(result, BaseException):
+            logger.error("[%s] agent loop failed: %r", device.serial, result)
+            record["error"] = repr(result)
+        else:
+            record["finished"] = result
+        record.update(width=device.width, height=device.height, yadb_pushed=device.yadb_pushed)
+    return records
+
+
+def run_farm(query: str, serials: Optional[list[str]] = None, max_steps: int = 30,
+             max_workers: Optional[int] = None) -> dict[str, dict[str, Any]]:
+    """Open all (or the given) phones and run `query` on each of them."""
+    devices = setup_devices(serials, capture="raw")
+    logger.info("Running on %d device(s): %s", len(devices), [d.serial for d in devices])
+    try:
+        return asyncio.run(arun_farm(query, devices, max_steps, max_workers))
+    finally:
+        for device in devices:
+            device.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Run one instruction on every connected phone.")
+    parser.add_argument("query")
+    parser.add_argument("--serial", action="append", help="limit to these serials (repeatable)")
+    parser.add_argument("--max-steps", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=None)
+    opts = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = run_farm(opts.query, opts.serial, opts.max_steps, opts.workers)
+    elapsed = time.perf_counter() - t0
+    total_steps = sum(r["steps"] for r in results.values())
+    for serial, record in results.items():
+        print(serial, record)
+    print(f"{total_steps} steps on {len(results)} device(s) in {elapsed:.1f}s "
+          f"({total_steps / elapsed:.2f} steps/s)")
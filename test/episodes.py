@@ -0,0 +1,63 @@
+"""Recorded (screenshot, expected action) episodes for offline evaluation.
+
+An episode file is JSONL with one agent step per line; `image` is relative to
+the JSONL file:
+
+    {"episode": "wifi", "instruction": "打开WiFi", "image": "shots/0001.png", "expected": {"POINT": [500, 320]}}
+"""
+import json
+import math
+import os
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+# Keys that decide what the device does; `thought` / `duration` are ignored.
+ACTION_KEYS = ("POINT", "to", "PRESS", "TYPE", "CLEAR", "STATUS")
+
+
+def load_episodes(path: str) -> list[dict[str, Any]]:
+    """Read an episode JSONL file; image paths are made absolute."""
+    base = os.path.dirname(os.path.abspath(path))
+    steps = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            step = json.loads(line)
+            for key in ("instruction", "image", "expected"):
+                if key not in step:
+                    raise ValueError(f"{path}:{line_no}: missing '{key}'")
+            step.setdefault("episode", "default")
+            step["image"] = os.path.join(base, step["image"])
+            steps.append(step)
+    return steps
+
+
+def load_step_image(step: dict[str, Any]) -> np.ndarray:
+    """Screenshot of a step as an (h, w, 3) RGB array."""
+    with Image.open(step["image"]) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def _close(a: Any, b: Any, tolerance: float) -> bool:
+    if isinstance(a, list) and isinstance(b, list) and len(a) == len(b) == 2:
+        return math.dist(a, b) <= tolerance
+    return a == b
+
+
+def action_matches(predicted: Any, expected: dict[str, Any], tolerance: float = 50) -> bool:
+    """True if `predicted` does what `expected` does.
+
+    Coordinates (0-1000 space) match within `tolerance`; every other action
+    key must be equal.  A non-dict prediction (unparsable output) never matches.
+    """
+    if not isinstance(predicted, dict):
+        return False
+    for key in ACTION_KEYS:
+        if (key in predicted) != (key in expected):
+            return False
+        if key in expected and not _close(predicted[key], expected[key], tolerance):
+            return False
+    return True
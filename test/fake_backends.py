@@ -0,0 +1,134 @@
+"""Local stand-ins for the vLLM server and the phone, for offline benchmarking.
+
+`FakeOpenAIServer` is a minimal OpenAI-compatible `/v1/chat/completions`
+endpoint that replies with scripted completions.  `RecordingTransport` plugs
+into `AndroidDevice(transport=...)`, serves a preset screen for `screencap` and
+records every shell command instead of running it.
+"""
+import io
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+# Clients pick their scripted reply by sending this header (see set_reply).
+REPLY_KEY_HEADER = "X-Replay-Key"
+
+
+class FakeOpenAIServer:
+    """Scripted chat-completions server running on a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 default_reply: str = '{"STATUS":"continue"}'):
+        self.latency = latency
+        self.default_reply = default_reply
+        self.requests = 0
+        self._replies: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def set_reply(self, key: str, content: str) -> None:
+        """Completion text returned to requests carrying `REPLY_KEY_HEADER: key`."""
+        with self._lock:
+            self._replies[key] = content
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _reply_for(self, key: Optional[str]) -> str:
+        with self._lock:
+            self.requests += 1
+            return self._replies.get(key, self.default_reply)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                content = server._reply_for(self.headers.get(REPLY_KEY_HEADER))
+                if server.latency:
+                    time.sleep(server.latency)
+                prompt_chars = sum(len(json.dumps(m["content"])) for m in body["messages"])
+                out = json.dumps({
+                    "id": "fake",
+                    "object": "chat.completion",
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_chars // 4,
+                              "completion_tokens": len(content) // 4},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class RecordingTransport:
+    """adb transport stand-in: canned screen and `wm size`, commands recorded."""
+
+    name = "recording"
+
+    def __init__(self, width: int = 1080, height: int = 2400):
+        self.width = width
+        self.height = height
+        self.commands: list[str] = []
+        self._png = b""
+        self._raw = b""
+
+    @staticmethod
+    def prepare_screen(image: np.ndarray) -> tuple[int, int, bytes, bytes]:
+        """Encode a screen once as (width, height, png, raw screencap) bytes, so
+        capture timings measure only the host side."""
+        rgb = np.ascontiguousarray(image[..., :3])
+        height, width = rgb.shape[:2]
+        buf = io.BytesIO()
+        Image.fromarray(rgb).save(buf, format="PNG")
+        rgba = np.concatenate([rgb, np.full(rgb.shape[:2] + (1,), 255, np.uint8)], axis=2)
+        raw = struct.pack("<IIII", width, height, 1, 0) + rgba.tobytes()
+        return width, height, buf.getvalue(), raw
+
+    def set_screen(self, screen: tuple[int, int, bytes, bytes]) -> None:
+        """Show a screen from prepare_screen()."""
+        self.width, self.height, self._png, self._raw = screen
+
+    def shell(self, *args: str, timeout: int = 30) -> bytes:
+        cmd = " ".join(args)
+        self.commands.append(cmd)
+        if cmd == "wm size":
+            return f"Physical size: {self.width}x{self.height}\n".encode()
+        return b""
+
+    def exec_out(self, *args: str, timeout: int = 30) -> bytes:
+        self.commands.append("exec-out " + " ".join(args))
+        return self._png if "-p" in args else self._raw
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,265 @@
+"""Pluggable inference backends behind MiniCPMWrapper.
+
+Every backend takes the same OpenAI chat-completions payload that
+`MiniCPMWrapper._build_payload` renders (system prompt, history, user turn with
+an image data URL) and returns a chat.completion-shaped dict, so prompt
+building, history and action parsing stay in one place:
+
+  OpenAIHttpBackend    a vLLM / OpenAI-compatible server over HTTP (default);
+  TransformersBackend  AgentCPM-GUI loaded in-process with transformers;
+  ReplayBackend        scripted completions, no model (tests, CI, benchmarks).
+
+`backend_from_spec` picks one from a string ("http://...", "replay:FILE",
+or a local model path).
+"""
+import abc
+import asyncio
+import base64
+import io
+import json
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+END_POINT = "http://localhost:8000/v1/chat/completions"
+
+
+class BackendError(RuntimeError):
+    """The backend answered, but not with a usable completion."""
+
+
+def make_session(pool_size: int = 16) -> requests.Session:
+    """Keep-alive HTTP session; share one across wrappers that hit the same server."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def make_async_client(pool_size: int = 64):
+    """httpx.AsyncClient with keep-alive pooling (httpx is only needed for async use)."""
+    import httpx
+
+    return httpx.AsyncClient(
+        headers={"Content-Type": "application/json"},
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+    )
+
+
+def completion(content: str, usage: Optional[dict] = None, model: Optional[str] = None) -> dict:
+    """A minimal chat.completion dict around `content`."""
+    return {
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": usage or {},
+    }
+
+
+class InferenceBackend(abc.ABC):
+    """complete() is required; stream() and acomplete() fall back to it."""
+
+    name = "backend"
+
+    @abc.abstractmethod
+    def complete(self, payload: dict) -> dict:
+        """Chat-completions payload in, chat.completion dict out; raises on failure."""
+
+    def stream(self, payload: dict, usage: dict) -> Iterator[str]:
+        """Content deltas of the completion; usage, if known, is copied into `usage`."""
+        data = self.complete(payload)
+        usage.update(data.get("usage") or {})
+        yield data["choices"][0]["message"]["content"]
+
+    async def acomplete(self, payload: dict) -> dict:
+        return await asyncio.to_thread(self.complete, payload)
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        self.close()
+
+
+class OpenAIHttpBackend(InferenceBackend):
+    name = "http"
+
+    def __init__(self, endpoint: Optional[str] = None, session: Optional[requests.Session] = None,
+                 async_client: Any = None, timeout: float = 300):
+        self.endpoint = endpoint or END_POINT
+        self.session = session if session is not None else make_session()
+        self._async_client = async_client
+        self.timeout = timeout
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = make_async_client()
+        return self._async_client
+
+    @staticmethod
+    def _check(ok: bool, data: dict) -> dict:
+        if ok and "choices" in data:
+            return data
+        error = data.get("error") or {}
+        raise BackendError(
+            "Error calling OpenAI API with error message: "
+            + str(error.get("message", error) if isinstance(error, dict) else error))
+
+    def complete(self, payload: dict) -> dict:
+        response = self.session.post(self.endpoint, json=payload, timeout=self.timeout)
+        return self._check(response.ok, response.json())
+
+    async def acomplete(self, payload: dict) -> dict:
+        response = await self.async_client.post(self.endpoint, json=payload, timeout=self.timeout)
+        return self._check(response.is_success, response.json())
+
+    def stream(self, payload: dict, usage: dict) -> Iterator[str]:
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        with self.session.post(self.endpoint, json=payload, stream=True, timeout=self.timeout) as response:
+            if not response.ok:
+                self._check(False, response.json())
+            # chunk_size=None: hand over each server-sent chunk as soon as it arrives
+            for line in response.iter_lines(chunk_size=None):
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise BackendError(chunk["error"].get("message", chunk["error"]))
+                if chunk.get("usage"):
+                    usage.update(chunk["usage"])
+                if chunk.get("choices"):
+                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+
+    def close(self) -> None:
+        self.session.close()
+
+    async def aclose(self) -> None:
+        # the sync session may be shared with other wrappers (see make_session)
+        if self._async_client is not None:
+            await self._async_client.aclose()
+
+
+def _decode_data_url(url: str) -> Image.Image:
+    _, _, data = url.partition(",")
+    return Image.open(io.BytesIO(base64.b64decode(data))).convert("RGB")
+
+
+def to_minicpm_msgs(messages: list[dict]) -> tuple[str, list[dict]]:
+    """OpenAI messages -> (system prompt, MiniCPM `chat` msgs with PIL images)."""
+    system_prompt = ""
+    msgs = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            parts = [content]
+        else:
+            parts = []
+            for part in content:
+                if part["type"] == "text":
+                    parts.append(part["text"])
+                elif part["type"] == "image_url":
+                    parts.append(_decode_data_url(part["image_url"]["url"]))
+        if message["role"] == "system":
+            system_prompt += "".join(p for p in parts if isinstance(p, str))
+        else:
+            msgs.append({"role": message["role"], "content": parts})
+    return system_prompt, msgs
+
+
+class TransformersBackend(InferenceBackend):
+    """AgentCPM-GUI in this process via its `chat` remote code (needs torch + a GPU)."""
+
+    name = "transformers"
+
+    def __init__(self, model_path: str, device: str = "cuda:0", dtype: str = "bfloat16"):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_path, trust_remote_code=True, torch_dtype=getattr(torch, dtype)).to(device)
+        # one generate() at a time on the shared model
+        self._lock = threading.Lock()
+
+    def complete(self, payload: dict) -> dict:
+        system_prompt, msgs = to_minicpm_msgs(payload["messages"])
+        with self._lock:
+            text = self.model.chat(image=None, msgs=msgs, tokenizer=self.tokenizer,
+                                   system_prompt=system_prompt,
+                                   temperature=payload.get("temperature", 0.1))
+        return completion(text, model=self.model_path)
+
+
+class ReplayBackend(InferenceBackend):
+    """Returns scripted completions in order (or from a function of the payload).
+
+    Deterministic stand-in for the model: `replies` is a list of completion
+    texts (action dicts are serialised), used once each and then repeating
+    `default`; or a callable payload -> text.  Every payload is kept in
+    `requests` for assertions.
+    """
+
+    name = "replay"
+
+    def __init__(self, replies: Union[Iterable[Any], Callable[[dict], str]] = (),
+                 default: str = '{"STATUS":"finish"}', latency: float = 0.0):
+        self._fn = replies if callable(replies) else None
+        self._replies = [] if callable(replies) else [
+            r if isinstance(r, str) else json.dumps(r, ensure_ascii=False, separators=(",", ":"))
+            for r in replies]
+        self.default = default
+        self.latency = latency
+        self.requests: list[dict] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReplayBackend":
+        """One reply per JSONL line: a string, {"content": str} or an action dict."""
+        replies = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, dict) and isinstance(item.get("content"), str):
+                    item = item["content"]
+                replies.append(item)
+        return cls(replies, **kwargs)
+
+    def complete(self, payload: dict) -> dict:
+        with self._lock:
+            self.requests.append(payload)
+            if self._fn is not None:
+                text = self._fn(payload)
+            elif len(self.requests) <= len(self._replies):
+                text = self._replies[len(self.requests) - 1]
+            else:
+                text = self.default
+        if self.latency:
+            time.sleep(self.latency)
+        return completion(text, usage={"prompt_tokens": 0, "completion_tokens": len(text) // 4},
+                          model="replay")
+
+
+def backend_from_spec(spec: str, **kwargs) -> InferenceBackend:
+    """"http(s)://..." -> OpenAIHttpBackend, "replay:FILE" -> ReplayBackend,
+    anything else is a local model path for TransformersBackend."""
+    if spec.startswith(("http://", "https://")):
+        return OpenAIHttpBackend(spec, **kwargs)
+    if spec.startswith("replay:"):
+        return ReplayBackend.from_file(spec[len("replay:"):], **kwargs)
+    return TransformersBackend(spec, **kwargs)
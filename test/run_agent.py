@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 import time
 from adb_utils import setup_device
+from ui_layout import simple_text_target
 import logging
 from agent_wrapper import MiniCPMWrapper
+from inference_backends import backend_from_spec
+from action_cache import ActionCache
+import tracing
 import numpy as np
-import speech_recognition as sr
-import whisper
 import os
 from PIL import Image
 
@@ -14,6 +16,8 @@ logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 def get_audio_input():
+    import speech_recognition as sr  # only needed for voice input
+
     recognizer = sr.Recognizer()
     with sr.Microphone() as source:
         print("Listening for command...")
@@ -29,19 +33,58 @@ def get_audio_input():
             print(f"Could not request results; {e}")
             return None
 
-def run_task(query):
-    device = setup_device()
-    minicpm = MiniCPMWrapper(model_name='AgentCPM-GUI', temperature=1, use_history=True, history_size=2)
+def run_task(query, stream=False, stream_tokens=False, use_layout=False, cache_path=None, backend=None):
+    """stream: read screenshots from a screenrecord feed; stream_tokens: stream the
+    completion and act as soon as the action keys are final; use_layout: snap taps
+    onto clickable elements of the UI hierarchy, and answer a plain "点击/打开 X"
+    instruction from the layout without calling the model (dumped with yadb);
+    cache_path: reuse actions already taken on identical screens, kept in this
+    JSONL file across runs; backend: an InferenceBackend or a spec for
+    backend_from_spec ("http://...", "replay:FILE", a local model path),
+    default the vLLM server at END_POINT."""
+    device = setup_device(capture="raw")
+    if stream:
+        device.start_stream(1120)
+    action_cache = ActionCache(path=cache_path) if cache_path else None
+    if isinstance(backend, str):
+        backend = backend_from_spec(backend)
+    minicpm = MiniCPMWrapper(model_name='AgentCPM-GUI', temperature=1, use_history=True, history_size=2,
+                             action_cache=action_cache, backend=backend)
 
     is_finish = False
-    while not is_finish:
-        text_prompt = query
-        screenshot = device.screenshot(1120)
-        response = minicpm.predict_mm(text_prompt, [np.array(screenshot)])
-        action = response[3]
+
+    def dispatch(action):
+        nonlocal is_finish
+        if use_layout:
+            action = device.snap_action(action, screenshot)
         print(action)
         is_finish = device.step(action)
-        time.sleep(2.5)
+
+    layout_target = simple_text_target(query) if use_layout else None
+    screenshot = device.screenshot_array(1120)
+    while not is_finish:
+        if layout_target is not None:
+            action = device.text_action(layout_target, screenshot)
+            layout_target = None  # one shortcut at most; the model checks the result
+            if action is not None:
+                print(action)
+                device.step(action)
+                screenshot = device.wait_until_stable(1120, timeout=6.0, min_wait=0.3)
+                continue
+        text_prompt = query
+        if stream_tokens:
+            minicpm.predict_mm_stream(text_prompt, [screenshot], on_action=dispatch)
+        else:
+            response = minicpm.predict_mm(text_prompt, [screenshot])
+            dispatch(response[3])
+        if not is_finish:
+            # wait for the UI to settle and reuse that frame as the next observation
+            screenshot = device.wait_until_stable(1120, timeout=6.0, min_wait=0.3)
+    print(minicpm.prompt_report())
+    if action_cache is not None:
+        action_cache.close()
+    if tracing.TRACER.enabled:
+        print(tracing.summary())
     return is_finish
 
 
@@ -0,0 +1,131 @@
+"""Adaptive "wait until the screen stops changing" for the agent loops.
+
+Frames are reduced to small grayscale thumbnails and compared with a vectorised
+mean absolute difference; once `stable_frames` consecutive comparisons stay
+under `threshold` the screen is considered settled.  The same primitive serves
+the adb path (`AndroidDevice.wait_until_stable`) and the camera path in
+`robot_arm/run_agent_physical.py`, which only differ in how a frame is grabbed
+and how noisy it is.
+"""
+import hashlib
+import time
+from typing import Any, Callable
+
+import numpy as np
+from PIL import Image
+
+try:  # optional: area resize straight from the numpy array
+    import cv2
+except ImportError:
+    cv2 = None
+
+_GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def thumbnail(image: Any, side: int = 64) -> np.ndarray:
+    """(side, side) float32 grayscale thumbnail in [0, 1] of a PIL Image or array."""
+    if isinstance(image, Image.Image):
+        small = image.convert("L").resize((side, side), resample=Image.Resampling.BILINEAR)
+        return np.asarray(small, dtype=np.float32) / 255.0
+    arr = np.asarray(image)
+    h, w = arr.shape[:2]
+    ys = np.arange(side) * h // side
+    xs = np.arange(side) * w // side
+    small = arr[ys[:, None], xs].astype(np.float32)
+    if small.ndim == 3:
+        small = small[..., :3] @ _GRAY_WEIGHTS
+    return small / 255.0
+
+
+def frame_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference of two thumbnails (0 = identical, 1 = inverted)."""
+    return float(np.abs(a - b).mean())
+
+
+def dhash(image: Any, hash_size: int = 8) -> int:
+    """Difference hash: sign of horizontal gradients on a tiny thumbnail."""
+    if isinstance(image, Image.Image):
+        small = np.asarray(image.convert("L").resize((hash_size + 1, hash_size),
+                                                     resample=Image.Resampling.BILINEAR),
+                           dtype=np.float32)
+    else:
+        arr = np.asarray(image)
+        h, w = arr.shape[:2]
+        ys = np.arange(hash_size) * h // hash_size
+        xs = np.arange(hash_size + 1) * w // (hash_size + 1)
+        small = arr[ys[:, None], xs].astype(np.float32)
+        if small.ndim == 3:
+            small = small[..., :3] @ _GRAY_WEIGHTS
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def screen_digest(image: Any, size: tuple[int, int] = (64, 128), status_bar: float = 0.04,
+                  shift: int = 4) -> str:
+    """Content hash of an area-averaged (w, h) grayscale thumbnail.
+
+    Unlike `dhash`, which samples a few pixels, every pixel contributes, so
+    typed text or a toast changes the digest; meant for exact-match cache keys.
+    The top `status_bar` fraction of the screen (clock, battery, notification
+    icons) is left out and the thumbnail is quantised to 8 - `shift` bits, so
+    the same screen hashes the same in a later run.
+    """
+    if isinstance(image, Image.Image):
+        top = int(image.height * status_bar)
+        small = np.asarray(image.crop((0, top, image.width, image.height)).convert("L")
+                           .resize(size, resample=Image.Resampling.BOX))
+    else:
+        arr = np.asarray(image)
+        arr = np.ascontiguousarray(arr[int(arr.shape[0] * status_bar):, :, :3] if arr.ndim == 3
+                                   else arr[int(arr.shape[0] * status_bar):])
+        if cv2 is not None:
+            gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY) if arr.ndim == 3 else arr
+            small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        else:
+            small = np.asarray(Image.fromarray(arr).convert("L").resize(size, resample=Image.Resampling.BOX))
+    small = np.ascontiguousarray(small, dtype=np.uint8) >> shift
+    return hashlib.blake2b(small.tobytes(), digest_size=16).hexdigest()
+
+
+def wait_until_stable(
+    grab: Callable[[], Any],
+    timeout: float = 5.0,
+    interval: float = 0.15,
+    threshold: float = 0.01,
+    stable_frames: int = 2,
+    min_wait: float = 0.0,
+) -> tuple[bool, Any]:
+    """Poll `grab()` until the picture stops changing.
+
+    Args:
+      grab: returns the current frame (PIL Image or array); None is skipped.
+      timeout: give up after this many seconds and return the last frame.
+      interval: pause between grabs.
+      threshold: max `frame_difference` still counted as "unchanged".
+      stable_frames: consecutive unchanged comparisons required.
+      min_wait: always wait this long first, so a transition that has not
+        started yet is not mistaken for a settled screen.
+
+    Returns:
+      (settled, last_frame) – the last frame can be reused as the next
+      observation instead of capturing again.
+    """
+    start = time.monotonic()
+    if min_wait > 0:
+        time.sleep(min_wait)
+    frame, prev, calm = None, None, 0
+    while True:
+        current = grab()
+        if current is not None:
+            frame = current
+            thumb = thumbnail(current)
+            if prev is not None and frame_difference(prev, thumb) <= threshold:
+                calm += 1
+                if calm >= stable_frames:
+                    return True, frame
+            else:
+                calm = 0
+            prev = thumb
+        if time.monotonic() - start >= timeout:
+            return False, frame
+        time.sleep(interval)
@@ -0,0 +1,138 @@
+"""Continuous screen capture from `screenrecord --output-format=h264`.
+
+A background thread reads the raw H.264 elementary stream from the device,
+decodes it with PyAV and keeps the most recent frames in a small ring buffer.
+`AndroidDevice.start_stream()` wires this in behind `screenshot()`, so the agent
+loop reads the freshest frame from memory instead of paying a capture round
+trip every step.
+
+screenrecord only emits frames when the screen changes and stops after its time
+limit; the reader simply restarts it, and the last decoded frame stays valid in
+between.
+"""
+import collections
+import logging
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ScreenStream:
+    """Ring buffer of the latest decoded frames from one device."""
+
+    # screenrecord runs that exit without a single byte (unsupported device,
+    # revoked permission) before the reader gives up
+    MAX_EMPTY_RUNS = 5
+
+    def __init__(self, transport, size: Optional[tuple[int, int]] = None,
+                 bit_rate: int = 8_000_000, ring_size: int = 4,
+                 time_limit: int = 180):
+        self._transport = transport
+        self.size = size
+        self.bit_rate = bit_rate
+        self.time_limit = time_limit
+        self._frames: collections.deque[tuple[float, np.ndarray]] = collections.deque(maxlen=ring_size)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._source = None
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        try:
+            import av  # noqa: F401  (optional dependency, only needed for streaming)
+        except ImportError as exc:
+            raise ImportError("Screen streaming needs PyAV: pip install av") from exc
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._reader, name="screen-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        source = self._source
+        if source is not None:
+            source.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    @property
+    def alive(self) -> bool:
+        """False once the reader thread has given up (or was never started)."""
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------- consumer API ----------
+    def latest(self) -> Optional[np.ndarray]:
+        """Newest decoded (h, w, 3) RGB frame, or None before the first one."""
+        with self._cond:
+            return self._frames[-1][1] if self._frames else None
+
+    def latest_time(self) -> float:
+        """`time.monotonic()` stamp of the newest frame (0.0 if none yet)."""
+        with self._cond:
+            return self._frames[-1][0] if self._frames else 0.0
+
+    def wait_for_frame(self, newer_than: float = 0.0,
+                       timeout: float = 2.0) -> Optional[np.ndarray]:
+        """Block until a frame stamped after `newer_than` arrives (or timeout)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._frames or self._frames[-1][0] <= newer_than:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    break
+            return self._frames[-1][1] if self._frames else None
+
+    # ---------- reader thread ----------
+    def _command(self) -> list[str]:
+        cmd = ["screenrecord", "--output-format=h264",
+               "--bit-rate", str(self.bit_rate), "--time-limit", str(self.time_limit)]
+        if self.size is not None:
+            cmd += ["--size", "%dx%d" % self.size]
+        return cmd + ["-"]
+
+    def _reader(self) -> None:
+        import av
+
+        empty_runs = 0
+        while not self._stop.is_set():
+            codec = av.CodecContext.create("h264", "r")
+            received = 0
+            try:
+                self._source = self._transport.open_stream(*self._command())
+                while not self._stop.is_set():
+                    data = self._source.read(65536)
+                    if not data:
+                        break
+                    received += len(data)
+                    for packet in codec.parse(data):
+                        for frame in codec.decode(packet):
+                            self._publish(frame.to_ndarray(format="rgb24"))
+            except Exception as exc:  # keep streaming across device hiccups
+                if not self._stop.is_set():
+                    logger.warning("Screen stream interrupted: %s; restarting.", exc)
+                    time.sleep(0.5)
+                continue
+            finally:
+                if self._source is not None:
+                    self._source.close()
+                    self._source = None
+            if received or self._stop.is_set():
+                empty_runs = 0
+                continue
+            empty_runs += 1
+            if empty_runs >= self.MAX_EMPTY_RUNS:
+                logger.error("screenrecord produced no output %d times in a row; "
+                             "screen stream stopped.", empty_runs)
+                return
+            logger.warning("screenrecord exited without output; restarting.")
+            time.sleep(0.5 * empty_runs)
+
+    def _publish(self, frame: np.ndarray) -> None:
+        with self._cond:
+            self._frames.append((time.monotonic(), frame))
+            self._cond.notify_all()
@@ -0,0 +1,151 @@
+"""Lightweight per-stage timing spans for the agent loops.
+
+    import tracing
+    tracing.enable("trace.json")             # or set AGENT_TRACE=trace.json
+    with tracing.span("capture", device=serial):
+        ...
+    print(tracing.summary())
+
+Spans are exported as a Chrome trace (open in chrome://tracing or Perfetto) or,
+for a `.jsonl` path, one event per line.  `summary()` gives an in-process
+count / p50 / p99 / mean table per span name.  While disabled (the default),
+`span` only checks a flag.  Spans opened inside an asyncio task get a track
+(tid) of their own, so concurrent tasks on one event-loop thread do not
+overlap on a single track.
+
+Stage names used across the repo: capture, resize, encode, inference,
+validate, actuate.
+"""
+import atexit
+import collections
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Any, Optional
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self._lock = threading.Lock()
+        self._events: list[dict] = []
+        self._durations: dict[str, list[float]] = collections.defaultdict(list)
+        self._origin = time.perf_counter_ns()
+        self._task_tids: "weakref.WeakKeyDictionary[Any, int]" = weakref.WeakKeyDictionary()
+        self._task_ids = itertools.count(1)
+
+    def enable(self, path: Optional[str] = None) -> None:
+        """Start recording; if `path` is given, export there at interpreter exit."""
+        self.enabled = True
+        if path and self.path is None:
+            atexit.register(self.export)
+        self.path = path or self.path
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self._durations.clear()
+            self._task_tids.clear()
+
+    def _tid(self) -> int:
+        """Track for the calling code: its asyncio task if it runs in one, else its thread."""
+        asyncio = sys.modules.get("asyncio")  # no task can be running unless it was imported
+        task = None
+        if asyncio is not None:
+            try:
+                task = asyncio.current_task()
+            except RuntimeError:  # no running event loop in this thread
+                pass
+        if task is None:
+            return threading.get_ident()
+        with self._lock:
+            tid = self._task_tids.get(task)
+            if tid is None:
+                tid = self._task_tids[task] = next(self._task_ids)
+                # names the track in the Chrome trace viewer
+                self._events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                                     "args": {"name": task.get_name()}})
+        return tid
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args: Any):
+        if not self.enabled:
+            yield
+            return
+        tid = self._tid()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": os.getpid(),
+                "tid": tid,
+            }
+            if args:
+                event["args"] = {k: str(v) for k, v in args.items()}
+            with self._lock:
+                self._events.append(event)
+                self._durations[name].append((end - start) / 1e9)
+
+    def export(self, path: Optional[str] = None) -> Optional[str]:
+        """Write the recorded spans; `.jsonl` → one event per line, else Chrome trace."""
+        path = path or self.path
+        if not path:
+            return None
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+            else:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            durations = {name: sorted(d) for name, d in self._durations.items()}
+        out = {}
+        for name, d in durations.items():
+            out[name] = {
+                "count": len(d),
+                "p50": d[len(d) // 2],
+                "p99": d[min(len(d) - 1, int(0.99 * len(d)))],
+                "mean": sum(d) / len(d),
+                "total": sum(d),
+            }
+        return out
+
+    def summary(self) -> str:
+        lines = [f"{'span':<14}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'total s':>9}"]
+        for name, st in sorted(self.stats().items(), key=lambda kv: -kv[1]["total"]):
+            lines.append(f"{name:<14}{st['count']:>7}{st['p50'] * 1000:>10.2f}{st['p99'] * 1000:>10.2f}"
+                         f"{st['mean'] * 1000:>10.2f}{st['total']:>9.2f}")
+        return "\n".join(lines)
+
+
+TRACER = Tracer()
+span = TRACER.span
+enable = TRACER.enable
+disable = TRACER.disable
+reset = TRACER.reset
+export = TRACER.export
+stats = TRACER.stats
+summary = TRACER.summary
+
+if os.environ.get("AGENT_TRACE"):
+    enable(os.environ["AGENT_TRACE"])
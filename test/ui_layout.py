@@ -0,0 +1,266 @@
+"""UI hierarchy (yadb `-layout` XML) as a queryable spatial index.
+
+`LayoutParser` turns the dump into `UiNode`s incrementally (each node is
+emitted as soon as its start tag has been read, so it can be fed straight from
+a socket).  `LayoutIndex` buckets node bounds into a coarse grid and answers
+"which clickable element is under this point", "snap this point to the nearest
+clickable centre" and "where is the element labelled X".  `LayoutCache` keeps
+indexes per screen digest (`screen_settle.screen_digest`, which covers every
+pixel, so a scroll, dialog or typed text never reuses a stale index), and an
+unchanged screen is dumped only once.
+"""
+import collections
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+Bounds = Tuple[int, int, int, int]  # left, top, right, bottom (pixels)
+
+_BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+
+@dataclass(frozen=True, slots=True)
+class UiNode:
+    id: int  # position in document order
+    parent: int  # id of the parent node, -1 for the root's children
+    text: str
+    content_desc: str
+    resource_id: str
+    class_name: str
+    bounds: Bounds
+    clickable: bool
+    long_clickable: bool
+    scrollable: bool
+    enabled: bool
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        left, top, right, bottom = self.bounds
+        return (left + right) // 2, (top + bottom) // 2
+
+    @property
+    def area(self) -> int:
+        left, top, right, bottom = self.bounds
+        return max(0, right - left) * max(0, bottom - top)
+
+    def contains(self, x: float, y: float) -> bool:
+        left, top, right, bottom = self.bounds
+        return left <= x < right and top <= y < bottom
+
+    def distance(self, x: float, y: float) -> float:
+        """Distance from (x, y) to the node's rectangle (0 inside)."""
+        left, top, right, bottom = self.bounds
+        dx = max(left - x, 0, x - right)
+        dy = max(top - y, 0, y - bottom)
+        return (dx * dx + dy * dy) ** 0.5
+
+    @property
+    def label(self) -> str:
+        return self.text or self.content_desc
+
+
+def _parse_bounds(value: str) -> Bounds:
+    match = _BOUNDS_RE.fullmatch(value or "")
+    if not match:
+        return 0, 0, 0, 0
+    return tuple(int(v) for v in match.groups())
+
+
+class LayoutParser:
+    """Incremental parser: feed() XML bytes, get the nodes completed so far."""
+
+    def __init__(self):
+        self._pull = ET.XMLPullParser(events=("start", "end"))
+        self._stack: List[int] = []
+        self.nodes: List[UiNode] = []
+
+    def feed(self, chunk: bytes) -> List[UiNode]:
+        self._pull.feed(chunk)
+        return self._drain()
+
+    def close(self) -> List[UiNode]:
+        self._pull.close()
+        return self._drain()
+
+    def _drain(self) -> List[UiNode]:
+        new = []
+        for event, elem in self._pull.read_events():
+            if elem.tag != "node":
+                continue
+            if event == "end":
+                self._stack.pop()
+                elem.clear()  # attributes are copied; keep memory flat on big trees
+                continue
+            a = elem.attrib
+            node = UiNode(
+                id=len(self.nodes),
+                parent=self._stack[-1] if self._stack else -1,
+                text=a.get("text", ""),
+                content_desc=a.get("content-desc", ""),
+                resource_id=a.get("resource-id", ""),
+                class_name=a.get("class", ""),
+                bounds=_parse_bounds(a.get("bounds", "")),
+                clickable=a.get("clickable") == "true",
+                long_clickable=a.get("long-clickable") == "true",
+                scrollable=a.get("scrollable") == "true",
+                enabled=a.get("enabled", "true") == "true",
+            )
+            self._stack.append(node.id)
+            self.nodes.append(node)
+            new.append(node)
+        return new
+
+
+def parse_layout(xml: bytes, chunk_size: int = 65536) -> List[UiNode]:
+    parser = LayoutParser()
+    for start in range(0, len(xml), chunk_size):
+        parser.feed(xml[start:start + chunk_size])
+    parser.close()
+    return parser.nodes
+
+
+class LayoutIndex:
+    """Grid-bucketed nodes of one screen; coordinates are device pixels."""
+
+    def __init__(self, nodes: Iterable[UiNode], width: int, height: int,
+                 cols: int = 8, rows: int = 16):
+        self.nodes: List[UiNode] = list(nodes)
+        self.width = max(width, 1)
+        self.height = max(height, 1)
+        self.cols = cols
+        self.rows = rows
+        self._cells: List[List[int]] = [[] for _ in range(cols * rows)]
+        for node in self.nodes:
+            if node.area == 0:
+                continue
+            c0, r0 = self._cell(node.bounds[0], node.bounds[1])
+            c1, r1 = self._cell(node.bounds[2] - 1, node.bounds[3] - 1)
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    self._cells[r * cols + c].append(node.id)
+
+    @classmethod
+    def from_xml(cls, xml: bytes, width: int, height: int) -> "LayoutIndex":
+        return cls(parse_layout(xml), width, height)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        c = min(max(int(x * self.cols / self.width), 0), self.cols - 1)
+        r = min(max(int(y * self.rows / self.height), 0), self.rows - 1)
+        return c, r
+
+    def nodes_at(self, x: float, y: float) -> List[UiNode]:
+        """Nodes containing (x, y), smallest first."""
+        c, r = self._cell(x, y)
+        hits = [self.nodes[i] for i in self._cells[r * self.cols + c] if self.nodes[i].contains(x, y)]
+        return sorted(hits, key=lambda n: n.area)
+
+    def clickable_ancestor(self, node: UiNode) -> Optional[UiNode]:
+        """The node itself if clickable, else its nearest clickable ancestor."""
+        while True:
+            if node.clickable and node.enabled:
+                return node
+            if node.parent < 0:
+                return None
+            node = self.nodes[node.parent]
+
+    def clickable_at(self, x: float, y: float) -> Optional[UiNode]:
+        for node in self.nodes_at(x, y):
+            target = self.clickable_ancestor(node)
+            if target is not None:
+                return target
+        return None
+
+    def snap(self, x: float, y: float, radius: float = 48) -> Optional[Tuple[int, int]]:
+        """Centre of the clickable element under (x, y), or of the nearest one
+        within `radius` pixels; None if there is none."""
+        target = self.clickable_at(x, y)
+        if target is None:
+            c0, r0 = self._cell(x - radius, y - radius)
+            c1, r1 = self._cell(x + radius, y + radius)
+            best = radius
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    for i in self._cells[r * self.cols + c]:
+                        node = self.nodes[i]
+                        if node.clickable and node.enabled and node.distance(x, y) <= best:
+                            best, target = node.distance(x, y), node
+        if target is None:
+            return None
+        # A tap anywhere inside works, so keep a point that already is inside
+        # a large element (e.g. a full-width list row) rather than jumping.
+        if target.contains(x, y) and target.area > 4 * (2 * radius) ** 2:
+            return int(x), int(y)
+        return target.center
+
+    def find_text(self, query: str) -> List[UiNode]:
+        """Nodes whose text / content-desc equals `query`, then those containing
+        it; each group smallest first."""
+        query = query.strip()
+        if not query:
+            return []
+        exact, partial = [], []
+        for node in self.nodes:
+            if node.area == 0:
+                continue
+            labels = (node.text, node.content_desc)
+            if query in labels:
+                exact.append(node)
+            elif any(query in label for label in labels if label):
+                partial.append(node)
+        return sorted(exact, key=lambda n: n.area) + sorted(partial, key=lambda n: n.area)
+
+    def text_target(self, query: str) -> Optional[Tuple[int, int]]:
+        """Tap point for the element labelled `query`, if it (or an ancestor)
+        is clickable."""
+        for node in self.find_text(query):
+            target = self.clickable_ancestor(node)
+            if target is not None:
+                # tap the label itself when it lies inside the clickable area
+                return node.center if target.contains(*node.center) else target.center
+        return None
+
+
+class LayoutCache:
+    """LRU of LayoutIndex per screen digest."""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "collections.OrderedDict[str, LayoutIndex]" = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, screen_hash: str) -> Optional[LayoutIndex]:
+        index = self._entries.get(screen_hash)
+        if index is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(screen_hash)
+        return index
+
+    def put(self, screen_hash: str, index: LayoutIndex) -> None:
+        self._entries[screen_hash] = index
+        self._entries.move_to_end(screen_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Instructions that only name an on-screen element to tap, e.g. "点击设置",
+# "打开「微信」", "tap Settings".  Used to answer such steps from the layout.
+_SIMPLE_TARGET_RE = re.compile(
+    r"^\s*(?:点击|单击|点一下|打开|进入|tap|click|open)\s*[「“\"']?(?P<target>[^「」“”\"'，。,.!！?？]{1,20}?)[」”\"']?\s*[。.!！]?\s*$",
+    re.IGNORECASE)
+# Words that make it a multi-step task ("打开设置并连接WiFi").
+_COMPOUND_RE = re.compile(r"并|然后|再|之后|\band\b|\bthen\b", re.IGNORECASE)
+
+
+def simple_text_target(instruction: str) -> Optional[str]:
+    """The element name if `instruction` is just "tap/open <name>", else None."""
+    match = _SIMPLE_TARGET_RE.match(instruction)
+    if not match or _COMPOUND_RE.search(match.group("target")):
+        return None
+    return match.group("target").strip()
@@ -6,6 +6,7 @@ import com.ysbing.yadb.input.Keyboard;
 import com.ysbing.yadb.input.Touch;
 import com.ysbing.yadb.layout.Layout;
 import com.ysbing.yadb.screenshot.Screenshot;
+import com.ysbing.yadb.server.Server;
 
 import java.io.PrintWriter;
 import java.io.StringWriter;
@@ -18,6 +19,7 @@ public class Main {
     private static final String ARG_LAYOUT = "-layout";
     private static final String ARG_SCREENSHOT = "-screenshot";
     private static final String ARG_READ_CLIPBOARD = "-readClipboard";
+    private static final String ARG_SERVER = "-server";
 
     public static void main(String[] args) {
         try {
@@ -52,6 +54,9 @@ public class Main {
                     case ARG_READ_CLIPBOARD:
                         Keyboard.readClipboard();
                         break;
+                    case ARG_SERVER:
+                        Server.run(args.length == 2 ? args[1] : Server.DEFAULT_SOCKET_NAME);
+                        break;
                     default:
                         break;
                 }
@@ -64,7 +69,7 @@ public class Main {
     }
 
     private static boolean check(String arg) {
-        return arg.equals(ARG_KEY_BOARD) || arg.equals(ARG_TOUCH) || arg.equals(ARG_LAYOUT) || arg.equals(ARG_SCREENSHOT) || arg.equals(ARG_READ_CLIPBOARD);
+        return arg.equals(ARG_KEY_BOARD) || arg.equals(ARG_TOUCH) || arg.equals(ARG_LAYOUT) || arg.equals(ARG_SCREENSHOT) || arg.equals(ARG_READ_CLIPBOARD) || arg.equals(ARG_SERVER);
     }
 
     private static String getStackTraceAsString(Throwable throwable) {
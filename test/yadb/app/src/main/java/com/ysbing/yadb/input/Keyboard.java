@@ -34,6 +34,15 @@ public class Keyboard {
         }
     }
 
+    public static void pressKey(String keyName) {
+        int keyCode = KeyEvent.keyCodeFromString(keyName);
+        if (keyCode == KeyEvent.KEYCODE_UNKNOWN && !"KEYCODE_UNKNOWN".equals(keyName)) {
+            throw new IllegalArgumentException("Unknown key: " + keyName);
+        }
+        injectKeyEvent(KeyEvent.ACTION_DOWN, keyCode, 0);
+        injectKeyEvent(KeyEvent.ACTION_UP, keyCode, 0);
+    }
+
     private static void injectKeyEvent(int action, int keyCode, int metaState) {
         long now = SystemClock.uptimeMillis();
         KeyEvent event = new KeyEvent(now, now, action, keyCode, 0, metaState, KeyCharacterMap.VIRTUAL_KEYBOARD, 0, 0,
@@ -5,6 +5,8 @@ import android.view.InputDevice;
 import android.view.MotionEvent;
 
 public class Touch {
+    private static final long SWIPE_STEP_MS = 10L;
+
     public static void run(float x, float y, long pressedTime) throws InterruptedException {
         long downTime = SystemClock.uptimeMillis();
         MotionEvent.PointerProperties[] properties = new MotionEvent.PointerProperties[1];
@@ -29,4 +31,34 @@ public class Touch {
                 1, 1f, 1f, -1, 0, InputDevice.SOURCE_TOUCHSCREEN, 0);
         Keyboard.injectEvent(clickEvent2);
     }
+
+    public static void swipe(float x1, float y1, float x2, float y2, long duration) throws InterruptedException {
+        long downTime = SystemClock.uptimeMillis();
+        MotionEvent.PointerProperties[] properties = new MotionEvent.PointerProperties[1];
+        properties[0] = new MotionEvent.PointerProperties();
+        properties[0].id = 0;
+        properties[0].toolType = MotionEvent.TOOL_TYPE_FINGER;
+        MotionEvent.PointerCoords[] coords = new MotionEvent.PointerCoords[1];
+        coords[0] = new MotionEvent.PointerCoords();
+        coords[0].x = x1;
+        coords[0].y = y1;
+        coords[0].pressure = 1;
+        Keyboard.injectEvent(MotionEvent.obtain(downTime, downTime,
+                MotionEvent.ACTION_DOWN, 1, properties, coords, 0,
+                0, 1f, 1f, -1, 0, InputDevice.SOURCE_TOUCHSCREEN, 0));
+        long steps = Math.max(1L, duration / SWIPE_STEP_MS);
+        for (long i = 1; i <= steps; i++) {
+            Thread.sleep(duration / steps);
+            float t = (float) i / steps;
+            coords[0].x = x1 + (x2 - x1) * t;
+            coords[0].y = y1 + (y2 - y1) * t;
+            Keyboard.injectEvent(MotionEvent.obtain(downTime, SystemClock.uptimeMillis(),
+                    MotionEvent.ACTION_MOVE, 1, properties, coords, 0,
+                    1, 1f, 1f, -1, 0, InputDevice.SOURCE_TOUCHSCREEN, 0));
+        }
+        coords[0].pressure = 0;
+        Keyboard.injectEvent(MotionEvent.obtain(downTime, SystemClock.uptimeMillis(),
+                MotionEvent.ACTION_UP, 1, properties, coords, 0,
+                1, 1f, 1f, -1, 0, InputDevice.SOURCE_TOUCHSCREEN, 0));
+    }
 }
@@ -0,0 +1,196 @@
+package com.ysbing.yadb.server;
+
+import android.net.LocalServerSocket;
+import android.net.LocalSocket;
+import android.util.Base64;
+
+import com.ysbing.yadb.input.Keyboard;
+import com.ysbing.yadb.input.Touch;
+import com.ysbing.yadb.layout.Layout;
+import com.ysbing.yadb.screenshot.Screenshot;
+
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * Persistent helper: one app_process JVM serving commands on an abstract
+ * local socket, so each action costs a socket round trip instead of a JVM
+ * start.  Reach it with {@code adb forward tcp:0 localabstract:yadb}.
+ * <p>
+ * Requests are single lines; text arguments are Base64 (UTF-8):
+ * <pre>
+ * ping
+ * tap X Y [PRESSED_MS]
+ * swipe X1 Y1 X2 Y2 DURATION_MS
+ * key KEYCODE_NAME
+ * type BASE64_TEXT
+ * layout
+ * screenshot
+ * batch STOP_ON_ERROR(0|1) COUNT      followed by COUNT request lines
+ * quit
+ * </pre>
+ * Every request is answered with {@code OK <n>\n} and n payload bytes, or
+ * {@code ERR <message>\n}; inside a batch, requests after a failure are
+ * answered {@code SKIP\n} when STOP_ON_ERROR is 1.
+ */
+public class Server {
+    public static final String DEFAULT_SOCKET_NAME = "yadb";
+    private static final byte[] EMPTY = new byte[0];
+
+    public static void run(String socketName) throws IOException {
+        LocalServerSocket serverSocket = new LocalServerSocket(socketName);
+        System.out.println("yadb server listening on localabstract:" + socketName);
+        while (true) {
+            LocalSocket client = serverSocket.accept();
+            new Thread(() -> serve(client), "yadb-client").start();
+        }
+    }
+
+    private static void serve(LocalSocket client) {
+        try (LocalSocket socket = client) {
+            BufferedReader in = new BufferedReader(new InputStreamReader(socket.getInputStream(), StandardCharsets.UTF_8));
+            OutputStream out = new BufferedOutputStream(socket.getOutputStream());
+            String line;
+            while ((line = in.readLine()) != null) {
+                if (line.trim().isEmpty()) {
+                    continue;
+                }
+                String[] args = line.split(" ");
+                if (args[0].equals("quit")) {
+                    reply(out, EMPTY);
+                    out.flush();
+                    System.exit(0);
+                } else if (args[0].equals("batch")) {
+                    int count;
+                    try {
+                        count = Integer.parseInt(args[2]);
+                    } catch (ArrayIndexOutOfBoundsException | NumberFormatException e) {
+                        out.write("ERR Usage: batch STOP_ON_ERROR COUNT\n".getBytes(StandardCharsets.UTF_8));
+                        out.flush();
+                        continue;
+                    }
+                    boolean stopOnError = args[1].equals("1");
+                    boolean failed = false;
+                    for (int i = 0; i < count; i++) {
+                        String requestLine = in.readLine();
+                        if (requestLine == null) {
+                            // client went away mid-batch
+                            return;
+                        }
+                        String[] request = requestLine.split(" ");
+                        if (failed && stopOnError) {
+                            out.write("SKIP\n".getBytes(StandardCharsets.UTF_8));
+                        } else if (!execute(request, out)) {
+                            failed = true;
+                        }
+                    }
+                } else {
+                    execute(args, out);
+                }
+                out.flush();
+            }
+        } catch (IOException e) {
+            System.out.println("yadb server client error:" + e);
+        }
+    }
+
+    private static boolean execute(String[] args, OutputStream out) throws IOException {
+        byte[] payload;
+        try {
+            payload = dispatch(args);
+        } catch (Throwable e) {
+            String message = String.valueOf(e).replace('\n', ' ');
+            out.write(("ERR " + message + "\n").getBytes(StandardCharsets.UTF_8));
+            return false;
+        }
+        reply(out, payload);
+        return true;
+    }
+
+    private static void reply(OutputStream out, byte[] payload) throws IOException {
+        out.write(("OK " + payload.length + "\n").getBytes(StandardCharsets.UTF_8));
+        out.write(payload);
+    }
+
+    private static byte[] dispatch(String[] args) throws Exception {
+        int arity = arity(args[0]);
+        if (args.length < arity) {
+            throw new IllegalArgumentException(args[0] + " expects " + (arity - 1) + " argument(s)");
+        }
+        switch (args[0]) {
+            case "ping":
+                return EMPTY;
+            case "tap":
+                Touch.run(Float.parseFloat(args[1]), Float.parseFloat(args[2]),
+                        args.length > 3 ? Long.parseLong(args[3]) : -1L);
+                return EMPTY;
+            case "swipe":
+                Touch.swipe(Float.parseFloat(args[1]), Float.parseFloat(args[2]),
+                        Float.parseFloat(args[3]), Float.parseFloat(args[4]), Long.parseLong(args[5]));
+                return EMPTY;
+            case "key":
+                Keyboard.pressKey(args[1]);
+                return EMPTY;
+            case "type":
+                if (args[1].isEmpty()) {
+                    throw new IllegalArgumentException("type expects non-empty text");
+                }
+                Keyboard.run(new String(Base64.decode(args[1], Base64.DEFAULT), StandardCharsets.UTF_8));
+                return EMPTY;
+            case "layout": {
+                File file = tempFile("layout", ".xml");
+                Layout.run(file.getAbsolutePath());
+                return readAndDelete(file);
+            }
+            case "screenshot": {
+                File file = tempFile("screenshot", ".png");
+                Screenshot.run(file.getAbsolutePath());
+                return readAndDelete(file);
+            }
+            default:
+                throw new IllegalArgumentException("Unknown command: " + args[0]);
+        }
+    }
+
+    /** Number of space-separated fields (command included) a request needs. */
+    private static int arity(String command) {
+        switch (command) {
+            case "tap":
+                return 3;
+            case "swipe":
+                return 6;
+            case "key":
+            case "type":
+                return 2;
+            default:
+                return 1;
+        }
+    }
+
+    private static File tempFile(String kind, String suffix) {
+        return new File("/data/local/tmp", "yadb_server_" + kind + "_" + Thread.currentThread().getId() + suffix);
+    }
+
+    private static byte[] readAndDelete(File file) throws IOException {
+        try (InputStream in = new FileInputStream(file)) {
+            ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+            byte[] chunk = new byte[65536];
+            int n;
+            while ((n = in.read(chunk)) != -1) {
+                buffer.write(chunk, 0, n);
+            }
+            return buffer.toByteArray();
+        } finally {
+            //noinspection ResultOfMissingReturnValue
+            file.delete();
+        }
+    }
+}